@@ -3,6 +3,7 @@
 ЗАПУСК VPN БОТА
 """
 
+import argparse
 import asyncio
 import sys
 import os
@@ -24,7 +25,7 @@ logger = logging.getLogger(__name__)
 sys.path.append(os.path.join(os.path.dirname(__file__), 'src'))
 
 
-async def main():
+async def main(workers: int = 0):
     """Основная функция запуска"""
 
     print("=" * 50)
@@ -48,6 +49,11 @@ async def main():
 
     print(f"   ✅ Токен: {config.bot.token[:15]}...")
     print(f"   ✅ Админы: {config.bot.admin_ids}")
+    print(f"   ✅ Режим: {config.webhook.mode}")
+
+    workers = workers or config.sharding.workers
+    if workers > 1:
+        print(f"   ✅ Процессов (шардов): {workers}")
 
     print("2. Создание папок...")
     os.makedirs("data/database", exist_ok=True)
@@ -69,8 +75,12 @@ async def main():
     print("=" * 50)
 
     try:
-        from src.main import main as bot_main
-        await bot_main()
+        if workers > 1:
+            from src.bot.sharding import Supervisor
+            await Supervisor(workers).run()
+        else:
+            from src.main import main as bot_main
+            await bot_main()
     except KeyboardInterrupt:
         logger.info("Бот остановлен пользователем")
         print("\n🛑 Бот остановлен")
@@ -84,7 +94,16 @@ async def main():
 
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Запуск VPN бота")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=0,
+        help="число процессов-шардов (по умолчанию BOT_WORKERS, 1 - без шардирования)"
+    )
+    args = parser.parse_args()
+
     try:
-        asyncio.run(main())
+        asyncio.run(main(args.workers))
     except KeyboardInterrupt:
         print("\n👋 Принудительная остановка")
\ No newline at end of file
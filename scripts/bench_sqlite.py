@@ -0,0 +1,203 @@
+"""
+BENCH_SQLITE.PY - Конкурентная нагрузка на SQLite в разных профилях
+
+Писатели (upsert пользователя + обновление платежа в одной транзакции,
+с паузой внутри, как у хендлера) и читатели (пользователь и его ключи)
+работают одновременно заданное время. Для каждого профиля печатаются
+пропускная способность, p50/p99 и число ошибок "database is locked".
+
+Профили:
+    default       - как было: rollback journal, без PRAGMA, пула и очереди записи
+    wal           - WAL, PRAGMA из sqlite_pragmas() и пул соединений
+    wal+writer    - WAL, PRAGMA и очередь записи (SQLiteSession)
+
+Пример:
+    python -m scripts.bench_sqlite --writers 16 --readers 32 --duration 10
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+from typing import Dict, List
+
+os.environ.setdefault("BOT_TOKEN", "bench")
+
+from sqlalchemy import insert, select, update  # noqa: E402
+from sqlalchemy.dialects import sqlite  # noqa: E402
+from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine  # noqa: E402
+
+from src.models.base import Base  # noqa: E402
+from src.models.user import User  # noqa: E402
+from src.models.vpn_key import VPNKey  # noqa: E402
+from src.models.payment import Payment  # noqa: E402
+from src.services.database import (  # noqa: E402
+    SQLiteSession, WriterLock, setup_sqlite, sqlite_engine_kwargs, sqlite_pragmas
+)
+
+PROFILES = ["default", "wal", "wal+writer"]
+
+
+def percentile(samples: List[float], q: float) -> float:
+    if not samples:
+        return 0.0
+    samples = sorted(samples)
+    return samples[min(int(len(samples) * q), len(samples) - 1)]
+
+
+async def seed(maker, args) -> None:
+    now = datetime.now()
+    async with maker() as session:
+        await session.execute(insert(User), [
+            {"id": i, "telegram_id": 1_000_000 + i, "first_name": f"user{i}"}
+            for i in range(1, args.users + 1)
+        ])
+        await session.execute(insert(VPNKey), [
+            {
+                "key_name": f"key{i}", "user_id": random.randint(1, args.users),
+                "private_key": "x", "public_key": f"pub{i}", "ip_address": "10.0.0.2",
+                "config_data": "", "days": 30, "created_at": now,
+                "expires_at": now + timedelta(days=30), "status": "active",
+            }
+            for i in range(1, args.users * 2 + 1)
+        ])
+        await session.execute(insert(Payment), [
+            {
+                "id": i, "payment_id": f"pay{i}", "user_id": i, "amount": 300.0,
+                "method": "card", "payment_details": "", "status": "pending",
+                "created_at": now, "expires_at": now + timedelta(minutes=30),
+            }
+            for i in range(1, args.users + 1)
+        ])
+        await session.commit()
+
+
+async def run_profile(profile: str, args) -> Dict[str, float]:
+    path = os.path.join(tempfile.mkdtemp(), "bench.db")
+    engine_kwargs = {}
+    if profile != "default":
+        engine_kwargs = sqlite_engine_kwargs(pool_size=args.pool_size)
+    engine = create_async_engine(f"sqlite+aiosqlite:///{path}", **engine_kwargs)
+
+    session_kwargs = {"class_": AsyncSession}
+    writer = None
+    if profile != "default":
+        setup_sqlite(engine, sqlite_pragmas(busy_timeout=args.busy_timeout))
+    if profile == "wal+writer":
+        writer = WriterLock(timeout=args.busy_timeout)
+        session_kwargs = {"class_": SQLiteSession, "writer": writer}
+
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+
+    maker = async_sessionmaker(engine, expire_on_commit=False, **session_kwargs)
+    await seed(maker, args)
+
+    write_times: List[float] = []
+    read_times: List[float] = []
+    errors = 0
+    deadline = time.monotonic() + args.duration
+
+    async def writer_loop() -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            user_id = random.randint(1, args.users)
+            started = time.perf_counter()
+            try:
+                async with maker() as session:
+                    stmt = sqlite.insert(User).values(telegram_id=1_000_000 + user_id, first_name="upd")
+                    await session.execute(
+                        stmt.on_conflict_do_update(
+                            index_elements=[User.telegram_id],
+                            set_={"first_name": stmt.excluded.first_name}
+                        )
+                    )
+                    # Работа хендлера внутри транзакции
+                    await asyncio.sleep(args.hold_ms / 1000)
+                    await session.execute(
+                        update(Payment).where(Payment.id == user_id).values(status="paid")
+                    )
+                    await session.commit()
+                write_times.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+
+    async def reader_loop() -> None:
+        nonlocal errors
+        while time.monotonic() < deadline:
+            user_id = random.randint(1, args.users)
+            started = time.perf_counter()
+            try:
+                async with maker() as session:
+                    await session.execute(select(User).where(User.telegram_id == 1_000_000 + user_id))
+                    result = await session.execute(
+                        select(VPNKey).where(VPNKey.user_id == user_id, VPNKey.status == "active")
+                    )
+                    result.scalars().all()
+                read_times.append((time.perf_counter() - started) * 1000)
+            except Exception:
+                errors += 1
+
+    await asyncio.gather(
+        *(writer_loop() for _ in range(args.writers)),
+        *(reader_loop() for _ in range(args.readers)),
+    )
+    await engine.dispose()
+
+    result = {
+        "writes_s": len(write_times) / args.duration,
+        "reads_s": len(read_times) / args.duration,
+        "write_p50": percentile(write_times, 0.5),
+        "write_p99": percentile(write_times, 0.99),
+        "read_p50": percentile(read_times, 0.5),
+        "read_p99": percentile(read_times, 0.99),
+        "errors": errors,
+    }
+    if writer:
+        result["writer_wait_avg"] = writer.stats()["wait_avg_ms"]
+    return result
+
+
+async def main(args) -> None:
+    print(
+        f"Писателей: {args.writers}, читателей: {args.readers}, "
+        f"{args.duration:g} с на профиль, пауза в транзакции {args.hold_ms:g} мс"
+    )
+
+    results = {}
+    for profile in args.profiles:
+        print(f"\n• {profile}...")
+        results[profile] = await run_profile(profile, args)
+        r = results[profile]
+        print(
+            f"    запись: {r['writes_s']:.0f}/с (p50 {r['write_p50']:.1f} мс, p99 {r['write_p99']:.1f} мс)\n"
+            f"    чтение: {r['reads_s']:.0f}/с (p50 {r['read_p50']:.1f} мс, p99 {r['read_p99']:.1f} мс)\n"
+            f"    ошибок: {r['errors']}"
+        )
+
+    print("\n===== итог =====")
+    print(f"{'профиль':<12} {'запись/с':>9} {'чтение/с':>9} {'p99 зап.':>9} {'p99 чт.':>9} {'ошибок':>7}")
+    for profile, r in results.items():
+        print(
+            f"{profile:<12} {r['writes_s']:>9.0f} {r['reads_s']:>9.0f} "
+            f"{r['write_p99']:>9.1f} {r['read_p99']:>9.1f} {r['errors']:>7}"
+        )
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Бенчмарк конкурентного доступа к SQLite")
+    parser.add_argument("--writers", type=int, default=16)
+    parser.add_argument("--readers", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=10, help="секунд на профиль")
+    parser.add_argument("--hold-ms", type=float, default=2, help="пауза внутри пишущей транзакции")
+    parser.add_argument("--busy-timeout", type=float, default=5)
+    parser.add_argument("--pool-size", type=int, default=8, help="соединений в пуле (профили wal)")
+    parser.add_argument("--users", type=int, default=10_000)
+    parser.add_argument("--profiles", nargs="+", choices=PROFILES, default=PROFILES)
+    args = parser.parse_args()
+
+    random.seed(42)
+    asyncio.run(main(args))
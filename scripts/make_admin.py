@@ -7,10 +7,7 @@ async def make_admin(telegram_id: int):
     await create_db_pool()
 
     async for session in get_session():
-        user = await UserDAO.get_by_telegram_id(session, telegram_id)
-        if user:
-            user.is_admin = True
-            await session.commit()
+        if await UserDAO.set_admin(session, telegram_id):
             print(f"✅ Пользователь {telegram_id} теперь админ")
         else:
             print(f"❌ Пользователь {telegram_id} не найден в базе")
@@ -0,0 +1,87 @@
+"""
+POST_UPDATES.PY - Отправка записанных апдейтов на локальный webhook
+
+Файл - JSON-массив апдейтов или JSONL (один апдейт в строке), например
+сохраненный ответ getUpdates. Апдейты отправляются так же, как это делает
+Telegram (с секретным токеном), затем печатаются метрики очереди.
+
+Пример:
+    BOT_MODE=webhook python run.py
+    python -m scripts.post_updates updates.jsonl --repeat 100 --concurrency 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import Counter
+from typing import Any, Dict, List
+
+import aiohttp
+
+
+def load_updates(path: str) -> List[Dict[str, Any]]:
+    with open(path, encoding="utf-8") as f:
+        content = f.read().strip()
+
+    if content.startswith("["):
+        updates = json.loads(content)
+    else:
+        updates = [json.loads(line) for line in content.splitlines() if line.strip()]
+
+    # Ответ getUpdates целиком: {"ok": true, "result": [...]}
+    if isinstance(updates, dict):
+        updates = updates.get("result", [])
+    return updates
+
+
+async def main(args) -> None:
+    updates = load_updates(args.file)
+    headers = {"X-Telegram-Bot-Api-Secret-Token": args.secret}
+    statuses: Counter = Counter()
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def post(session: aiohttp.ClientSession, update: Dict[str, Any]) -> None:
+        async with semaphore:
+            started = time.perf_counter()
+            async with session.post(args.url, json=update, headers=headers) as response:
+                statuses[response.status] += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    # Каждый повтор получает свой update_id, как при реальной доставке
+    batch = []
+    for n in range(args.repeat):
+        for update in updates:
+            update = dict(update)
+            update["update_id"] = update.get("update_id", 0) + n * 1_000_000
+            batch.append(update)
+
+    async with aiohttp.ClientSession() as session:
+        started = time.perf_counter()
+        await asyncio.gather(*(post(session, update) for update in batch))
+        elapsed = time.perf_counter() - started
+
+        latencies.sort()
+        print(f"Отправлено: {len(batch)} за {elapsed:.2f} с ({len(batch) / elapsed:.0f}/с)")
+        print(f"Ответы: {dict(statuses)}")
+        print(
+            f"Время ответа: p50 {latencies[len(latencies) // 2]:.1f} мс, "
+            f"p99 {latencies[int(len(latencies) * 0.99) - 1]:.1f} мс"
+        )
+
+        await asyncio.sleep(args.settle)
+        async with session.get(f"{args.url.rstrip('/')}/metrics", headers=headers) as response:
+            print("Метрики очереди:", json.dumps(await response.json(), ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Отправка записанных апдейтов на webhook")
+    parser.add_argument("file", help="JSON/JSONL файл с апдейтами")
+    parser.add_argument("--url", default="http://127.0.0.1:8080/webhook")
+    parser.add_argument("--secret", default=os.getenv("WEBHOOK_SECRET", ""))
+    parser.add_argument("--repeat", type=int, default=1, help="сколько раз отправить набор")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--settle", type=float, default=1.0, help="пауза перед чтением метрик, с")
+    asyncio.run(main(parser.parse_args()))
@@ -0,0 +1,204 @@
+"""
+FSM_STORAGE.PY - Хранилища состояний FSM
+
+FSM_STORAGE=memory - MemoryStorage aiogram (по умолчанию, один процесс)
+FSM_STORAGE=sql    - таблица fsm_states в основной БД
+FSM_STORAGE=redis  - Redis (нужен пакет redis)
+
+Для sql и redis брошенные состояния удаляются через FSM_TTL, а чтения
+обслуживаются из кэша в процессе (CachedStorage).
+"""
+
+import asyncio
+import copy
+import json
+import logging
+from datetime import datetime, timedelta
+from typing import Any, Dict, Mapping, Optional
+
+from aiogram.fsm.state import State
+from aiogram.fsm.storage.base import BaseStorage, DefaultKeyBuilder, KeyBuilder, StateType, StorageKey
+from aiogram.fsm.storage.memory import MemoryStorage
+from cachetools import TTLCache
+from sqlalchemy import delete, select
+from sqlalchemy.dialects import postgresql, sqlite
+
+from src.config import config
+from src.models.fsm_state import FSMState
+from src.services import database
+
+logger = logging.getLogger(__name__)
+
+_MISSING = object()
+
+
+class SQLStorage(BaseStorage):
+    """Хранилище FSM в таблице fsm_states (движок общий с ботом)
+
+    Работает в собственных коротких сессиях, чтобы запись состояния не
+    коммитила транзакцию хендлера.
+    """
+
+    def __init__(self, ttl: int, key_builder: Optional[KeyBuilder] = None):
+        self.ttl = ttl
+        self.key_builder = key_builder or DefaultKeyBuilder(with_destiny=True)
+        self._table = FSMState.__table__
+        self._purge_task: Optional[asyncio.Task] = None
+
+    def _cutoff(self) -> datetime:
+        return datetime.now() - timedelta(seconds=self.ttl)
+
+    async def _upsert(self, key: str, **values) -> None:
+        values["updated_at"] = datetime.now()
+
+        async with database.async_session_maker() as session:
+            dialect = session.get_bind().dialect.name
+            insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+            stmt = insert(self._table).values(key=key, **values)
+            stmt = stmt.on_conflict_do_update(index_elements=[self._table.c.key], set_=values)
+            await session.execute(stmt)
+
+            # Пустые записи (после state.clear()) не храним
+            await session.execute(
+                delete(self._table).where(
+                    self._table.c.key == key,
+                    self._table.c.state.is_(None),
+                    self._table.c.data == "{}"
+                )
+            )
+            await session.commit()
+
+        self._ensure_purge()
+
+    async def _get(self, key: str):
+        async with database.async_session_maker() as session:
+            result = await session.execute(
+                select(self._table.c.state, self._table.c.data).where(
+                    self._table.c.key == key,
+                    self._table.c.updated_at >= self._cutoff()
+                )
+            )
+            return result.one_or_none()
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        state = state.state if isinstance(state, State) else state
+        await self._upsert(self.key_builder.build(key), state=state)
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        row = await self._get(self.key_builder.build(key))
+        return row.state if row else None
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self._upsert(self.key_builder.build(key), data=json.dumps(dict(data)))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        row = await self._get(self.key_builder.build(key))
+        return json.loads(row.data) if row and row.data else {}
+
+    async def purge_expired(self) -> int:
+        """Удалить состояния, не менявшиеся дольше TTL"""
+        async with database.async_session_maker() as session:
+            result = await session.execute(
+                delete(self._table).where(self._table.c.updated_at < self._cutoff())
+            )
+            await session.commit()
+            return result.rowcount
+
+    async def _purge_loop(self) -> None:
+        interval = min(self.ttl, 3600)
+        while True:
+            try:
+                await asyncio.sleep(interval)
+                count = await self.purge_expired()
+                if count:
+                    logger.info(f"Удалено брошенных состояний FSM: {count}")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка очистки состояний FSM: {e}")
+
+    def _ensure_purge(self) -> None:
+        if self._purge_task is None or self._purge_task.done():
+            self._purge_task = asyncio.create_task(self._purge_loop())
+
+    async def close(self) -> None:
+        if self._purge_task:
+            self._purge_task.cancel()
+            self._purge_task = None
+
+
+class CachedStorage(BaseStorage):
+    """Кэш чтений поверх другого хранилища (запись - сквозная)
+
+    Корректен, пока апдейты одного пользователя обрабатывает один
+    процесс; срок кэша ограничивает расхождение в остальных случаях.
+    """
+
+    def __init__(self, storage: BaseStorage, ttl: float, maxsize: int = 10000):
+        self.storage = storage
+        self._states: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._data: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self.hits = 0
+        self.misses = 0
+
+    async def set_state(self, key: StorageKey, state: StateType = None) -> None:
+        await self.storage.set_state(key, state)
+        self._states[key] = state.state if isinstance(state, State) else state
+
+    async def get_state(self, key: StorageKey) -> Optional[str]:
+        state = self._states.get(key, _MISSING)
+        if state is not _MISSING:
+            self.hits += 1
+            return state
+
+        self.misses += 1
+        state = await self.storage.get_state(key)
+        self._states[key] = state
+        return state
+
+    async def set_data(self, key: StorageKey, data: Mapping[str, Any]) -> None:
+        await self.storage.set_data(key, data)
+        self._data[key] = copy.deepcopy(dict(data))
+
+    async def get_data(self, key: StorageKey) -> Dict[str, Any]:
+        data = self._data.get(key, _MISSING)
+        if data is not _MISSING:
+            self.hits += 1
+        else:
+            self.misses += 1
+            data = await self.storage.get_data(key)
+            self._data[key] = data
+        # Копия, чтобы изменения хендлера не попадали в кэш без set_data
+        return copy.deepcopy(data)
+
+    async def close(self) -> None:
+        await self.storage.close()
+
+
+def create_storage() -> BaseStorage:
+    """Хранилище FSM по настройке FSM_STORAGE"""
+    backend = config.fsm.storage.lower()
+
+    if backend == "memory":
+        return MemoryStorage()
+
+    if backend == "sql":
+        storage = SQLStorage(ttl=config.fsm.ttl)
+    elif backend == "redis":
+        try:
+            from aiogram.fsm.storage.redis import RedisStorage
+        except ImportError:
+            raise Exception("Для FSM_STORAGE=redis установите пакет redis (pip install redis)")
+
+        storage = RedisStorage.from_url(
+            config.fsm.redis_url,
+            key_builder=DefaultKeyBuilder(with_destiny=True),
+            state_ttl=config.fsm.ttl,
+            data_ttl=config.fsm.ttl
+        )
+    else:
+        raise Exception(f"Неизвестное хранилище FSM: {config.fsm.storage}")
+
+    logger.info(f"Хранилище FSM: {backend} (TTL {config.fsm.ttl} с)")
+    return CachedStorage(storage, ttl=config.fsm.cache_ttl, maxsize=config.fsm.cache_size)
@@ -1,6 +1,7 @@
 from aiogram import Dispatcher
 from src.bot.middlewares.throttling import ThrottlingMiddleware
 from src.bot.middlewares.database import DatabaseMiddleware
+from src.bot.middlewares.activity import ActivityMiddleware
 
 from src.handlers.start import start_router
 from src.handlers.admin import admin_router
@@ -14,8 +15,10 @@ async def setup_middlewares(dp: Dispatcher) -> None:
     """
     Подключение middleware
     """
-    dp.update.middleware(DatabaseMiddleware())
+    # Ограничение частоты первым: отброшенный апдейт не трогает БД
     dp.update.middleware(ThrottlingMiddleware())
+    dp.update.middleware(ActivityMiddleware())
+    dp.update.middleware(DatabaseMiddleware())
 
 
 def setup_routers() -> list:
@@ -1,4 +1,6 @@
 from .throttling import ThrottlingMiddleware
 from .database import DatabaseMiddleware
+from .activity import ActivityMiddleware
+from .admin import AdminOnlyMiddleware
 
-__all__ = ["ThrottlingMiddleware", "DatabaseMiddleware"]
\ No newline at end of file
+__all__ = ["ThrottlingMiddleware", "DatabaseMiddleware", "ActivityMiddleware", "AdminOnlyMiddleware"]
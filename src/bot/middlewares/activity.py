@@ -0,0 +1,21 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from src.services.activity import activity_tracker
+
+
+class ActivityMiddleware(BaseMiddleware):
+    """Middleware для учета последней активности пользователя
+
+    Только отмечает время в памяти; в БД пишет activity_tracker пачками.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
+            data: Dict[str, Any]
+    ) -> Any:
+        user = data.get("event_from_user")
+        if user:
+            activity_tracker.touch(user.id)
+        return await handler(event, data)
@@ -0,0 +1,27 @@
+from typing import Any, Awaitable, Callable, Dict
+from aiogram import BaseMiddleware
+from aiogram.types import Message, CallbackQuery
+from src.config import config
+
+
+class AdminOnlyMiddleware(BaseMiddleware):
+    """Доступ к хендлерам админ-роутера только для ADMIN_IDS
+
+    Подключается как внутренний middleware роутера: вызывается, когда
+    фильтры хендлера уже совпали, поэтому апдейты других роутеров не
+    задевает. Новый хендлер админки без проверки прав не останется открытым.
+    """
+
+    async def __call__(
+            self,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Message | CallbackQuery,
+            data: Dict[str, Any]
+    ) -> Any:
+        if event.from_user and event.from_user.id in config.bot.admin_ids:
+            return await handler(event, data)
+
+        if isinstance(event, CallbackQuery):
+            await event.answer("❌ Нет прав администратора", show_alert=True)
+        else:
+            await event.answer("❌ Нет прав администратора")
@@ -1,10 +1,15 @@
 from typing import Any, Awaitable, Callable, Dict
 from aiogram import BaseMiddleware
-from src.services.database import async_session_maker
+from src.services import database
+from src.services.database import LazySession, current_session
 
 
 class DatabaseMiddleware(BaseMiddleware):
-    """Middleware для работы с базой данных"""
+    """Middleware для работы с базой данных
+
+    Передает в хендлеры ленивую сессию: соединение берется из пула только
+    при первом запросе, а get_session() внутри апдейта отдает ту же сессию.
+    """
 
     async def __call__(
             self,
@@ -12,12 +17,18 @@ class DatabaseMiddleware(BaseMiddleware):
             event: Any,
             data: Dict[str, Any]
     ) -> Any:
-        async with async_session_maker() as session:
-            data["session"] = session
-            try:
-                result = await handler(event, data)
+        session = LazySession(database.async_session_maker)
+        token = current_session.set(session)
+        data["session"] = session
+        try:
+            result = await handler(event, data)
+            if session.used:
                 await session.commit()
-                return result
-            except Exception as e:
+            return result
+        except Exception as e:
+            if session.used:
                 await session.rollback()
-                raise e
\ No newline at end of file
+            raise e
+        finally:
+            current_session.reset(token)
+            await session.release()
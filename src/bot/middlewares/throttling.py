@@ -1,37 +1,52 @@
-from typing import Any, Awaitable, Callable, Dict
+from typing import Any, Awaitable, Callable, Dict, Optional
 from aiogram import BaseMiddleware
-from aiogram.types import Message, CallbackQuery
+from aiogram.types import Message, CallbackQuery, Update
 from cachetools import TTLCache
-import time
+from src.config import config
+from src.services.rate_limit import throttler
+
+
+def route_for(event: Message | CallbackQuery) -> str:
+    """Маршрут апдейта для выбора стоимости"""
+    if isinstance(event, CallbackQuery):
+        return "callback"
+    if event.photo or event.document:
+        return "upload"
+    if event.text and event.text.startswith("/"):
+        command = event.text[1:].split(maxsplit=1)[0].split("@", 1)[0]
+        if command in config.throttling.costs:
+            return command
+    return "message"
 
 
 class ThrottlingMiddleware(BaseMiddleware):
-    """Middleware для защиты от спама"""
+    """Middleware для защиты от спама (token bucket, см. services/rate_limit.py)"""
 
-    def __init__(self, rate_limit: float = 0.5):
-        self.rate_limit = rate_limit
-        self.cache = TTLCache(maxsize=10000, ttl=3600)
+    def __init__(self, warn_interval: float = 5):
+        # Кому уже сказали "подождите" - не чаще раза в warn_interval секунд
+        self.warned = TTLCache(maxsize=10000, ttl=warn_interval)
 
     async def __call__(
             self,
-            handler: Callable[[Message, Dict[str, Any]], Awaitable[Any]],
-            event: Message | CallbackQuery,
+            handler: Callable[[Any, Dict[str, Any]], Awaitable[Any]],
+            event: Any,
             data: Dict[str, Any]
     ) -> Any:
-        if isinstance(event, Message):
-            user_id = event.from_user.id
-        elif isinstance(event, CallbackQuery):
-            user_id = event.from_user.id
-        else:
+        inner = event.event if isinstance(event, Update) else event
+        if not isinstance(inner, (Message, CallbackQuery)) or not inner.from_user:
             return await handler(event, data)
 
-        last_time = self.cache.get(user_id)
-        current_time = time.time()
+        user_id: Optional[int] = inner.from_user.id
+        if user_id in config.bot.admin_ids:
+            user_id = None
 
-        if last_time and (current_time - last_time) < self.rate_limit:
-            if isinstance(event, Message) and (current_time - last_time) > 0.1:
-                await event.answer("⏳ Слишком много запросов! Подождите немного.")
-            return
+        if await throttler.acquire(user_id, route_for(inner)):
+            return await handler(event, data)
 
-        self.cache[user_id] = current_time
-        return await handler(event, data)
\ No newline at end of file
+        # Отброшенный апдейт всегда получает ответ: callback - всплывающую
+        # подсказку (без нее кнопка "висит"), сообщение - не чаще warn_interval
+        if isinstance(inner, CallbackQuery):
+            await inner.answer("⏳ Слишком часто, подождите немного")
+        elif user_id is not None and user_id not in self.warned:
+            self.warned[user_id] = True
+            await inner.answer("⏳ Слишком много запросов! Подождите немного.")
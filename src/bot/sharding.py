@@ -0,0 +1,446 @@
+"""
+SHARDING.PY - Многопроцессный режим: супервизор и шарды
+
+Супервизор получает апдейты (polling или webhook) и раскладывает их по
+очередям N процессов-шардов по from_user.id. Апдейты одного пользователя
+всегда попадают в один шард и обрабатываются по порядку, поэтому FSM в
+памяти и ThrottlingMiddleware работают как в одном процессе.
+
+Админы закреплены за шардом 0. Только в нем работают синглтоны:
+планировщик истечения ключей, пул ключей и выдача IP адресов.
+
+Сброс кэша пользователей (бан, права) шард рассылает остальным через
+их очереди сбросов - кэш одного шарда не отстает от изменений в другом.
+
+Сигналы супервизору: SIGTERM/SIGINT - остановка, SIGHUP - поочередный
+перезапуск шардов без потери апдейтов (очереди живут в супервизоре).
+"""
+
+import asyncio
+import logging
+import multiprocessing as mp
+import os
+import queue as queue_module
+import signal
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.types import Update
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+# Сколько ждать первого пульса нового шарда (импорт и прогрев)
+STARTUP_TIMEOUT = 120
+
+
+def update_user_id(update: Dict[str, Any]) -> Optional[int]:
+    """Пользователь, от которого пришел апдейт (или чат, если его нет)"""
+    for key, event in update.items():
+        if key == "update_id" or not isinstance(event, dict):
+            continue
+        user = event.get("from") or event.get("user")
+        if isinstance(user, dict):
+            return user.get("id")
+        chat = event.get("chat")
+        if isinstance(chat, dict):
+            return chat.get("id")
+    return None
+
+
+def shard_for(user_id: Optional[int], shards: int) -> int:
+    if user_id is None or user_id in config.bot.admin_ids:
+        return 0
+    return user_id % shards
+
+
+class ShardRouter:
+    """Раскладывает апдейты по очередям шардов
+
+    Повторяет интерфейс Dispatcher, нужный WebhookServer (feed_update,
+    resolve_used_update_types), поэтому webhook работает и в супервизоре.
+    """
+
+    def __init__(self, queues: List[Any], used_update_types: List[str]):
+        self.queues = queues
+        self.used_update_types = used_update_types
+        self.routed = [0] * len(queues)
+        self.blocked = 0
+
+    async def feed_update(self, bot: Bot, update: Update) -> None:
+        data = update.model_dump(mode="json", exclude_none=True, by_alias=True)
+        user_id = update_user_id(data)
+        shard = shard_for(user_id, len(self.queues))
+
+        # Очередь шарда полна - ждем (обратное давление на прием апдейтов)
+        while True:
+            try:
+                self.queues[shard].put_nowait((user_id, data))
+                break
+            except queue_module.Full:
+                self.blocked += 1
+                await asyncio.sleep(0.05)
+
+        self.routed[shard] += 1
+
+    def resolve_used_update_types(self) -> List[str]:
+        return self.used_update_types
+
+
+# ===================== ШАРД =====================
+
+def worker_main(shard: int, shards: int, updates, health, invalidations) -> None:
+    """Точка входа процесса-шарда"""
+    # Ctrl+C получает вся группа процессов - останавливает шарды супервизор
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    asyncio.run(_run_worker(shard, shards, updates, health, invalidations))
+
+
+def _get_update(updates):
+    return updates.get()
+
+
+def share_user_cache(shard: int, invalidations: List[Any]) -> asyncio.Task:
+    """Рассылать сбросы кэша пользователей другим шардам и принимать их"""
+    from src.services.dao import user_cache
+
+    def publish(telegram_ids: List[int]) -> None:
+        for other, inbox in enumerate(invalidations):
+            if other == shard:
+                continue
+            try:
+                inbox.put_nowait(telegram_ids)
+            except queue_module.Full:
+                logger.warning(f"Очередь сбросов кэша шарда {other} полна - запись устареет через TTL")
+
+    def read():
+        try:
+            return invalidations[shard].get(timeout=1)
+        except queue_module.Empty:
+            return None
+
+    async def receive() -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            telegram_ids = await loop.run_in_executor(None, read)
+            if telegram_ids:
+                user_cache.invalidate_many(telegram_ids, broadcast=False)
+
+    user_cache.publish = publish
+    return asyncio.create_task(receive())
+
+
+async def _run_worker(shard: int, shards: int, updates, health, invalidations) -> None:
+    from src.main import create_bot, create_dispatcher, start_services, stop_services
+    from src.bot.fsm_storage import create_storage
+    from src.services.database import create_db_pool, close_db_pool
+
+    stats = {"processed": 0, "failed": 0, "in_flight": 0}
+
+    async def heartbeat() -> None:
+        while True:
+            try:
+                health.put_nowait({"shard": shard, "pid": os.getpid(), "ts": time.time(), **stats})
+            except queue_module.Full:
+                pass
+            await asyncio.sleep(config.sharding.heartbeat_interval)
+
+    # Пульс до запуска сервисов: прогрев шарда 0 может идти долго
+    heartbeat_task = asyncio.create_task(heartbeat())
+    invalidation_task = share_user_cache(shard, invalidations)
+
+    await create_db_pool()
+    bot = create_bot()
+    storage = create_storage()
+    dp = await create_dispatcher(storage)
+    await start_services(bot, primary=shard == 0, shards=shards)
+
+    loop = asyncio.get_running_loop()
+    semaphore = asyncio.Semaphore(config.sharding.concurrency)
+    # Последняя задача каждого пользователя: следующая ждет ее завершения
+    chains: Dict[int, asyncio.Task] = {}
+
+    async def handle(previous: Optional[asyncio.Task], update: Update) -> None:
+        try:
+            if previous:
+                await asyncio.wait({previous})
+            await dp.feed_update(bot, update)
+            stats["processed"] += 1
+        except Exception as e:
+            stats["failed"] += 1
+            logger.error(f"Шард {shard}: ошибка обработки апдейта {update.update_id}: {e}")
+        finally:
+            stats["in_flight"] -= 1
+            semaphore.release()
+
+    def forget(user_id: int, task: asyncio.Task) -> None:
+        if chains.get(user_id) is task:
+            del chains[user_id]
+
+    logger.info(f"Шард {shard}/{shards} запущен (pid {os.getpid()}, основной: {shard == 0})")
+
+    try:
+        while True:
+            await semaphore.acquire()
+            item = await loop.run_in_executor(None, _get_update, updates)
+            if item is None:
+                semaphore.release()
+                break
+
+            user_id, data = item
+            update = Update.model_validate(data, context={"bot": bot})
+
+            stats["in_flight"] += 1
+            task = asyncio.create_task(handle(chains.get(user_id), update))
+            chains[user_id] = task
+            task.add_done_callback(lambda t, uid=user_id: forget(uid, t))
+
+        # Дообрабатываем начатое
+        if chains:
+            await asyncio.gather(*list(chains.values()), return_exceptions=True)
+    finally:
+        heartbeat_task.cancel()
+        invalidation_task.cancel()
+        await stop_services()
+        await storage.close()
+        await bot.session.close()
+        await close_db_pool()
+        logger.info(f"Шард {shard} остановлен")
+
+
+# ===================== СУПЕРВИЗОР =====================
+
+class WorkerHandle:
+    """Процесс-шард и его последний пульс"""
+
+    def __init__(self, shard: int):
+        self.shard = shard
+        self.process: Optional[mp.Process] = None
+        self.heartbeat: Dict[str, Any] = {}
+        self.last_seen = 0.0
+        self.restarts = 0
+        self.restarting = False
+
+    @property
+    def alive(self) -> bool:
+        return self.process is not None and self.process.is_alive()
+
+    @property
+    def started(self) -> bool:
+        """Текущий процесс уже прислал пульс"""
+        return self.process is not None and self.heartbeat.get("pid") == self.process.pid
+
+
+class Supervisor:
+    """Запуск N шардов, раздача апдейтов, контроль здоровья"""
+
+    def __init__(self, workers: int):
+        self.shards = max(workers, 1)
+        self._ctx = mp.get_context("spawn")
+        self.queues = [self._ctx.Queue(maxsize=config.sharding.queue_size) for _ in range(self.shards)]
+        self.health = self._ctx.Queue(maxsize=10000)
+        self.invalidations = [self._ctx.Queue(maxsize=10000) for _ in range(self.shards)]
+        self.workers = [WorkerHandle(shard) for shard in range(self.shards)]
+        self._stopping = False
+
+    # ---------- процессы ----------
+
+    def _spawn(self, handle: WorkerHandle) -> None:
+        handle.process = self._ctx.Process(
+            target=worker_main,
+            args=(handle.shard, self.shards, self.queues[handle.shard], self.health, self.invalidations),
+            name=f"bot-shard-{handle.shard}"
+        )
+        handle.process.start()
+        handle.heartbeat = {}
+        handle.last_seen = time.time()
+        logger.info(f"Запущен шард {handle.shard} (pid {handle.process.pid})")
+
+    async def _stop_worker(self, handle: WorkerHandle, timeout: float = 30) -> None:
+        """Мягкая остановка: шард дообрабатывает очередь и выходит"""
+        if not handle.alive:
+            return
+
+        loop = asyncio.get_running_loop()
+        await loop.run_in_executor(None, self.queues[handle.shard].put, None)
+        await loop.run_in_executor(None, handle.process.join, timeout)
+
+        if handle.process.is_alive():
+            logger.warning(f"Шард {handle.shard} не остановился за {timeout} с - завершаем принудительно")
+            handle.process.terminate()
+            await loop.run_in_executor(None, handle.process.join, 5)
+
+    async def _restart(self, handle: WorkerHandle, graceful: bool) -> None:
+        handle.restarting = True
+        try:
+            if graceful:
+                await self._stop_worker(handle)
+            elif handle.alive:
+                handle.process.terminate()
+                await asyncio.get_running_loop().run_in_executor(None, handle.process.join, 5)
+            if not self._stopping:
+                handle.restarts += 1
+                self._spawn(handle)
+        finally:
+            handle.restarting = False
+
+    async def rolling_restart(self) -> None:
+        """Поочередный перезапуск шардов (SIGHUP)"""
+        logger.info("Поочередный перезапуск шардов")
+        for handle in self.workers:
+            if self._stopping:
+                break
+            await self._restart(handle, graceful=True)
+
+    # ---------- здоровье ----------
+
+    async def _collect_health(self) -> None:
+        loop = asyncio.get_running_loop()
+
+        def read():
+            try:
+                return self.health.get(timeout=1)
+            except queue_module.Empty:
+                return None
+
+        while True:
+            beat = await loop.run_in_executor(None, read)
+            if beat:
+                handle = self.workers[beat["shard"]]
+                # Пульс от уже замененного процесса не учитываем
+                if handle.process and beat["pid"] == handle.process.pid:
+                    handle.heartbeat = beat
+                    handle.last_seen = time.time()
+
+    async def _monitor(self) -> None:
+        while True:
+            await asyncio.sleep(config.sharding.heartbeat_interval)
+            for handle in self.workers:
+                if self._stopping or handle.restarting:
+                    continue
+                if not handle.alive:
+                    code = handle.process.exitcode if handle.process else None
+                    logger.error(f"Шард {handle.shard} завершился (код {code}) - перезапуск")
+                    asyncio.create_task(self._restart(handle, graceful=False))
+                elif time.time() - handle.last_seen > (
+                        config.sharding.heartbeat_timeout if handle.started else STARTUP_TIMEOUT):
+                    logger.error(f"Шард {handle.shard} не отвечает - перезапуск")
+                    asyncio.create_task(self._restart(handle, graceful=False))
+
+    def health_report(self) -> List[Dict[str, Any]]:
+        report = []
+        for handle in self.workers:
+            try:
+                backlog = self.queues[handle.shard].qsize()
+            except NotImplementedError:  # macOS
+                backlog = None
+            report.append({
+                "shard": handle.shard,
+                "pid": handle.process.pid if handle.process else None,
+                "alive": handle.alive,
+                "heartbeat_age": round(time.time() - handle.last_seen, 1),
+                "processed": handle.heartbeat.get("processed", 0),
+                "failed": handle.heartbeat.get("failed", 0),
+                "in_flight": handle.heartbeat.get("in_flight", 0),
+                "backlog": backlog,
+                "restarts": handle.restarts,
+            })
+        return report
+
+    async def _report(self) -> None:
+        while True:
+            await asyncio.sleep(config.sharding.report_interval)
+            for item in self.health_report():
+                status = "🟢" if item["alive"] else "🔴"
+                logger.info(
+                    f"{status} Шард {item['shard']} (pid {item['pid']}): пульс {item['heartbeat_age']} с назад, "
+                    f"обработано {item['processed']}, ошибок {item['failed']}, в работе {item['in_flight']}, "
+                    f"в очереди {item['backlog']}, перезапусков {item['restarts']}"
+                )
+
+    # ---------- прием апдейтов ----------
+
+    async def _poll(self, bot: Bot, router: ShardRouter) -> None:
+        await bot.delete_webhook()
+        offset: Optional[int] = None
+        try:
+            while True:
+                try:
+                    updates = await bot.get_updates(
+                        offset=offset,
+                        timeout=25,
+                        allowed_updates=router.used_update_types
+                    )
+                except asyncio.CancelledError:
+                    raise
+                except Exception as e:
+                    logger.error(f"Ошибка получения апдейтов: {e}")
+                    await asyncio.sleep(5)
+                    continue
+
+                for update in updates:
+                    await router.feed_update(bot, update)
+                    offset = update.update_id + 1
+        finally:
+            # Подтверждаем Telegram уже разложенные апдейты, чтобы не получить их повторно
+            if offset is not None:
+                try:
+                    await bot.get_updates(offset=offset, timeout=0, limit=1)
+                except Exception:
+                    pass
+
+    async def run(self) -> None:
+        from src.main import create_bot, create_dispatcher
+        from src.bot.webhook import WebhookServer
+
+        loop = asyncio.get_running_loop()
+        stop = asyncio.Event()
+        try:
+            loop.add_signal_handler(signal.SIGINT, stop.set)
+            loop.add_signal_handler(signal.SIGTERM, stop.set)
+            loop.add_signal_handler(signal.SIGHUP, lambda: asyncio.create_task(self.rolling_restart()))
+        except (NotImplementedError, AttributeError):  # Windows
+            pass
+
+        for handle in self.workers:
+            self._spawn(handle)
+
+        # Dispatcher здесь нужен только чтобы узнать используемые типы апдейтов
+        dp = await create_dispatcher(MemoryStorage())
+        router = ShardRouter(self.queues, dp.resolve_used_update_types())
+
+        bot = create_bot()
+        server: Optional[WebhookServer] = None
+        tasks = [
+            asyncio.create_task(self._collect_health()),
+            asyncio.create_task(self._monitor()),
+            asyncio.create_task(self._report()),
+        ]
+
+        if config.webhook.mode == "webhook":
+            server = WebhookServer(router, bot)
+            await server.start()
+        else:
+            tasks.append(asyncio.create_task(self._poll(bot, router)))
+
+        logger.info(f"🤖 Супервизор запущен: {self.shards} шардов, прием апдейтов: {config.webhook.mode}")
+
+        try:
+            await stop.wait()
+        finally:
+            logger.info("Остановка супервизора...")
+            self._stopping = True
+
+            # Сначала прекращаем прием апдейтов, затем мягко останавливаем шарды
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            if server:
+                await server.stop()
+
+            await asyncio.gather(*(self._stop_worker(handle) for handle in self.workers))
+            await bot.session.close()
+            logger.info("Супервизор остановлен")
@@ -0,0 +1,193 @@
+"""
+WEBHOOK.PY - Прием апдейтов через webhook (aiohttp)
+
+Запрос от Telegram проверяется по секретному токену, апдейт кладется в
+ограниченную очередь и сразу подтверждается ответом 200; обработку ведут
+WEBHOOK_WORKERS задач. При переполнении очереди отвечаем 503 - Telegram
+повторит доставку позже (обратное давление вместо роста памяти).
+
+GET {WEBHOOK_PATH}/metrics - глубина очереди, время ожидания апдейтов и пулы БД.
+"""
+
+import asyncio
+import hmac
+import logging
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from aiogram import Bot, Dispatcher
+from aiogram.types import Update
+from aiohttp import web
+
+from src.config import config
+from src.services.database import pool_stats
+
+logger = logging.getLogger(__name__)
+
+SECRET_HEADER = "X-Telegram-Bot-Api-Secret-Token"
+
+
+class UpdateQueue:
+    """Ограниченная очередь апдейтов с пулом обработчиков"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot, maxsize: int, workers: int):
+        self.dp = dp
+        self.bot = bot
+        self.workers = max(workers, 1)
+        self._queue: asyncio.Queue[Tuple[Update, float]] = asyncio.Queue(maxsize=maxsize)
+        self._tasks: List[asyncio.Task] = []
+
+        # Метрики
+        self.accepted = 0
+        self.rejected = 0
+        self.processed = 0
+        self.failed = 0
+        self.max_depth = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.handle_total = 0.0
+
+    @property
+    def depth(self) -> int:
+        return self._queue.qsize()
+
+    def put(self, update: Update) -> bool:
+        """Поставить апдейт в очередь (False - очередь переполнена)"""
+        try:
+            self._queue.put_nowait((update, time.monotonic()))
+        except asyncio.QueueFull:
+            self.rejected += 1
+            return False
+
+        self.accepted += 1
+        self.max_depth = max(self.max_depth, self._queue.qsize())
+        return True
+
+    async def _worker(self) -> None:
+        while True:
+            update, enqueued_at = await self._queue.get()
+            started = time.monotonic()
+            wait = started - enqueued_at
+            self.wait_total += wait
+            self.wait_max = max(self.wait_max, wait)
+
+            try:
+                await self.dp.feed_update(self.bot, update)
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка обработки апдейта {update.update_id}: {e}")
+            finally:
+                self.processed += 1
+                self.handle_total += time.monotonic() - started
+                self._queue.task_done()
+
+    def start(self) -> None:
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self, timeout: float = 10) -> None:
+        """Дообработать очередь (не дольше timeout) и остановить обработчики"""
+        try:
+            await asyncio.wait_for(self._queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Не обработано апдейтов при остановке: {self.depth}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def metrics(self) -> Dict[str, Any]:
+        processed = self.processed or 1
+        return {
+            "queue_depth": self.depth,
+            "queue_max_depth": self.max_depth,
+            "queue_size": self._queue.maxsize,
+            "workers": self.workers,
+            "accepted": self.accepted,
+            "rejected": self.rejected,
+            "processed": self.processed,
+            "failed": self.failed,
+            "wait_avg_ms": round(self.wait_total / processed * 1000, 2),
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "handle_avg_ms": round(self.handle_total / processed * 1000, 2),
+        }
+
+
+class WebhookServer:
+    """aiohttp сервер, принимающий апдейты Telegram"""
+
+    def __init__(self, dp: Dispatcher, bot: Bot):
+        self.dp = dp
+        self.bot = bot
+        self.queue = UpdateQueue(dp, bot, config.webhook.queue_size, config.webhook.workers)
+        self._runner: Optional[web.AppRunner] = None
+
+    def create_app(self) -> web.Application:
+        app = web.Application()
+        app.router.add_post(config.webhook.path, self.handle_update)
+        app.router.add_get(f"{config.webhook.path.rstrip('/')}/metrics", self.handle_metrics)
+        return app
+
+    async def handle_update(self, request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret, config.webhook.secret):
+            return web.Response(status=401)
+
+        try:
+            update = Update.model_validate(await request.json(), context={"bot": self.bot})
+        except Exception as e:
+            # Повтор того же тела не поможет - подтверждаем, чтобы Telegram не слал его снова
+            logger.warning(f"Некорректный апдейт отброшен: {e}")
+            return web.Response()
+
+        if not self.queue.put(update):
+            return web.Response(status=503, headers={"Retry-After": "1"})
+
+        return web.Response()
+
+    async def handle_metrics(self, request: web.Request) -> web.Response:
+        secret = request.headers.get(SECRET_HEADER, "")
+        if not hmac.compare_digest(secret, config.webhook.secret):
+            return web.Response(status=401)
+        return web.json_response({**self.queue.metrics(), "db": pool_stats()})
+
+    async def start(self) -> None:
+        self.queue.start()
+
+        self._runner = web.AppRunner(self.create_app())
+        await self._runner.setup()
+        site = web.TCPSite(self._runner, config.webhook.host, config.webhook.port)
+        await site.start()
+        logger.info(
+            f"Webhook сервер слушает {config.webhook.host}:{config.webhook.port}{config.webhook.path} "
+            f"(очередь {config.webhook.queue_size}, обработчиков {self.queue.workers})"
+        )
+
+        if config.webhook.url:
+            await self.bot.set_webhook(
+                url=f"{config.webhook.url.rstrip('/')}{config.webhook.path}",
+                secret_token=config.webhook.secret,
+                allowed_updates=self.dp.resolve_used_update_types()
+            )
+            logger.info("Webhook зарегистрирован в Telegram")
+        else:
+            logger.warning("WEBHOOK_URL не задан - webhook в Telegram не регистрируется")
+
+    async def stop(self) -> None:
+        # Сначала перестаем принимать запросы, затем дообрабатываем очередь
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+        await self.queue.stop()
+
+
+async def run_webhook(dp: Dispatcher, bot: Bot) -> None:
+    """Работа в режиме webhook до отмены задачи"""
+    server = WebhookServer(dp, bot)
+    await dp.emit_startup(bot=bot)
+    await server.start()
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await server.stop()
+        await dp.emit_shutdown(bot=bot)
@@ -1,6 +1,6 @@
 import os
 from dataclasses import dataclass, field
-from typing import List
+from typing import Dict, List
 from dotenv import load_dotenv
 
 # Загружаем переменные окружения
@@ -13,6 +13,34 @@ class DatabaseConfig:
     type: str = os.getenv("DB_TYPE", "sqlite")
     path: str = os.getenv("DB_PATH", "data/database/vpn_bot.db")
 
+    # Кэш пользователей (UserDAO.get_by_telegram_id)
+    user_cache_size: int = int(os.getenv("USER_CACHE_SIZE", "10000"))
+    user_cache_ttl: float = float(os.getenv("USER_CACHE_TTL", "60"))
+
+    # Запись last_activity пачками, не чаще раза в N секунд
+    activity_flush_interval: float = float(os.getenv("ACTIVITY_FLUSH_INTERVAL", "5"))
+
+    # Пул соединений PostgreSQL
+    pool_size: int = int(os.getenv("DB_POOL_SIZE", "20"))
+    max_overflow: int = int(os.getenv("DB_MAX_OVERFLOW", "10"))
+    pool_timeout: float = float(os.getenv("DB_POOL_TIMEOUT", "30"))
+    pool_recycle: int = int(os.getenv("DB_POOL_RECYCLE", "1800"))
+    # Кэш подготовленных запросов asyncpg на соединение (0 - для PgBouncer в режиме transaction)
+    statement_cache_size: int = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "100"))
+    # Реплика для чтения (postgresql+asyncpg://...), пусто - все запросы на основную БД
+    replica_url: str = os.getenv("DB_REPLICA_URL", "")
+
+    # Профиль SQLite: WAL (читатели не ждут писателя) и настройки соединений
+    sqlite_wal: bool = os.getenv("SQLITE_WAL", "1") == "1"
+    sqlite_synchronous: str = os.getenv("SQLITE_SYNCHRONOUS", "NORMAL")
+    sqlite_cache_mb: int = int(os.getenv("SQLITE_CACHE_MB", "64"))
+    sqlite_mmap_mb: int = int(os.getenv("SQLITE_MMAP_MB", "256"))
+    sqlite_busy_timeout: float = float(os.getenv("SQLITE_BUSY_TIMEOUT", "5"))
+    # Открытых соединений (0 - без пула, соединение на каждую сессию)
+    sqlite_pool_size: int = int(os.getenv("SQLITE_POOL_SIZE", "8"))
+    # Пишущие транзакции процесса идут по одной (без "database is locked")
+    sqlite_single_writer: bool = os.getenv("SQLITE_SINGLE_WRITER", "1") == "1"
+
     @property
     def url(self) -> str:
         if self.type == "postgres":
@@ -38,6 +66,124 @@ class BotConfig:
             self.admin_ids = [int(id_str.strip()) for id_str in ids_str.split(",") if id_str.strip()]
 
 
+@dataclass
+class WebhookConfig:
+    """Конфигурация приема апдейтов"""
+    # polling - long polling, webhook - aiohttp сервер
+    mode: str = os.getenv("BOT_MODE", "polling")
+
+    # Публичный адрес, на который Telegram шлет апдейты (https://example.com)
+    url: str = os.getenv("WEBHOOK_URL", "")
+    path: str = os.getenv("WEBHOOK_PATH", "/webhook")
+    secret: str = os.getenv("WEBHOOK_SECRET", "")
+
+    # Локальный сервер (обычно за nginx)
+    host: str = os.getenv("WEBHOOK_HOST", "0.0.0.0")
+    port: int = int(os.getenv("WEBHOOK_PORT", "8080"))
+
+    # Очередь апдейтов и обработчики
+    queue_size: int = int(os.getenv("WEBHOOK_QUEUE_SIZE", "1000"))
+    workers: int = int(os.getenv("WEBHOOK_WORKERS", "8"))
+
+
+@dataclass
+class ShardingConfig:
+    """Конфигурация многопроцессного режима (python run.py --workers N)"""
+    # 1 - обычный режим в одном процессе
+    workers: int = int(os.getenv("BOT_WORKERS", "1"))
+
+    # Очередь апдейтов каждого шарда и параллельность внутри шарда
+    queue_size: int = int(os.getenv("SHARD_QUEUE_SIZE", "1000"))
+    concurrency: int = int(os.getenv("SHARD_CONCURRENCY", "64"))
+
+    # Здоровье шардов: пульс, таймаут зависания, отчет в лог
+    heartbeat_interval: float = float(os.getenv("SHARD_HEARTBEAT_INTERVAL", "5"))
+    heartbeat_timeout: float = float(os.getenv("SHARD_HEARTBEAT_TIMEOUT", "30"))
+    report_interval: float = float(os.getenv("SHARD_REPORT_INTERVAL", "60"))
+
+
+@dataclass
+class ThrottlingConfig:
+    """Конфигурация ограничения частоты запросов (token bucket)"""
+    # memory - в процессе, redis - общий для всех процессов (REDIS_URL)
+    backend: str = os.getenv("THROTTLE_BACKEND", "memory")
+
+    # Корзина пользователя: пополнение токенов в секунду и емкость
+    rate: float = float(os.getenv("THROTTLE_RATE", "1"))
+    burst: float = float(os.getenv("THROTTLE_BURST", "10"))
+    max_users: int = int(os.getenv("THROTTLE_MAX_USERS", "100000"))
+
+    # Стоимость маршрутов: callback, message, upload (фото/документ) или имя команды
+    costs: Dict[str, float] = field(default_factory=dict)
+
+    def __post_init__(self):
+        costs_str = os.getenv("THROTTLE_COSTS", "callback=0.5,message=1,upload=5,vpnkey=5")
+        for item in costs_str.split(","):
+            if "=" in item:
+                route, cost = item.split("=", 1)
+                self.costs[route.strip().lstrip("/")] = float(cost)
+
+
+@dataclass
+class SenderConfig:
+    """Конфигурация очереди исходящих сообщений"""
+    workers: int = int(os.getenv("SENDER_WORKERS", "8"))
+    queue_size: int = int(os.getenv("SENDER_QUEUE_SIZE", "10000"))
+    # Мест очереди, доступных только сообщениям PRIORITY_HIGH
+    high_reserve: int = int(os.getenv("SENDER_HIGH_RESERVE", "1000"))
+
+    # Лимиты Telegram: ~30 сообщений в секунду на бота и ~1 в секунду на чат
+    global_rate: float = float(os.getenv("SENDER_GLOBAL_RATE", "25"))
+    chat_rate: float = float(os.getenv("SENDER_CHAT_RATE", "1"))
+    chat_burst: float = float(os.getenv("SENDER_CHAT_BURST", "3"))
+    max_chats: int = int(os.getenv("SENDER_MAX_CHATS", "100000"))
+
+    # Попыток при сетевых ошибках и 429
+    max_attempts: int = int(os.getenv("SENDER_MAX_ATTEMPTS", "5"))
+
+
+@dataclass
+class BroadcastConfig:
+    """Конфигурация рассылок"""
+    # Пользователей в пачке: после каждой пачки сохраняется контрольная точка
+    chunk_size: int = int(os.getenv("BROADCAST_CHUNK", "500"))
+
+
+@dataclass
+class ProvisioningConfig:
+    """Конфигурация массовой выдачи ключей"""
+    # Платежей в пачке: одна команда на сервере и одна транзакция на пачку
+    batch_size: int = int(os.getenv("PROVISION_BATCH", "100"))
+
+
+@dataclass
+class JobsConfig:
+    """Конфигурация очереди фоновых задач (выдача и отзыв ключей)"""
+    workers: int = int(os.getenv("JOBS_WORKERS", "2"))
+    # Как часто проверять таблицу, если задачи ставит другой процесс
+    poll_interval: float = float(os.getenv("JOBS_POLL_INTERVAL", "1"))
+    # Предел на пачку задач (зависший SSH); дольше - ошибка и повтор
+    timeout: float = float(os.getenv("JOBS_TIMEOUT", "120"))
+    max_attempts: int = int(os.getenv("JOBS_MAX_ATTEMPTS", "5"))
+    # Пауза перед повтором: base * 2^(попытка-1), не больше max
+    retry_base: float = float(os.getenv("JOBS_RETRY_BASE", "10"))
+    retry_max: float = float(os.getenv("JOBS_RETRY_MAX", "900"))
+
+
+@dataclass
+class FSMConfig:
+    """Конфигурация хранилища состояний FSM"""
+    # memory - в процессе (теряется при перезапуске), sql - в основной БД, redis
+    storage: str = os.getenv("FSM_STORAGE", "memory")
+    redis_url: str = os.getenv("REDIS_URL", "redis://localhost:6379/0")
+
+    # Брошенные состояния удаляются через FSM_TTL секунд без изменений
+    ttl: int = int(os.getenv("FSM_TTL", "86400"))
+    # Кэш чтений в процессе
+    cache_ttl: float = float(os.getenv("FSM_CACHE_TTL", "60"))
+    cache_size: int = int(os.getenv("FSM_CACHE_SIZE", "10000"))
+
+
 @dataclass
 class SSHConfig:
     """Конфигурация SSH"""
@@ -47,6 +193,15 @@ class SSHConfig:
     password: str = os.getenv("SSH_PASSWORD", "")
     key_path: str = os.getenv("SSH_KEY_PATH", "")
 
+    # Асинхронное выполнение команд
+    max_concurrency: int = int(os.getenv("SSH_MAX_CONCURRENCY", "4"))
+    connect_timeout: float = float(os.getenv("SSH_CONNECT_TIMEOUT", "10"))
+    command_timeout: float = float(os.getenv("SSH_COMMAND_TIMEOUT", "30"))
+
+    # Пул соединений
+    keepalive_interval: int = int(os.getenv("SSH_KEEPALIVE_INTERVAL", "15"))
+    reconnect_delay: float = float(os.getenv("SSH_RECONNECT_DELAY", "5"))
+
 
 @dataclass
 class WireGuardConfig:
@@ -56,6 +211,20 @@ class WireGuardConfig:
     network: str = os.getenv("WG_NETWORK", "10.0.0.0/24")
     client_ip_start: str = os.getenv("WG_CLIENT_IP_START", "10.0.0.2")
     client_ip_end: str = os.getenv("WG_CLIENT_IP_END", "10.0.0.254")
+    key_pool_size: int = int(os.getenv("WG_KEY_POOL_SIZE", "32"))
+    server_info_ttl: int = int(os.getenv("WG_SERVER_INFO_TTL", "300"))
+
+    # Отложенное сохранение конфига (wg-quick save)
+    save_interval: float = float(os.getenv("WG_SAVE_INTERVAL", "5"))
+    save_batch_size: int = int(os.getenv("WG_SAVE_BATCH", "50"))
+
+
+@dataclass
+class SchedulerConfig:
+    """Конфигурация планировщика истечения ключей"""
+    # Полная сверка с БД (страховка на случай рассинхронизации очереди)
+    reconcile_interval: int = int(os.getenv("SCHEDULER_RECONCILE_INTERVAL", "3600"))
+    expiry_batch_size: int = int(os.getenv("SCHEDULER_EXPIRY_BATCH", "200"))
 
 
 @dataclass
@@ -74,9 +243,18 @@ class Config:
     """Основной конфиг"""
     db: DatabaseConfig = field(default_factory=DatabaseConfig)
     bot: BotConfig = field(default_factory=BotConfig)
+    fsm: FSMConfig = field(default_factory=FSMConfig)
+    webhook: WebhookConfig = field(default_factory=WebhookConfig)
+    sharding: ShardingConfig = field(default_factory=ShardingConfig)
+    throttling: ThrottlingConfig = field(default_factory=ThrottlingConfig)
+    sender: SenderConfig = field(default_factory=SenderConfig)
+    broadcast: BroadcastConfig = field(default_factory=BroadcastConfig)
+    provisioning: ProvisioningConfig = field(default_factory=ProvisioningConfig)
+    jobs: JobsConfig = field(default_factory=JobsConfig)
     ssh: SSHConfig = field(default_factory=SSHConfig)
     wireguard: WireGuardConfig = field(default_factory=WireGuardConfig)
     payment: PaymentConfig = field(default_factory=PaymentConfig)
+    scheduler: SchedulerConfig = field(default_factory=SchedulerConfig)
 
     # Системные настройки
     log_level: str = os.getenv("LOG_LEVEL", "INFO")
@@ -86,6 +264,8 @@ class Config:
         """Проверка конфигурации"""
         if not self.bot.token:
             raise ValueError("BOT_TOKEN не установлен в .env файле")
+        if self.webhook.mode == "webhook" and not self.webhook.secret:
+            raise ValueError("WEBHOOK_SECRET не установлен - без него webhook принимает чужие запросы")
         if not self.bot.admin_ids:
             print("⚠️  ADMIN_IDS не установлен - админ-панель будет недоступна")
 
@@ -0,0 +1,35 @@
+"""Индексы для частых запросов
+
+Таблицы создаются ботом при запуске (Base.metadata.create_all), но
+create_all не добавляет индексы в уже существующие таблицы - для
+рабочих баз это делает эта миграция.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+
+revision = "0001"
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ("ix_vpn_keys_user_id_status", "vpn_keys", ["user_id", "status"]),
+    ("ix_vpn_keys_status_expires_at", "vpn_keys", ["status", "expires_at"]),
+    ("ix_payments_status_created_at", "payments", ["status", "created_at"]),
+    ("ix_users_is_admin", "users", ["is_admin"]),
+]
+
+
+def upgrade() -> None:
+    for name, table, columns in INDEXES:
+        op.create_index(name, table, columns, if_not_exists=True)
+
+
+def downgrade() -> None:
+    for name, table, _ in reversed(INDEXES):
+        op.drop_index(name, table_name=table, if_exists=True)
@@ -0,0 +1,56 @@
+"""Рассылки: таблица broadcasts и users.bot_blocked
+
+Бот при запуске создает новые таблицы сам (create_all), но не добавляет
+колонки в существующие - users.bot_blocked в рабочей базе появится
+только после этой миграции. Поэтому обе операции проверяют, не сделаны
+ли они уже.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0002"
+down_revision = "0001"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+
+    columns = {column["name"] for column in inspector.get_columns("users")}
+    if "bot_blocked" not in columns:
+        op.add_column(
+            "users",
+            sa.Column("bot_blocked", sa.Boolean(), nullable=False, server_default=sa.false())
+        )
+
+    if not inspector.has_table("broadcasts"):
+        op.create_table(
+            "broadcasts",
+            sa.Column("id", sa.Integer(), primary_key=True),
+            sa.Column("text", sa.Text(), nullable=False),
+            sa.Column("created_by", sa.BigInteger(), nullable=False),
+            sa.Column("status", sa.String(20), nullable=False),
+            sa.Column("last_user_id", sa.Integer(), nullable=False),
+            sa.Column("total", sa.Integer(), nullable=False),
+            sa.Column("sent", sa.Integer(), nullable=False),
+            sa.Column("failed", sa.Integer(), nullable=False),
+            sa.Column("blocked", sa.Integer(), nullable=False),
+            sa.Column("created_at", sa.DateTime(), nullable=False),
+            sa.Column("started_at", sa.DateTime(), nullable=True),
+            sa.Column("finished_at", sa.DateTime(), nullable=True),
+        )
+        op.create_index("ix_broadcasts_status", "broadcasts", ["status"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_broadcasts_status", table_name="broadcasts", if_exists=True)
+    op.drop_table("broadcasts")
+
+    with op.batch_alter_table("users") as batch_op:
+        batch_op.drop_column("bot_blocked")
@@ -0,0 +1,49 @@
+"""Очередь фоновых задач: таблица jobs
+
+Бот создает таблицу сам (create_all); миграция нужна, чтобы история
+alembic совпадала с базой, поэтому таблица создается только если ее нет.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0003"
+down_revision = "0002"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("jobs"):
+        return
+
+    op.create_table(
+        "jobs",
+        sa.Column("id", sa.Integer(), primary_key=True),
+        sa.Column("kind", sa.String(20), nullable=False),
+        sa.Column("idempotency_key", sa.String(100), nullable=False, unique=True),
+        sa.Column("payload", sa.Text(), nullable=False),
+        sa.Column("status", sa.String(20), nullable=False),
+        sa.Column("attempts", sa.Integer(), nullable=False),
+        sa.Column("max_attempts", sa.Integer(), nullable=False),
+        sa.Column("run_at", sa.DateTime(), nullable=False),
+        sa.Column("locked_until", sa.DateTime(), nullable=True),
+        sa.Column("last_error", sa.Text(), nullable=True),
+        sa.Column("created_by", sa.BigInteger(), nullable=True),
+        sa.Column("batch_id", sa.String(36), nullable=True),
+        sa.Column("created_at", sa.DateTime(), nullable=False),
+        sa.Column("finished_at", sa.DateTime(), nullable=True),
+    )
+    op.create_index("ix_jobs_status_run_at", "jobs", ["status", "run_at"])
+    op.create_index("ix_jobs_batch_id", "jobs", ["batch_id"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_jobs_batch_id", table_name="jobs", if_exists=True)
+    op.drop_index("ix_jobs_status_run_at", table_name="jobs", if_exists=True)
+    op.drop_table("jobs")
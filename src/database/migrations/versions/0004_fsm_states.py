@@ -0,0 +1,37 @@
+"""Хранилище FSM в базе: таблица fsm_states
+
+Бот создает таблицу сам (create_all); миграция нужна, чтобы история
+alembic совпадала с базой, поэтому таблица создается только если ее нет.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18
+"""
+
+from alembic import op
+import sqlalchemy as sa
+
+revision = "0004"
+down_revision = "0003"
+branch_labels = None
+depends_on = None
+
+
+def upgrade() -> None:
+    inspector = sa.inspect(op.get_bind())
+    if inspector.has_table("fsm_states"):
+        return
+
+    op.create_table(
+        "fsm_states",
+        sa.Column("key", sa.String(255), primary_key=True),
+        sa.Column("state", sa.String(255), nullable=True),
+        sa.Column("data", sa.Text(), nullable=False),
+        sa.Column("updated_at", sa.DateTime(), nullable=False),
+    )
+    op.create_index("ix_fsm_states_updated_at", "fsm_states", ["updated_at"])
+
+
+def downgrade() -> None:
+    op.drop_index("ix_fsm_states_updated_at", table_name="fsm_states", if_exists=True)
+    op.drop_table("fsm_states")
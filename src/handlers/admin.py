@@ -11,7 +11,7 @@ from src.services import get_session, UserDAO
 @admin_router.message(F.text.startswith("👑"))
 async def admin_entry(message: Message, state: FSMContext):
     async for session in get_session():
-        user = await UserDAO.get_by_telegram_id(session, message.from_user.id)
+        user = await UserDAO.get_by_telegram_id(session, message.from_user.id, fresh=True)
         if not user or not user.is_admin:
             await message.answer("❌ У вас нет прав администратора")
             return
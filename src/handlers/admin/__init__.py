@@ -1,10 +1,19 @@
 from aiogram import Router
 
+from src.bot.middlewares.admin import AdminOnlyMiddleware
+
 # ЕДИНЫЙ роутер для всей админки
 admin_router = Router()
 
+# Права проверяются для каждого хендлера роутера, включая новые
+admin_router.message.middleware(AdminOnlyMiddleware())
+admin_router.callback_query.middleware(AdminOnlyMiddleware())
+
 # Просто импортируем файлы,
 # они НАВЕШИВАЮТ handlers на admin_router
 from . import panel  # noqa
 from . import keys   # noqa
 from . import users  # noqa
+from . import server  # noqa
+from . import broadcast  # noqa
+from . import jobs  # noqa
@@ -0,0 +1,123 @@
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from src.handlers.admin import admin_router
+from src.config import config
+from src.services.database import get_session
+from src.services.dao import BroadcastDAO
+from src.services.broadcast import broadcast_service
+
+router = admin_router
+
+STATUS_ICONS = {
+    "pending": "🕓",
+    "running": "📤",
+    "paused": "⏸",
+    "finished": "✅",
+    "cancelled": "❌",
+}
+
+
+# ===================== BROADCAST =====================
+
+@router.message(Command("broadcast"))
+async def start_broadcast(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    # Текст с разметкой (html_text), без самой команды
+    parts = (message.html_text or "").split(maxsplit=1)
+    if len(parts) < 2:
+        await message.answer(
+            "📣 <b>Рассылка</b>\n\n"
+            "Использование: <code>/broadcast текст сообщения</code>\n"
+            "Прогресс: /broadcasts"
+        )
+        return
+
+    if broadcast_service.current is not None:
+        await message.answer(
+            f"⚠️ Уже идет рассылка #{broadcast_service.current}.\n"
+            "Дождитесь окончания или остановите ее: /broadcast_pause"
+        )
+        return
+
+    broadcast = await broadcast_service.create(parts[1], message.from_user.id)
+    broadcast_service.start(broadcast.id)
+
+    await message.answer(
+        f"📣 Рассылка #{broadcast.id} запущена\n"
+        f"👥 Получателей: {broadcast.total}\n\n"
+        "Прогресс: /broadcasts"
+    )
+
+
+@router.message(Command("broadcasts"))
+async def show_broadcasts(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    async for session in get_session():
+        broadcasts = await BroadcastDAO.get_recent(session)
+
+    if not broadcasts:
+        await message.answer("📭 Рассылок еще не было")
+        return
+
+    text = "📣 <b>Последние рассылки</b>\n"
+    for broadcast in broadcasts:
+        icon = STATUS_ICONS.get(broadcast.status, "•")
+        text += (
+            f"\n{icon} <b>#{broadcast.id}</b> {broadcast.status} - "
+            f"{broadcast.processed}/{broadcast.total}\n"
+            f"   ✅ {broadcast.sent}  🚫 {broadcast.blocked}  ⚠️ {broadcast.failed}\n"
+        )
+
+    await message.answer(text)
+
+
+@router.message(Command("broadcast_pause"))
+async def pause_broadcast(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    broadcast_id = broadcast_service.pause()
+    if broadcast_id is None:
+        await message.answer("📭 Сейчас рассылка не идет")
+        return
+
+    await message.answer(
+        f"⏸ Рассылка #{broadcast_id} остановится после текущей пачки.\n"
+        f"Продолжить: <code>/broadcast_resume {broadcast_id}</code>"
+    )
+
+
+@router.message(Command("broadcast_resume"))
+async def resume_broadcast(message: Message, command: CommandObject):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Использование: <code>/broadcast_resume ID</code>")
+        return
+
+    broadcast_id = int(command.args.strip())
+
+    async for session in get_session():
+        broadcast = await BroadcastDAO.get_by_id(session, broadcast_id)
+
+    if not broadcast or broadcast.status not in ("pending", "paused"):
+        await message.answer("❌ Нет приостановленной рассылки с таким ID")
+        return
+
+    if not broadcast_service.start(broadcast_id):
+        await message.answer(f"⚠️ Уже идет рассылка #{broadcast_service.current}")
+        return
+
+    await message.answer(
+        f"▶️ Рассылка #{broadcast_id} продолжена ({broadcast.processed}/{broadcast.total})"
+    )
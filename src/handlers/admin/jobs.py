@@ -0,0 +1,74 @@
+from aiogram.types import Message
+from aiogram.filters import Command, CommandObject
+
+from src.handlers.admin import admin_router
+from src.config import config
+from src.services.database import get_session
+from src.services.dao import JobDAO
+from src.services.jobs import job_queue
+
+router = admin_router
+
+STATUS_ICONS = {
+    "pending": "🕓",
+    "running": "⚙️",
+    "done": "✅",
+    "dead": "☠️",
+}
+
+
+# ===================== JOBS =====================
+
+@router.message(Command("jobs"))
+async def show_jobs(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    async for session in get_session():
+        counts = await JobDAO.count_by_status(session)
+        dead = await JobDAO.get_dead(session)
+
+    stats = job_queue.stats()
+    text = "🧰 <b>Очередь задач</b>\n\n"
+    for status, icon in STATUS_ICONS.items():
+        text += f"{icon} {status}: {counts.get(status, 0)}\n"
+
+    text += (
+        f"\nОбработчиков: {stats['workers']}\n"
+        f"С запуска: выполнено {stats['done']}, повторов {stats['retried']}, "
+        f"не выполнено {stats['dead']}, таймаутов {stats['timeouts']}\n"
+    )
+
+    if dead:
+        text += "\n<b>Не выполнены:</b>\n"
+        for job in dead:
+            text += (
+                f"\n#{job.id} <code>{job.idempotency_key}</code> ({job.attempts} попыток)\n"
+                f"   {(job.last_error or '')[:150]}\n"
+            )
+        text += "\nПовторить: <code>/job_retry ID</code>"
+
+    await message.answer(text)
+
+
+@router.message(Command("job_retry"))
+async def retry_job(message: Message, command: CommandObject):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    if not command.args or not command.args.strip().isdigit():
+        await message.answer("Использование: <code>/job_retry ID</code>")
+        return
+
+    job_id = int(command.args.strip())
+
+    async for session in get_session():
+        requeued = await JobDAO.requeue(session, job_id)
+
+    if not requeued:
+        await message.answer("❌ Нет невыполненной задачи с таким ID")
+        return
+
+    await message.answer(f"🔁 Задача #{job_id} снова в очереди")
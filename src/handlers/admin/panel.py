@@ -2,20 +2,24 @@ from aiogram import F
 from aiogram.types import Message, CallbackQuery
 from aiogram.filters import Command
 from aiogram.fsm.context import FSMContext
-from sqlalchemy import select
-from sqlalchemy.orm import selectinload
+import uuid
+from datetime import datetime
+from typing import Any, Dict, List, Optional, Tuple
 
 from src.handlers.admin import admin_router
 from src.config import config
 from src.states.admin_states import AdminPanelStates
 from src.keyboards.admin import (
     get_admin_panel_keyboard,
-    get_admin_confirmation_keyboard
+    get_admin_confirmation_keyboard,
+    get_admin_bulk_confirm_keyboard
 )
 from src.services.database import get_session
-from src.services.dao import PaymentDAO
-from src.services.vpn_service import VPNService
-from src.utils.constants import PRICE_PER_DAY
+from src.services.dao import PaymentDAO, StatsDAO
+from src.services.sender import message_sender, PRIORITY_HIGH
+from src.services.provisioning import provisioning_pipeline
+from src.services.jobs import job_queue
+from src.utils.constants import CONFIRMATION_PAGE_SIZE
 from src.models.payment import Payment
 
 router = admin_router
@@ -55,30 +59,118 @@ async def open_admin_panel(message: Message, state: FSMContext):
     )
 
 
+# ===================== STATS =====================
+
+@router.callback_query(F.data == "admin_stats")
+async def show_stats(callback: CallbackQuery):
+    if callback.from_user.id not in config.bot.admin_ids:
+        await callback.answer("❌ Нет прав администратора", show_alert=True)
+        return
+
+    async for session in get_session():
+        stats = await StatsDAO.get_summary(session)
+
+    keys = stats["keys"]
+    payments = stats["payments"]
+    confirmed_count, revenue = payments.get("confirmed", (0, 0))
+
+    text = (
+        "📊 <b>Статистика</b>\n\n"
+        f"👥 Пользователей: {stats['users']}\n"
+        f"   🚫 забанено: {stats['banned']}, заблокировали бота: {stats['blocked']}\n\n"
+        f"🔑 Активных ключей: {keys.get('active', 0)} (всего {sum(keys.values())})\n\n"
+        f"💰 Подтверждено платежей: {confirmed_count} на {revenue:.0f}₽\n"
+    )
+    for status, (count, _) in sorted(payments.items()):
+        if status != "confirmed":
+            text += f"   {status}: {count}\n"
+
+    await callback.message.answer(text)
+    await callback.answer()
+
+
 # ===================== CONFIRMATIONS =====================
+#
+# В FSM хранится не весь список, а окно очереди: текущая страница и
+# заранее загруженная следующая - [id, created_at] в порядке
+# (created_at, id). position - номер первого платежа окна в очереди.
+# Страницы догружаются по ключу (keyset), а не через OFFSET.
+
+PAGE = CONFIRMATION_PAGE_SIZE
+
+
+def queue_entries(payments: List[Payment]) -> List[list]:
+    return [[p.id, p.created_at.isoformat()] for p in payments]
+
+
+def queue_key(entry: list) -> Tuple[datetime, int]:
+    return datetime.fromisoformat(entry[1]), entry[0]
+
+
+async def prefetch_next(session, data: Dict[str, Any]) -> None:
+    """Сдвинуть окно, если дошли до следующей страницы, и догрузить следующую"""
+    queue = data["queue"]
+
+    if data["index"] >= PAGE:
+        del queue[:PAGE]
+        data["position"] += PAGE
+        data["index"] -= PAGE
+
+    if queue and len(queue) <= PAGE:
+        payments = await PaymentDAO.get_queue_page(
+            session, "paid", PAGE, after=queue_key(queue[-1])
+        )
+        queue.extend(queue_entries(payments))
+
+
+async def load_previous(session, data: Dict[str, Any], before: Tuple[datetime, int]) -> bool:
+    """Догрузить страницу перед окном; False - раньше платежей нет"""
+    payments = await PaymentDAO.get_queue_page(session, "paid", PAGE, before=before)
+    if not payments:
+        return False
+
+    data["queue"][:0] = queue_entries(payments)
+    del data["queue"][2 * PAGE:]
+    data["position"] = max(data["position"] - len(payments), 0)
+    data["index"] = len(payments) - 1
+    return True
+
+
+async def drop_current(data: Dict[str, Any]) -> None:
+    """Убрать обработанный платеж из окна и при необходимости догрузить очередь"""
+    queue = data["queue"]
+    removed = queue.pop(data["index"])
+    data["total"] = max(data["total"] - 1, 0)
+
+    async for session in get_session():
+        if queue:
+            data["index"] = min(data["index"], len(queue) - 1)
+            await prefetch_next(session, data)
+            return
+
+        # Окно опустело: сначала смотрим дальше по очереди, потом назад
+        payments = await PaymentDAO.get_queue_page(session, "paid", 2 * PAGE, after=queue_key(removed))
+        if payments:
+            data["queue"], data["index"] = queue_entries(payments), 0
+        elif data["position"] > 0:
+            await load_previous(session, data, queue_key(removed))
+
 
 @router.callback_query(F.data == "admin_confirmations")
 async def open_confirmations(callback: CallbackQuery, state: FSMContext):
     async for session in get_session():
-        result = await session.execute(
-            select(Payment)
-            .where(Payment.status == "paid")
-            .options(selectinload(Payment.user))
-            .order_by(Payment.created_at)
-        )
-        payments = result.scalars().all()
-
-        payment_ids = [p.id for p in payments]
+        total = await PaymentDAO.count_by_status(session, "paid")
+        payments = await PaymentDAO.get_queue_page(session, "paid", 2 * PAGE) if total else []
 
-    if not payment_ids:
+    if not payments:
         await callback.answer("📭 Нет ожидающих платежей", show_alert=True)
         return
 
     await state.set_state(AdminPanelStates.confirmations_list)
-    await state.update_data(payment_ids=payment_ids, index=0)
+    await state.update_data(queue=queue_entries(payments), index=0, position=0, total=total)
 
     await callback.message.edit_text(
-        render_payment(payments[0], 0, len(payment_ids)),
+        render_payment(payments[0], 0, total),
         reply_markup=get_admin_confirmation_keyboard()
     )
     await callback.answer()
@@ -87,22 +179,29 @@ async def open_confirmations(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data.in_(["admin_next", "admin_prev"]))
 async def navigate_payments(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    payment_ids = data["payment_ids"]
-    index = data["index"]
-
-    if callback.data == "admin_next" and index < len(payment_ids) - 1:
-        index += 1
-    elif callback.data == "admin_prev" and index > 0:
-        index -= 1
+    queue = data["queue"]
 
     async for session in get_session():
-        payment = await PaymentDAO.get_by_id(session, payment_ids[index])
-        await session.refresh(payment, ["user"])
-
-    await state.update_data(index=index)
-
+        if callback.data == "admin_next":
+            if data["index"] >= len(queue) - 1:
+                await callback.answer()
+                return
+            data["index"] += 1
+            await prefetch_next(session, data)
+        else:
+            if data["index"] > 0:
+                data["index"] -= 1
+            elif not await load_previous(session, data, queue_key(queue[0])):
+                await callback.answer()
+                return
+
+        payment = await PaymentDAO.get_by_id(session, data["queue"][data["index"]][0])
+
+    await state.update_data(queue=data["queue"], index=data["index"], position=data["position"])
+
+    position = data["position"] + data["index"]
     await callback.message.edit_text(
-        render_payment(payment, index, len(payment_ids)),
+        render_payment(payment, position, max(data["total"], position + 1)),
         reply_markup=get_admin_confirmation_keyboard()
     )
     await callback.answer()
@@ -113,46 +212,92 @@ async def navigate_payments(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_confirm")
 async def confirm_payment(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    payment_ids = data["payment_ids"]
-    index = data["index"]
 
-    async for session in get_session():
-        payment = await PaymentDAO.get_by_id(session, payment_ids[index])
-        user = payment.user
+    # Ключ выдаст очередь задач; платеж станет confirmed вместе с записью ключа
+    await provisioning_pipeline.confirm([data["queue"][data["index"]][0]], callback.from_user.id)
 
-        await PaymentDAO.confirm_payment(
-            session=session,
-            payment_id=payment.id,
-            admin_id=callback.from_user.id
-        )
+    await drop_current(data)
 
-        days = int(payment.amount / PRICE_PER_DAY)
-        vpn_service = VPNService(session)
-        vpn_key = await vpn_service.create_vpn_key(user, days, payment)
+    if not data["queue"]:
+        await state.clear()
+        await callback.message.edit_text("✅ Все платежи обработаны")
+        return
 
-    await callback.bot.send_message(
-        user.telegram_id,
-        (
-            "🎉 <b>Платёж подтверждён!</b>\n\n"
-            f"🔑 <code>{vpn_key.key_name}</code>\n\n"
-            f"<pre>{vpn_key.config_data}</pre>\n\n"
-            "🔗 https://www.wireguard.com/install/"
-        )
+    await state.update_data(**data)
+
+    await callback.answer("✅ Подтверждено, ключ выдается")
+
+
+# ===================== BULK CONFIRM =====================
+
+def render_bulk_progress(counts: Dict[str, int], finished: bool) -> str:
+    done, dead = counts.get("done", 0), counts.get("dead", 0)
+    total = sum(counts.values())
+    title = "✅ <b>Подтверждение завершено</b>" if finished else "⏳ <b>Подтверждение платежей...</b>"
+
+    text = (
+        f"{title}\n\n"
+        f"Обработано: {done + dead} из {total}\n"
+        f"✅ Выполнено: {done}\n"
+        f"🔁 Ожидают (в т.ч. повтора): {counts.get('pending', 0) + counts.get('running', 0)}\n"
+        f"☠️ Не выполнено: {dead}"
     )
+    if finished and dead:
+        text += "\n\nНеудачные платежи остались в очереди, подробности: /jobs"
+    return text
 
-    payment_ids.pop(index)
 
-    if not payment_ids:
-        await state.clear()
-        await callback.message.edit_text("✅ Все платежи обработаны")
+async def start_bulk_confirm(callback: CallbackQuery, state: FSMContext, payment_ids: Optional[List[int]]):
+    """Поставить выдачу ключей пачкой и показывать прогресс в сообщении"""
+    message = callback.message
+    admin_id = callback.from_user.id
+    batch_id = uuid.uuid4().hex
+
+    await state.clear()
+    await message.edit_text("⏳ <b>Подтверждение платежей...</b>")
+    await callback.answer("Запущено")
+
+    if payment_ids is None:
+        await provisioning_pipeline.confirm_all(admin_id, batch_id)
+    else:
+        await provisioning_pipeline.confirm(payment_ids, admin_id, batch_id)
+
+    async def progress(counts: Dict[str, int], finished: bool) -> None:
+        await message.edit_text(render_bulk_progress(counts, finished))
+
+    job_queue.watch(batch_id, progress)
+
+
+@router.callback_query(F.data == "admin_confirm_page")
+async def confirm_page(callback: CallbackQuery, state: FSMContext):
+    data = await state.get_data()
+    if not data.get("queue"):
+        await callback.answer("📭 Нет ожидающих платежей", show_alert=True)
         return
 
-    await state.update_data(
-        payment_ids=payment_ids,
-        index=min(index, len(payment_ids) - 1)
+    # Текущая страница - первые PAGE записей окна
+    await start_bulk_confirm(callback, state, [entry[0] for entry in data["queue"][:PAGE]])
+
+
+@router.callback_query(F.data == "admin_confirm_all")
+async def ask_confirm_all(callback: CallbackQuery):
+    async for session in get_session():
+        total = await PaymentDAO.count_by_status(session, "paid")
+
+    if not total:
+        await callback.answer("📭 Нет ожидающих платежей", show_alert=True)
+        return
+
+    await callback.message.edit_text(
+        f"⏩ Подтвердить все оплаченные платежи ({total}) и выдать ключи?",
+        reply_markup=get_admin_bulk_confirm_keyboard()
     )
+    await callback.answer()
 
-    await callback.answer("✅ Подтверждено")
+
+@router.callback_query(F.data == "admin_confirm_all_yes")
+async def confirm_all(callback: CallbackQuery, state: FSMContext):
+    await start_bulk_confirm(callback, state, None)
 
 
 # ===================== REJECT =====================
@@ -160,11 +305,9 @@ async def confirm_payment(callback: CallbackQuery, state: FSMContext):
 @router.callback_query(F.data == "admin_reject")
 async def reject_payment(callback: CallbackQuery, state: FSMContext):
     data = await state.get_data()
-    payment_ids = data["payment_ids"]
-    index = data["index"]
 
     async for session in get_session():
-        payment = await PaymentDAO.get_by_id(session, payment_ids[index])
+        payment = await PaymentDAO.get_by_id(session, data["queue"][data["index"]][0])
         user = payment.user
 
         await PaymentDAO.reject_payment(
@@ -173,22 +316,20 @@ async def reject_payment(callback: CallbackQuery, state: FSMContext):
             admin_id=callback.from_user.id
         )
 
-    await callback.bot.send_message(
+    message_sender.send_message(
         user.telegram_id,
         "❌ <b>Платёж отклонён</b>\n\n"
-        "Вы можете оплатить заново или связаться с поддержкой."
+        "Вы можете оплатить заново или связаться с поддержкой.",
+        priority=PRIORITY_HIGH
     )
 
-    payment_ids.pop(index)
+    await drop_current(data)
 
-    if not payment_ids:
+    if not data["queue"]:
         await state.clear()
         await callback.message.edit_text("📭 Нет ожидающих платежей")
         return
 
-    await state.update_data(
-        payment_ids=payment_ids,
-        index=min(index, len(payment_ids) - 1)
-    )
+    await state.update_data(**data)
 
     await callback.answer("❌ Отклонено")
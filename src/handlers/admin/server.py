@@ -0,0 +1,170 @@
+from aiogram.types import Message
+from aiogram.filters import Command
+
+from src.handlers.admin import admin_router
+from src.config import config
+from src.services.ssh_pool import ssh_pool
+from src.services.wireguard import wireguard_service
+from src.services.dao import user_cache
+from src.services.rate_limit import throttler
+from src.services.sender import message_sender
+from src.services.notifications import admin_notifier
+from src.services.database import pool_stats
+
+router = admin_router
+
+
+# ===================== SSH =====================
+
+@router.message(Command("ssh_stats"))
+async def show_ssh_stats(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    stats = ssh_pool.stats()
+
+    text = (
+        "🔌 <b>SSH пул</b>\n\n"
+        f"Открытых транспортов: {stats['open_transports']}\n"
+        f"Каналов в работе: {stats['channels_in_use']}\n"
+        f"Рукопожатий: {stats['handshakes']}\n"
+    )
+
+    for host, host_stats in stats["hosts"].items():
+        status = "🟢" if host_stats["connected"] else "🔴"
+        text += (
+            f"\n{status} <code>{host}</code>\n"
+            f"   Каналы: {host_stats['channels_in_use']}/{host_stats['max_channels']}\n"
+            f"   Команд: {host_stats['commands']}, ошибок: {host_stats['failures']}\n"
+        )
+
+    await message.answer(text)
+
+
+# ===================== WIREGUARD =====================
+
+@router.message(Command("wg_refresh"))
+async def refresh_server_info(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    try:
+        info = await wireguard_service.get_server_info(force=True)
+    except Exception as e:
+        await message.answer(f"❌ Не удалось обновить данные сервера: {e}")
+        return
+
+    await message.answer(
+        "🔄 <b>Данные сервера обновлены</b>\n\n"
+        f"🔑 Публичный ключ: <code>{info['public_key']}</code>\n"
+        f"🌐 Endpoint: <code>{info['endpoint']}:{info['port']}</code>"
+    )
+
+
+# ===================== CACHE =====================
+
+@router.message(Command("cache_stats"))
+async def show_cache_stats(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    stats = user_cache.stats()
+
+    await message.answer(
+        "🗂 <b>Кэш пользователей</b>\n\n"
+        f"Записей: {stats['size']}/{stats['maxsize']} (TTL {stats['ttl']:.0f} с)\n"
+        f"Попаданий: {stats['hits']}, промахов: {stats['misses']}\n"
+        f"Hit rate: {stats['hit_rate']:.1%}"
+    )
+
+
+# ===================== THROTTLING =====================
+
+@router.message(Command("throttle_stats"))
+async def show_throttle_stats(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    stats = throttler.stats()
+    buckets = stats["buckets"] if stats["buckets"] is not None else "в Redis"
+
+    await message.answer(
+        "🚦 <b>Ограничение запросов</b>\n\n"
+        f"Хранилище: {stats['backend']}\n"
+        f"Корзин: {buckets} (лимит {stats['max_buckets']}, вытеснено {stats['evicted']})\n"
+        f"Пропущено: {stats['allowed']}\n"
+        f"Отброшено (лимит пользователя): {stats['dropped']}\n"
+        f"Ошибок хранилища: {stats['errors']}"
+    )
+
+
+# ===================== SENDER =====================
+
+@router.message(Command("sender_stats"))
+async def show_sender_stats(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    stats = message_sender.stats()
+    queued = stats["queued"]
+    notifications = admin_notifier.stats()
+
+    await message.answer(
+        "📨 <b>Очередь отправки</b>\n\n"
+        f"В работе: {stats['pending']} "
+        f"(в очереди: {queued['high']} / {queued['normal']} / {queued['low']})\n"
+        f"Отправлено: {stats['sent']}, ошибок: {stats['failed']}, отброшено: {stats['rejected']}\n"
+        f"Повторов: {stats['retried']}, flood wait: {stats['flood_waits']} "
+        f"(пауза еще {stats['paused_for']} с)\n"
+        f"Задержка: в среднем {stats['latency_avg_ms']} мс, макс. {stats['latency_max_ms']} мс\n\n"
+        f"🔔 Уведомлений админам: {notifications['notifications']} "
+        f"(доставляется: {notifications['in_progress']})\n"
+        f"Доставлено: {notifications['delivered']}, ошибок: {notifications['failed']}"
+    )
+
+
+# ===================== DATABASE =====================
+
+@router.message(Command("db_stats"))
+async def show_db_stats(message: Message):
+    if message.from_user.id not in config.bot.admin_ids:
+        await message.answer("❌ Нет прав администратора")
+        return
+
+    stats = pool_stats()
+    text = "🗄 <b>База данных</b>\n"
+
+    for name in ("primary", "replica"):
+        pool = stats.get(name)
+        if pool is None:
+            continue
+        if "checkouts" not in pool:
+            text += f"\n<b>{name}</b>: {pool['pool']}\n"
+            continue
+        text += (
+            f"\n<b>{name}</b>\n"
+            f"Соединений: {pool['size']} (+{pool['overflow']} сверх пула), занято {pool['checked_out']}\n"
+            f"Выдано: {pool['checkouts']}, таймаутов: {pool['timeouts']}\n"
+            f"Ожидание: в среднем {pool['wait_avg_ms']} мс, макс. {pool['wait_max_ms']} мс\n"
+        )
+
+    if "routing" in stats:
+        routing = stats["routing"]
+        text += (
+            f"\nЧтений с реплики: {routing['replica_reads']}, "
+            f"повторов на основной (отставание): {routing['replica_misses']}\n"
+        )
+
+    if "writer" in stats:
+        writer = stats["writer"]
+        text += (
+            f"\n✍️ Очередь записи: {writer['waiting']} ждут, "
+            f"в среднем {writer['wait_avg_ms']} мс, таймаутов: {writer['timeouts']}\n"
+        )
+
+    await message.answer(text)
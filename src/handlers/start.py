@@ -17,6 +17,7 @@ router = start_router  # Alias паттерн
 async def cmd_start(message: Message, state: FSMContext):
     await state.clear()
 
+    # Регистрация и обновление профиля - один запрос
     async for session in get_session():
         await UserDAO.get_or_create(
             session,
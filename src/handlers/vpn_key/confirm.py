@@ -4,8 +4,8 @@ from aiogram.fsm.context import FSMContext
 
 from src.states.vpn_states import PaymentVerificationStates
 from src.keyboards.admin import get_payment_actions_keyboard
-from src.services import PaymentDAO, UserDAO, VPNKeyDAO, get_session
-from src.services.wireguard import wireguard_service
+from src.services import PaymentDAO, get_session
+from src.services.provisioning import provisioning_pipeline
 from src.config import config
 import json
 
@@ -106,130 +106,22 @@ async def confirm_payment(callback: CallbackQuery, state: FSMContext):
             await callback.answer("✅ Платеж уже подтвержден", show_alert=True)
             return
 
-        # Получаем данные пользователя
-        user = payment.user
-
-        # Извлекаем дни из payment_details или вычисляем из суммы
-        days = 30  # По умолчанию
-        try:
-            payment_details = json.loads(payment.payment_details) if payment.payment_details else {}
-            if 'days' in payment_details:
-                days = int(payment_details['days'])
-            else:
-                # Вычисляем дни из суммы
-                days = int(payment.amount / config.payment.price_per_day)
-        except (ValueError, KeyError, TypeError):
-            # Вычисляем дни из суммы
-            days = int(payment.amount / config.payment.price_per_day)
-
-        # Подтверждаем платеж
-        await PaymentDAO.confirm_payment(
-            session=session,
-            payment_id=payment.id,
-            admin_id=callback.from_user.id,
-            comment="Подтверждено администратором"
-        )
-
-        # Создаем VPN ключ
-        try:
-            # Генерируем ключи WireGuard
-            keys = await wireguard_service.generate_keys()
-
-            # Получаем информацию о сервере
-            server_info = await wireguard_service.get_server_info()
-
-            # Получаем свободный IP
-            client_ip = await wireguard_service.get_next_client_ip()
-
-            # Создаем конфиг для клиента
-            config_data = await wireguard_service.generate_client_config(
-                client_private_key=keys["private_key"],
-                client_ip=client_ip,
-                server_public_key=server_info["public_key"],
-                server_endpoint=server_info["endpoint"],
-                server_port=server_info["port"]
-            )
-
-            # Добавляем клиента на сервер
-            added = await wireguard_service.add_client_to_server(
-                client_public_key=keys["public_key"],
-                client_ip=client_ip
-            )
-
-            if not added:
-                raise Exception("Не удалось добавить клиента на сервер")
-
-            # Создаем запись в базе данных
-            key_name = f"user{user.id}_{payment.payment_id}"
-
-            vpn_key = await VPNKeyDAO.create(
-                session=session,
-                user_id=user.id,
-                key_name=key_name,
-                private_key=keys["private_key"],
-                public_key=keys["public_key"],
-                server_public_key=server_info["public_key"],
-                ip_address=client_ip,
-                config_data=config_data,
-                days=days,
-                server_ip=server_info["ip"],
-                server_port=server_info["port"],
-                server_endpoint=server_info["endpoint"],
-                payment_id=payment.id
-            )
-
-            # Обновляем статистику пользователя
-            user.total_spent += payment.amount
-            await session.commit()
-
-            # Отправляем ключ пользователю
-            # Здесь нужно отправить сообщение пользователю
-            # Для этого нужен доступ к боту
-
-            message_to_user = (
-                "🎉 <b>Ваш VPN ключ готов!</b>\n\n"
-                f"🔑 Ключ: <code>{key_name}</code>\n"
-                f"🌐 IP: <code>{client_ip}</code>\n"
-                f"⏳ Срок: {days} дней\n"
-                f"📅 Истекает: {vpn_key.expires_at.strftime('%d.%m.%Y %H:%M')}\n\n"
-                "📎 <b>Конфигурационный файл:</b>\n"
-                "Прикрепите этот файл к WireGuard приложению."
-            )
-
-            # Здесь нужно отправить сообщение пользователю
-            # Пока просто сохраняем для теста
-            print(f"Ключ создан для пользователя {user.telegram_id}")
-
-            # Отправляем подтверждение администратору
-            await callback.message.edit_text(
-                f"✅ <b>Платеж подтвержден и ключ создан!</b>\n\n"
-                f"🔑 Ключ: {key_name}\n"
-                f"👤 Пользователь: {user.full_name}\n"
-                f"💰 Сумма: {payment.amount}₽\n"
-                f"⏳ Срок: {days} дней\n\n"
-                "✅ VPN ключ успешно отправлен пользователю."
-            )
-
-            # Логируем действие
-            # Здесь можно добавить логирование
-
-        except Exception as e:
-            # Если ошибка при создании ключа
-            error_msg = (
-                f"❌ <b>Ошибка при создании VPN ключа!</b>\n\n"
-                f"Платеж: {payment.payment_id}\n"
-                f"Пользователь: {user.full_name}\n"
-                f"Ошибка: {str(e)}"
-            )
+        if payment.status != "paid":
+            await callback.answer(f"⚠️ Платеж в статусе {payment.status}", show_alert=True)
+            return
 
-            await callback.message.edit_text(error_msg)
+        user = payment.user
 
-            # Возвращаем платеж в статус оплачен
-            payment.status = "paid"
-            await session.commit()
+    # Ключ выдаст очередь задач: SSH не держит callback, а платеж станет
+    # confirmed только вместе с записью ключа (при ошибке будет повтор)
+    await provisioning_pipeline.confirm([payment.id], callback.from_user.id)
 
-            await callback.answer("❌ Ошибка при создании ключа", show_alert=True)
-            return
+    await callback.message.edit_text(
+        f"✅ <b>Платеж подтвержден</b>\n\n"
+        f"👤 Пользователь: {user.full_name}\n"
+        f"💰 Сумма: {payment.amount}₽\n\n"
+        "⏳ Ключ создается и будет отправлен пользователю автоматически."
+    )
 
     await callback.answer("✅ Платеж подтвержден")
 
@@ -6,13 +6,27 @@ import asyncio
 
 from src.states.vpn_states import VPNPurchaseStates
 from src.services import get_session, PaymentDAO, UserDAO
-from src.config import config
+from src.services.notifications import admin_notifier
 
 payment_router = Router()
 router = payment_router
 logger = logging.getLogger(__name__)
 
 
+def render_payment_proof(message: Message, payment) -> str:
+    """Подпись к чеку для админов"""
+    return (
+        "💰 <b>НОВЫЙ ПЛАТЁЖ НА ПРОВЕРКУ</b>\n\n"
+        f"👤 Пользователь: {message.from_user.full_name}\n"
+        f"🆔 TG ID: {message.from_user.id}\n"
+        f"📱 Username: @{message.from_user.username}\n"
+        f"💳 Payment ID: <code>{payment.payment_id}</code>\n"
+        f"💰 Сумма: {payment.amount}₽\n"
+        f"📅 Дата: {payment.created_at.strftime('%d.%m.%Y %H:%M') if payment.created_at else 'N/A'}\n\n"
+        "⚡ <i>Для подтверждения используйте админ-панель</i>"
+    )
+
+
 @router.message(
     VPNPurchaseStates.waiting_payment_proof,
     F.photo | F.document
@@ -49,69 +63,27 @@ async def process_payment_proof(message: Message, state: FSMContext):
             proof_photo_id=file_id
         )
 
-        # Получаем администраторов из базы
-        admins = await UserDAO.get_admins(session)
-
-        if not admins:
-            # Если нет админов в базе, используем ID из конфига
-            admin_ids = getattr(config.bot, 'admin_ids', [])
-            logger.warning(f"⚠️ Админы не найдены в БД, используем конфиг: {admin_ids}")
-
-            if not admin_ids:
-                logger.error("❌ Нет администраторов для уведомления!")
-                await message.answer(
-                    "✅ <b>Чек получен, но администратор не найден!</b>\n\n"
-                    "Пожалуйста, сообщите администратору вручную.",
-                    parse_mode="HTML"
-                )
-                return
-
-            # Отправляем админам из конфига
-            for admin_id in admin_ids:
-                try:
-                    logger.info(f"📤 Отправка чека админу {admin_id}...")
-                    await message.bot.send_photo(
-                        chat_id=admin_id,
-                        photo=file_id,
-                        caption=(
-                            "💰 <b>НОВЫЙ ПЛАТЁЖ НА ПРОВЕРКУ</b>\n\n"
-                            f"👤 Пользователь: {message.from_user.full_name}\n"
-                            f"🆔 TG ID: {message.from_user.id}\n"
-                            f"📱 Username: @{message.from_user.username}\n"
-                            f"💳 Payment ID: <code>{payment.payment_id}</code>\n"
-                            f"💰 Сумма: {payment.amount}₽\n"
-                            f"📅 Дата: {payment.created_at.strftime('%d.%m.%Y %H:%M') if payment.created_at else 'N/A'}\n\n"
-                            "⚡ <i>Для подтверждения используйте админ-панель</i>"
-                        ),
-                        parse_mode="HTML"
-                    )
-                    logger.info(f"✅ Чек отправлен админу {admin_id}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка отправки админу {admin_id}: {str(e)}")
-
-        else:
-            # Отправляем админам из базы
-            for admin in admins:
-                try:
-                    logger.info(f"📤 Отправка чека админу {admin.telegram_id} ({admin.username})...")
-                    await message.bot.send_photo(
-                        chat_id=admin.telegram_id,
-                        photo=file_id,
-                        caption=(
-                            "💰 <b>НОВЫЙ ПЛАТЁЖ НА ПРОВЕРКУ</b>\n\n"
-                            f"👤 Пользователь: {message.from_user.full_name}\n"
-                            f"🆔 TG ID: {message.from_user.id}\n"
-                            f"📱 Username: @{message.from_user.username}\n"
-                            f"💳 Payment ID: <code>{payment.payment_id}</code>\n"
-                            f"💰 Сумма: {payment.amount}₽\n"
-                            f"📅 Дата: {payment.created_at.strftime('%d.%m.%Y %H:%M') if payment.created_at else 'N/A'}\n\n"
-                            "⚡ <i>Для подтверждения используйте админ-панель</i>"
-                        ),
-                        parse_mode="HTML"
-                    )
-                    logger.info(f"✅ Чек отправлен админу {admin.telegram_id}")
-                except Exception as e:
-                    logger.error(f"❌ Ошибка отправки админу {admin.telegram_id}: {str(e)}")
+        # Получаем администраторов из базы (если их нет - из конфига)
+        admin_ids = admin_notifier.resolve_admins(await UserDAO.get_admins(session))
+
+    if not admin_ids:
+        logger.error("❌ Нет администраторов для уведомления!")
+        await message.answer(
+            "✅ <b>Чек получен, но администратор не найден!</b>\n\n"
+            "Пожалуйста, сообщите администратору вручную.",
+            parse_mode="HTML"
+        )
+        return
+
+    # Подпись собирается один раз, доставка всем админам идет в фоне
+    count = admin_notifier.notify(
+        key=payment.payment_id,
+        admin_ids=admin_ids,
+        text=render_payment_proof(message, payment),
+        photo=file_id if message.photo else None,
+        document=file_id if not message.photo else None
+    )
+    logger.info(f"📤 Чек {payment.payment_id} поставлен в очередь для админов: {count}")
 
     await message.answer(
         "✅ <b>Чек получен!</b>\n\n"
@@ -30,7 +30,7 @@ async def cmd_vpn_key(message: Message, state: FSMContext):
 
     # Проверяем, не заблокирован ли пользователь
     async for session in get_session():
-        user = await UserDAO.get_by_telegram_id(session, message.from_user.id)
+        user = await UserDAO.get_by_telegram_id(session, message.from_user.id, fresh=True)
         if user and user.is_banned:
             await message.answer(
                 "⛔️ <b>Ваш аккаунт заблокирован!</b>\n\n"
@@ -96,8 +96,25 @@ def get_admin_confirmation_keyboard():
         InlineKeyboardButton(text="▶️ Следующий", callback_data="admin_next")
     )
 
+    builder.row(
+        InlineKeyboardButton(text="✅ Подтвердить страницу", callback_data="admin_confirm_page"),
+        InlineKeyboardButton(text="⏩ Подтвердить все", callback_data="admin_confirm_all")
+    )
+
     builder.row(
         InlineKeyboardButton(text="⬅️ Назад", callback_data="admin_back")
     )
 
     return builder.as_markup()
+
+
+def get_admin_bulk_confirm_keyboard():
+    """Подтверждение массового действия"""
+    builder = InlineKeyboardBuilder()
+
+    builder.row(
+        InlineKeyboardButton(text="✅ Да, подтвердить", callback_data="admin_confirm_all_yes"),
+        InlineKeyboardButton(text="↩️ Отмена", callback_data="admin_confirmations")
+    )
+
+    return builder.as_markup()
@@ -3,25 +3,38 @@ import logging
 from aiogram import Bot, Dispatcher
 from aiogram.enums import ParseMode
 from aiogram.client.default import DefaultBotProperties
-from aiogram.fsm.storage.memory import MemoryStorage
+from aiogram.fsm.storage.base import BaseStorage
 
 from src.config import config
 from src.bot.loader import setup_middlewares, setup_routers
-from src.services.database import create_db_pool, close_db_pool
+from src.bot.fsm_storage import create_storage
+from src.bot.webhook import run_webhook
+from src.services.database import create_db_pool, close_db_pool, get_session
+from src.services.ssh_pool import ssh_pool
+from src.services.wg_keys import key_pool
+from src.services.wireguard import wireguard_service, config_flusher
+from src.services.vpn_service import VPNService
+from src.services.scheduler import scheduler_service
+from src.services.activity import activity_tracker
+from src.services.rate_limit import throttler
+from src.services.sender import message_sender
+from src.services.notifications import admin_notifier
+from src.services.broadcast import broadcast_service
+from src.services.jobs import job_queue
+from src.services.provisioning import provisioning_pipeline  # регистрирует обработчики задач provision/revoke
 from src.utils.logger import setup_logging
 
 logger = setup_logging()
 
 
-async def main() -> None:
-    """Главная функция запуска бота"""
-
-    bot = Bot(
+def create_bot() -> Bot:
+    return Bot(
         token=config.bot.token,
         default=DefaultBotProperties(parse_mode=ParseMode.HTML)
     )
 
-    storage = MemoryStorage()
+
+async def create_dispatcher(storage: BaseStorage) -> Dispatcher:
     dp = Dispatcher(storage=storage)
 
     # middleware
@@ -31,31 +44,109 @@ async def main() -> None:
     for router in setup_routers():
         dp.include_router(router)
 
+    return dp
+
+
+async def start_services(bot: Bot, primary: bool = True, shards: int = 1) -> None:
+    """Запуск фоновых сервисов
+
+    primary=False - шард без синглтонов: планировщик, выдача ключей и
+    IP адресов работают только в основном процессе (шард 0).
+    shards - число процессов, делящих лимит отправки бота.
+    """
+    # очередь исходящих сообщений
+    message_sender.start(bot, share=1 / shards)
+
+    # пакетная запись last_activity
+    activity_tracker.start()
+
+    if not primary:
+        return
+
+    # пул ключей WireGuard
+    key_pool.start()
+
+    # прогрев кэша данных сервера WireGuard и пула IP адресов
+    await warm_server_info()
+    await warm_ip_pool()
+
+    # выдача и отзыв ключей (задачи из таблицы jobs)
+    job_queue.start()
+
+    # отзыв просроченных ключей (первый проход загружает очередь сроков)
+    scheduler_service.start()
+
+    # рассылка, прерванная прошлой остановкой
+    await broadcast_service.resume_interrupted()
+
     # уведомляем админов
     await notify_admins(bot)
 
+
+async def stop_services() -> None:
+    await broadcast_service.shutdown()
+    await job_queue.shutdown()
+    await provisioning_pipeline.shutdown()
+    await message_sender.shutdown()
+    scheduler_service.stop()
+    key_pool.stop()
+    await activity_tracker.shutdown()
+    await config_flusher.shutdown()
+    await ssh_pool.close()
+    await throttler.close()
+
+
+async def main() -> None:
+    """Главная функция запуска бота"""
+
+    bot = create_bot()
+    storage = create_storage()
+    dp = await create_dispatcher(storage)
+
+    await start_services(bot)
+
     logger.info("🤖 Бот запущен и принимает апдейты")
 
     try:
-        # 🔥 ВОТ ЧЕГО НЕ ХВАТАЛО
-        await dp.start_polling(bot)
+        if config.webhook.mode == "webhook":
+            await run_webhook(dp, bot)
+        else:
+            # webhook мог остаться от запуска в режиме webhook - polling с ним не работает
+            await bot.delete_webhook()
+            # 🔥 ВОТ ЧЕГО НЕ ХВАТАЛО
+            await dp.start_polling(bot)
     finally:
+        await stop_services()
+        await storage.close()
         await bot.session.close()
 
 
+async def warm_server_info() -> None:
+    try:
+        info = await wireguard_service.get_server_info(force=True)
+        logger.info(f"Данные сервера WireGuard загружены (порт {info['port']})")
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить данные сервера WireGuard: {e}")
+
+
+async def warm_ip_pool() -> None:
+    try:
+        async for session in get_session():
+            await VPNService(session).load_ip_pool()
+    except Exception as e:
+        logger.warning(f"Не удалось загрузить пул IP адресов: {e}")
+
+
 async def notify_admins(bot: Bot) -> None:
     if not config.bot.admin_ids:
         return
 
-    for admin_id in config.bot.admin_ids:
-        try:
-            await bot.send_message(
-                admin_id,
-                "🤖 <b>VPN Bot запущен!</b>\n\n"
-                "Статус: <code>🟢 Online</code>"
-            )
-        except Exception as e:
-            logger.error(f"Не удалось уведомить админа {admin_id}: {e}")
+    admin_notifier.notify(
+        key="startup",
+        admin_ids=config.bot.admin_ids,
+        text="🤖 <b>VPN Bot запущен!</b>\n\n"
+             "Статус: <code>🟢 Online</code>"
+    )
 
 
 if __name__ == "__main__":
@@ -1,5 +1,8 @@
 from .user import User
 from .vpn_key import VPNKey
 from .payment import Payment
+from .fsm_state import FSMState
+from .broadcast import Broadcast
+from .job import Job
 
-__all__ = ["User", "VPNKey", "Payment"]
\ No newline at end of file
+__all__ = ["User", "VPNKey", "Payment", "FSMState", "Broadcast", "Job"]
@@ -0,0 +1,38 @@
+from sqlalchemy import BigInteger, String, Text, DateTime, Integer
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+
+from src.models.base import Base
+
+
+class Broadcast(Base):
+    """Рассылка всем пользователям и ее прогресс"""
+    __tablename__ = "broadcasts"
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    text: Mapped[str] = mapped_column(Text)
+    created_by: Mapped[int] = mapped_column(BigInteger)
+
+    # pending / running / paused / finished / cancelled
+    status: Mapped[str] = mapped_column(String(20), default="pending", index=True)
+
+    # Контрольная точка: users.id последнего обработанного пользователя
+    last_user_id: Mapped[int] = mapped_column(Integer, default=0)
+
+    total: Mapped[int] = mapped_column(Integer, default=0)
+    sent: Mapped[int] = mapped_column(Integer, default=0)
+    failed: Mapped[int] = mapped_column(Integer, default=0)
+    blocked: Mapped[int] = mapped_column(Integer, default=0)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    started_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    @property
+    def processed(self) -> int:
+        return self.sent + self.failed + self.blocked
+
+    def __repr__(self):
+        return f"Broadcast(id={self.id}, status={self.status}, {self.processed}/{self.total})"
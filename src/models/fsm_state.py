@@ -0,0 +1,23 @@
+from sqlalchemy import String, Text, DateTime
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+
+from src.models.base import Base
+
+
+class FSMState(Base):
+    """Состояние FSM пользователя (для FSM_STORAGE=sql)"""
+    __tablename__ = "fsm_states"
+
+    # Ключ aiogram: fsm:{bot_id}:{chat_id}:{user_id}:...
+    key: Mapped[str] = mapped_column(String(255), primary_key=True)
+
+    state: Mapped[Optional[str]] = mapped_column(String(255), nullable=True)
+    data: Mapped[str] = mapped_column(Text, default="{}")
+
+    # По этому полю удаляются брошенные состояния (FSM_TTL)
+    updated_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now, index=True)
+
+    def __repr__(self):
+        return f"FSMState(key={self.key}, state={self.state})"
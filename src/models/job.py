@@ -0,0 +1,43 @@
+from sqlalchemy import BigInteger, String, Text, DateTime, Integer, Index
+from sqlalchemy.orm import Mapped, mapped_column
+from datetime import datetime
+from typing import Optional
+
+from src.models.base import Base
+
+
+class Job(Base):
+    """Фоновая задача (выдача или отзыв ключа) с повторами"""
+    __tablename__ = "jobs"
+    __table_args__ = (
+        # Выборка готовых к выполнению: WHERE status = ... AND run_at <= now
+        Index("ix_jobs_status_run_at", "status", "run_at"),
+    )
+
+    id: Mapped[int] = mapped_column(primary_key=True)
+
+    # provision / revoke
+    kind: Mapped[str] = mapped_column(String(20))
+    # Одна задача на объект: provision:payment:<id>, revoke:key:<id>
+    idempotency_key: Mapped[str] = mapped_column(String(100), unique=True)
+    payload: Mapped[str] = mapped_column(Text, default="{}")
+
+    # pending / running / done / dead
+    status: Mapped[str] = mapped_column(String(20), default="pending")
+    attempts: Mapped[int] = mapped_column(Integer, default=0)
+    max_attempts: Mapped[int] = mapped_column(Integer, default=5)
+
+    # Следующая попытка; у running - срок аренды (после падения бота задача вернется)
+    run_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    locked_until: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+    last_error: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+
+    # Кто поставил (админ) и общая пачка - для прогресса массовых действий
+    created_by: Mapped[Optional[int]] = mapped_column(BigInteger, nullable=True)
+    batch_id: Mapped[Optional[str]] = mapped_column(String(36), nullable=True, index=True)
+
+    created_at: Mapped[datetime] = mapped_column(DateTime, default=datetime.now)
+    finished_at: Mapped[Optional[datetime]] = mapped_column(DateTime, nullable=True)
+
+    def __repr__(self):
+        return f"Job(id={self.id}, {self.idempotency_key}, status={self.status}, attempts={self.attempts})"
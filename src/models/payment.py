@@ -1,4 +1,4 @@
-from sqlalchemy import String, Text, DateTime, Integer, Float, ForeignKey
+from sqlalchemy import String, Text, DateTime, Integer, Float, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 from datetime import datetime, timedelta
 from typing import Optional, TYPE_CHECKING
@@ -12,6 +12,10 @@ if TYPE_CHECKING:
 
 class Payment(Base):
     __tablename__ = "payments"
+    __table_args__ = (
+        # Очередь подтверждений: WHERE status = ... ORDER BY created_at
+        Index("ix_payments_status_created_at", "status", "created_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     payment_id: Mapped[str] = mapped_column(String(100), unique=True)
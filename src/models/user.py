@@ -1,5 +1,5 @@
 from sqlalchemy.orm import relationship
-from sqlalchemy import String, BigInteger, Boolean, DateTime, Float
+from sqlalchemy import String, BigInteger, Boolean, DateTime, Float, Index, false
 from sqlalchemy.orm import Mapped, mapped_column
 from datetime import datetime
 from typing import Optional, TYPE_CHECKING
@@ -9,6 +9,10 @@ from src.models.base import Base
 
 class User(Base):
     __tablename__ = "users"
+    __table_args__ = (
+        # Список админов (UserDAO.get_admins)
+        Index("ix_users_is_admin", "is_admin"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     telegram_id: Mapped[int] = mapped_column(BigInteger, unique=True, nullable=False)
@@ -19,6 +23,8 @@ class User(Base):
 
     is_admin: Mapped[bool] = mapped_column(Boolean, default=False)
     is_banned: Mapped[bool] = mapped_column(Boolean, default=False)
+    # Пользователь заблокировал бота (403 при рассылке); сбрасывается при /start
+    bot_blocked: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false())
 
     total_spent: Mapped[float] = mapped_column(Float, default=0.0)
     keys_created: Mapped[int] = mapped_column(default=0)
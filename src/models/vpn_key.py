@@ -1,7 +1,7 @@
 
 # relationship после определения класса (в самом конце файла)
 
-from sqlalchemy import String, Text, DateTime, Integer, Float, ForeignKey
+from sqlalchemy import String, Text, DateTime, Integer, Float, ForeignKey, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
 
 from datetime import datetime, timedelta
@@ -16,6 +16,12 @@ if TYPE_CHECKING:
 
 class VPNKey(Base):
     __tablename__ = "vpn_keys"
+    __table_args__ = (
+        # Ключи пользователя (/mystatus, VPNKeyDAO.get_user_keys)
+        Index("ix_vpn_keys_user_id_status", "user_id", "status"),
+        # Просроченные ключи (планировщик)
+        Index("ix_vpn_keys_status_expires_at", "status", "expires_at"),
+    )
 
     id: Mapped[int] = mapped_column(primary_key=True)
     key_name: Mapped[str] = mapped_column(String(100), unique=True)
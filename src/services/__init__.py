@@ -6,7 +6,7 @@ from .database import (
     get_session
 )
 
-from .dao import UserDAO, VPNKeyDAO, PaymentDAO
+from .dao import UserDAO, VPNKeyDAO, PaymentDAO, BroadcastDAO, StatsDAO, JobDAO
 
 __all__ = [
     "engine",
@@ -16,5 +16,8 @@ __all__ = [
     "get_session",
     "UserDAO",
     "VPNKeyDAO",
-    "PaymentDAO"
+    "PaymentDAO",
+    "BroadcastDAO",
+    "StatsDAO",
+    "JobDAO"
 ]
\ No newline at end of file
@@ -0,0 +1,95 @@
+"""
+ACTIVITY.PY - Учет последней активности пользователей
+
+Время последнего апдейта копится в памяти и записывается в users.last_activity
+одним пакетным UPDATE раз в ACTIVITY_FLUSH_INTERVAL секунд.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import bindparam, update
+
+from src.config import config
+from src.models.user import User
+from src.services.database import get_session
+
+logger = logging.getLogger(__name__)
+
+_users = User.__table__
+
+# executemany по telegram_id (core-таблица, чтобы ORM не требовал первичный ключ)
+UPDATE_LAST_ACTIVITY = (
+    update(_users)
+    .where(_users.c.telegram_id == bindparam("tid"))
+    .values(last_activity=bindparam("ts"))
+)
+
+
+class ActivityTracker:
+    """Буфер last_activity с периодической записью в БД"""
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._pending: Dict[int, datetime] = {}
+        self._task: Optional[asyncio.Task] = None
+        self.flushes = 0
+
+    def touch(self, telegram_id: int) -> None:
+        """Отметить активность (без обращения к БД)"""
+        self._pending[telegram_id] = datetime.now()
+
+    async def flush(self) -> int:
+        """Записать накопленные отметки одним UPDATE"""
+        if not self._pending:
+            return 0
+
+        pending, self._pending = self._pending, {}
+        params = [{"tid": tid, "ts": ts} for tid, ts in pending.items()]
+
+        try:
+            async for session in get_session():
+                await session.execute(UPDATE_LAST_ACTIVITY, params)
+                await session.commit()
+        except BaseException:
+            # Возвращаем отметки, более свежие значения не перетираем
+            for tid, ts in pending.items():
+                self._pending.setdefault(tid, ts)
+            raise
+
+        self.flushes += 1
+        return len(params)
+
+    async def _flush_loop(self) -> None:
+        while True:
+            try:
+                await asyncio.sleep(self.interval)
+                count = await self.flush()
+                if count:
+                    logger.debug(f"Записана активность {count} пользователей")
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка записи активности пользователей: {e}")
+
+    def start(self) -> None:
+        """Запуск периодической записи"""
+        if self._task and not self._task.done():
+            return
+        self._task = asyncio.create_task(self._flush_loop())
+
+    async def shutdown(self) -> None:
+        """Остановка с финальной записью буфера"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.error(f"Не удалось записать активность при остановке: {e}")
+
+
+# Создаем глобальный экземпляр
+activity_tracker = ActivityTracker(config.db.activity_flush_interval)
@@ -0,0 +1,153 @@
+"""
+BROADCAST.PY - Рассылка сообщения всем пользователям
+
+Получатели читаются из БД пачками по BROADCAST_CHUNK (keyset по users.id,
+без загрузки всей таблицы) и уходят через очередь отправки с низким
+приоритетом - в пределах лимита бота и не мешая ответам пользователям.
+
+После каждой пачки в broadcasts сохраняются счетчики и id последнего
+пользователя: прерванная (перезапуском или паузой) рассылка продолжается
+с этого места. При падении посреди пачки она может уйти повторно.
+Пользователи, заблокировавшие бота, отмечаются в users.bot_blocked и
+в следующие рассылки не попадают.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from aiogram.exceptions import TelegramForbiddenError
+
+from src.config import config
+from src.models.broadcast import Broadcast
+from src.services.dao import BroadcastDAO, UserDAO
+from src.services.database import get_session
+from src.services.sender import message_sender, PRIORITY_LOW
+
+logger = logging.getLogger(__name__)
+
+
+class BroadcastService:
+    """Выполнение рассылок с контрольными точками (одна за раз)"""
+
+    def __init__(self, chunk_size: int):
+        self.chunk_size = chunk_size
+        self._task: Optional[asyncio.Task] = None
+        self._current: Optional[int] = None
+        self._pause_requested = False
+
+    @property
+    def current(self) -> Optional[int]:
+        """id выполняемой рассылки"""
+        return self._current if self._task and not self._task.done() else None
+
+    async def create(self, text: str, admin_id: int) -> Broadcast:
+        async for session in get_session():
+            total = await UserDAO.count_recipients(session)
+            return await BroadcastDAO.create(session, text=text, created_by=admin_id, total=total)
+
+    def start(self, broadcast_id: int) -> bool:
+        """Запустить (или продолжить) рассылку; False - уже идет другая"""
+        if self.current is not None:
+            return False
+
+        self._current = broadcast_id
+        self._pause_requested = False
+        self._task = asyncio.create_task(self._run(broadcast_id))
+        return True
+
+    def pause(self) -> Optional[int]:
+        """Остановить текущую рассылку после отправки пачки"""
+        if self.current is None:
+            return None
+        self._pause_requested = True
+        return self._current
+
+    async def resume_interrupted(self) -> None:
+        """Продолжить рассылку, прерванную остановкой бота"""
+        async for session in get_session():
+            running = await BroadcastDAO.get_by_status(session, "running")
+
+        for broadcast in running:
+            if self.start(broadcast.id):
+                logger.info(f"📣 Продолжаем рассылку #{broadcast.id} с пользователя id>{broadcast.last_user_id}")
+            else:
+                # Одновременно выполняется только одна - остальные ждут ручного запуска
+                async for session in get_session():
+                    await BroadcastDAO.set_status(session, broadcast.id, "paused")
+
+    async def _run(self, broadcast_id: int) -> None:
+        async for session in get_session():
+            broadcast = await BroadcastDAO.get_by_id(session, broadcast_id)
+            if not broadcast or broadcast.status in ("finished", "cancelled"):
+                return
+            await BroadcastDAO.set_status(
+                session, broadcast_id, "running",
+                started_at=broadcast.started_at or datetime.now()
+            )
+            text, cursor = broadcast.text, broadcast.last_user_id
+
+        logger.info(f"📣 Рассылка #{broadcast_id} запущена")
+
+        try:
+            while not self._pause_requested:
+                async for session in get_session():
+                    chunk = await UserDAO.get_recipients_chunk(session, cursor, self.chunk_size)
+
+                if not chunk:
+                    async for session in get_session():
+                        await BroadcastDAO.set_status(session, broadcast_id, "finished", finished_at=datetime.now())
+                    logger.info(f"✅ Рассылка #{broadcast_id} завершена")
+                    return
+
+                sent, failed, blocked = await self._send_chunk(chunk, text)
+                cursor = chunk[-1][0]
+
+                async for session in get_session():
+                    await UserDAO.mark_bot_blocked(session, blocked)
+                    await BroadcastDAO.checkpoint(
+                        session, broadcast_id, cursor,
+                        sent=sent, failed=failed, blocked=len(blocked)
+                    )
+
+            async for session in get_session():
+                await BroadcastDAO.set_status(session, broadcast_id, "paused")
+            logger.info(f"⏸ Рассылка #{broadcast_id} приостановлена (пользователь id>{cursor})")
+
+        except asyncio.CancelledError:
+            # Остановка бота: статус running остается, при запуске продолжим
+            logger.info(f"Рассылка #{broadcast_id} прервана остановкой бота")
+            raise
+        except Exception as e:
+            logger.error(f"❌ Ошибка рассылки #{broadcast_id}: {e}")
+            async for session in get_session():
+                await BroadcastDAO.set_status(session, broadcast_id, "paused")
+
+    async def _send_chunk(self, chunk: List[Tuple[int, int]], text: str) -> Tuple[int, int, List[int]]:
+        """Отправить пачку; (доставлено, ошибок, telegram_id заблокировавших)"""
+        futures = [
+            message_sender.send_message(telegram_id, text, PRIORITY_LOW)
+            for _, telegram_id in chunk
+        ]
+        results = await asyncio.gather(*futures, return_exceptions=True)
+
+        sent, failed, blocked = 0, 0, []
+        for (_, telegram_id), result in zip(chunk, results):
+            if isinstance(result, TelegramForbiddenError):
+                blocked.append(telegram_id)
+            elif isinstance(result, BaseException):
+                failed += 1
+            else:
+                sent += 1
+        return sent, failed, blocked
+
+    async def shutdown(self) -> None:
+        if self._task and not self._task.done():
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+        self._task = None
+
+
+# Создаем глобальный экземпляр
+broadcast_service = BroadcastService(chunk_size=config.broadcast.chunk_size)
@@ -1,13 +1,121 @@
-from typing import Optional, List
-from datetime import datetime
+from typing import Callable, Iterable, Optional, List, Dict, Any, Tuple
+from datetime import datetime, timedelta
 
-from sqlalchemy import select, update
+from cachetools import TTLCache
+from sqlalchemy import select, update, event, func, tuple_, or_, and_, bindparam, inspect as sa_inspect
+from sqlalchemy.dialects import postgresql, sqlite
 from sqlalchemy.ext.asyncio import AsyncSession
-from sqlalchemy.orm import selectinload
+from sqlalchemy.orm import Session, selectinload, make_transient_to_detached, object_session
 
+from src.config import config
+from src.services import database
+from src.services.database import routing_stats
 from src.models.user import User
 from src.models.vpn_key import VPNKey
 from src.models.payment import Payment
+from src.models.broadcast import Broadcast
+from src.models.job import Job
+
+
+# ========== USER CACHE ==========
+class UserCache:
+    """Кэш пользователей по telegram_id (TTL + LRU)
+
+    Хранятся значения колонок, а не ORM-объекты: при попадании объект
+    присоединяется к сессии запроса без SELECT. Записи сбрасываются при
+    изменении пользователя через ORM и в методах UserDAO (бан, права,
+    профиль). В многопроцессном режиме сброс рассылается остальным
+    шардам (publish ставит sharding.py), иначе бан или снятие прав в
+    шарде 0 не дошли бы до шарда пользователя до истечения TTL.
+    Изменения из других процессов (scripts/make_admin.py) сюда не
+    доходят, поэтому проверки прав и бана читают пользователя из БД
+    (get_by_telegram_id(..., fresh=True)).
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache: TTLCache = TTLCache(maxsize=maxsize, ttl=ttl)
+        self._columns = [attr.key for attr in sa_inspect(User).column_attrs]
+        self.hits = 0
+        self.misses = 0
+        # Рассылка сброшенных telegram_id другим процессам
+        self.publish: Optional[Callable[[List[int]], None]] = None
+
+    def get(self, telegram_id: int) -> Optional[Dict[str, Any]]:
+        values = self._cache.get(telegram_id)
+        if values is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return values
+
+    def put(self, user: User) -> None:
+        self._cache[user.telegram_id] = {key: getattr(user, key) for key in self._columns}
+
+    def invalidate(self, telegram_id: int) -> None:
+        self.invalidate_many([telegram_id])
+
+    def invalidate_many(self, telegram_ids: Iterable[int], broadcast: bool = True) -> None:
+        """Сбросить записи; broadcast=False - только в этом процессе"""
+        telegram_ids = list(telegram_ids)
+        for telegram_id in telegram_ids:
+            self._cache.pop(telegram_id, None)
+        if broadcast and telegram_ids and self.publish:
+            self.publish(telegram_ids)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    @property
+    def hit_rate(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "size": len(self._cache),
+            "maxsize": self._cache.maxsize,
+            "ttl": self._cache.ttl,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hit_rate,
+        }
+
+
+# Создаем глобальный экземпляр
+user_cache = UserCache(config.db.user_cache_size, config.db.user_cache_ttl)
+
+
+def _invalidate_on_commit(session: Session, telegram_ids: Iterable[int]) -> None:
+    """Сбросить записи сейчас, а другим процессам - после commit
+
+    До commit другой шард перечитал бы из БД старые значения.
+    """
+    telegram_ids = list(telegram_ids)
+    user_cache.invalidate_many(telegram_ids, broadcast=False)
+    session.info.setdefault("invalidated_users", set()).update(telegram_ids)
+
+
+@event.listens_for(User, "after_update")
+def _invalidate_cached_user(mapper, connection, target: User) -> None:
+    """Любое изменение пользователя через ORM сбрасывает его запись в кэше"""
+    _invalidate_on_commit(object_session(target), [target.telegram_id])
+
+
+@event.listens_for(User, "after_delete")
+def _drop_cached_user(mapper, connection, target: User) -> None:
+    _invalidate_on_commit(object_session(target), [target.telegram_id])
+
+
+@event.listens_for(Session, "after_commit")
+def _publish_invalidated_users(session: Session) -> None:
+    telegram_ids = session.info.pop("invalidated_users", None)
+    if telegram_ids and user_cache.publish:
+        user_cache.publish(list(telegram_ids))
+
+
+@event.listens_for(Session, "after_rollback")
+def _forget_invalidated_users(session: Session) -> None:
+    session.info.pop("invalidated_users", None)
 
 
 # ========== USER DAO ==========
@@ -20,25 +128,179 @@ class UserDAO:
 
     @staticmethod
     async def get_or_create(session: AsyncSession, telegram_id: int, **kwargs) -> User:
-        result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+        """Создание пользователя или обновление его профиля одним запросом
+
+        INSERT ... ON CONFLICT (telegram_id) DO UPDATE ... RETURNING:
+        без гонки при повторных /start и без отдельного SELECT.
+        """
+        dialect = session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+
+        # Пользователь снова пишет боту - значит, не заблокировал его
+        kwargs.setdefault("bot_blocked", False)
+
+        stmt = insert(User).values(telegram_id=telegram_id, **kwargs)
+        # Без данных профиля обновлять нечего, но RETURNING нужна строка
+        updates = {key: stmt.excluded[key] for key in kwargs} or {"telegram_id": stmt.excluded.telegram_id}
+        stmt = (
+            stmt.on_conflict_do_update(index_elements=[User.telegram_id], set_=updates)
+            .returning(User)
+            .execution_options(populate_existing=True)
         )
+
+        result = await session.execute(stmt)
+        user = result.scalar_one()
+        await session.commit()
+
+        user_cache.put(user)
+        return user
+
+    @staticmethod
+    async def get_by_telegram_id(
+        session: AsyncSession,
+        telegram_id: int,
+        fresh: bool = False
+    ) -> Optional[User]:
+        """Пользователь по telegram_id
+
+        fresh=True - мимо кэша и реплики (проверки is_admin/is_banned):
+        изменение из другого процесса видно сразу, запись кэша обновляется.
+        """
+        if fresh:
+            result = await session.execute(
+                select(User)
+                .where(User.telegram_id == telegram_id)
+                .execution_options(populate_existing=True)
+            )
+            user = result.scalar_one_or_none()
+            if user:
+                user_cache.put(user)
+            else:
+                user_cache.invalidate_many([telegram_id], broadcast=False)
+            return user
+
+        values = user_cache.get(telegram_id)
+        if values is not None:
+            # Присоединяем к сессии без запроса к БД
+            user = User(**values)
+            make_transient_to_detached(user)
+            return await session.merge(user, load=False)
+
+        stmt = select(User).where(User.telegram_id == telegram_id)
+        result = await session.execute(stmt.execution_options(replica=True))
         user = result.scalar_one_or_none()
 
-        if not user:
-            user = User(telegram_id=telegram_id, **kwargs)
-            session.add(user)
-            await session.commit()
-            await session.refresh(user)
+        if user is None and database.replica_engine is not None:
+            # Только что созданный пользователь мог еще не дойти до реплики
+            routing_stats["replica_misses"] += 1
+            result = await session.execute(stmt)
+            user = result.scalar_one_or_none()
 
+        if user:
+            user_cache.put(user)
         return user
 
     @staticmethod
-    async def get_by_telegram_id(session: AsyncSession, telegram_id: int) -> Optional[User]:
+    async def set_admin(session: AsyncSession, telegram_id: int, is_admin: bool = True) -> bool:
+        return await UserDAO._update(session, telegram_id, is_admin=is_admin)
+
+    @staticmethod
+    async def set_banned(session: AsyncSession, telegram_id: int, is_banned: bool = True) -> bool:
+        return await UserDAO._update(session, telegram_id, is_banned=is_banned)
+
+    @staticmethod
+    async def update_profile(
+        session: AsyncSession,
+        telegram_id: int,
+        username: Optional[str],
+        first_name: str,
+        last_name: Optional[str]
+    ) -> bool:
+        return await UserDAO._update(
+            session,
+            telegram_id,
+            username=username,
+            first_name=first_name,
+            last_name=last_name
+        )
+
+    @staticmethod
+    async def get_recipients_chunk(
+        session: AsyncSession,
+        after_id: int,
+        limit: int
+    ) -> List[Tuple[int, int]]:
+        """(id, telegram_id) получателей рассылки после after_id
+
+        Keyset-пагинация по первичному ключу: каждая пачка - один проход
+        по индексу, без OFFSET и без загрузки всей таблицы.
+        """
+        result = await session.execute(
+            select(User.id, User.telegram_id)
+            .where(
+                User.id > after_id,
+                User.is_banned.is_(False),
+                User.bot_blocked.is_(False)
+            )
+            .order_by(User.id)
+            .limit(limit)
+        )
+        return [tuple(row) for row in result.all()]
+
+    @staticmethod
+    async def count_recipients(session: AsyncSession) -> int:
         result = await session.execute(
-            select(User).where(User.telegram_id == telegram_id)
+            select(func.count()).select_from(User).where(
+                User.is_banned.is_(False),
+                User.bot_blocked.is_(False)
+            )
         )
-        return result.scalar_one_or_none()
+        return result.scalar_one()
+
+    @staticmethod
+    async def mark_bot_blocked(session: AsyncSession, telegram_ids: List[int]) -> int:
+        """Отметить пользователей, заблокировавших бота"""
+        if not telegram_ids:
+            return 0
+
+        result = await session.execute(
+            update(User)
+            .where(User.telegram_id.in_(telegram_ids))
+            .values(bot_blocked=True)
+            .execution_options(synchronize_session=False)
+        )
+        await session.commit()
+
+        user_cache.invalidate_many(telegram_ids)
+        return result.rowcount
+
+    @staticmethod
+    async def add_spent(session: AsyncSession, payments: List[Payment]) -> None:
+        """Прибавить суммы платежей к total_spent без commit (в транзакции вызывающего)"""
+        if not payments:
+            return
+
+        users = User.__table__
+        await session.execute(
+            update(users)
+            .where(users.c.id == bindparam("b_user_id"))
+            .values(total_spent=users.c.total_spent + bindparam("b_amount")),
+            [{"b_user_id": p.user_id, "b_amount": p.amount} for p in payments]
+        )
+
+        _invalidate_on_commit(session.sync_session, (payment.user.telegram_id for payment in payments))
+
+    @staticmethod
+    async def _update(session: AsyncSession, telegram_id: int, **values) -> bool:
+        result = await session.execute(
+            update(User)
+            .where(User.telegram_id == telegram_id)
+            .values(**values)
+            .execution_options(synchronize_session="fetch")
+        )
+        await session.commit()
+        user_cache.invalidate(telegram_id)
+        return result.rowcount > 0
 
     @staticmethod
     async def get_admins(session: AsyncSession) -> List[User]:
@@ -96,7 +358,7 @@ class VPNKeyDAO:
         if active_only:
             stmt = stmt.where(VPNKey.status == "active")
 
-        result = await session.execute(stmt)
+        result = await session.execute(stmt.execution_options(replica=True))
         return list(result.scalars().all())
 
 
@@ -152,6 +414,34 @@ class PaymentDAO:
         )
         return result.scalar_one_or_none()
 
+    @staticmethod
+    async def get_queue_keys(
+        session: AsyncSession,
+        status: str,
+        limit: int,
+        after: Optional[Tuple[datetime, int]] = None
+    ) -> List[Tuple[int, datetime]]:
+        """(id, created_at) очереди по ключу (created_at, id) - без загрузки строк"""
+        stmt = select(Payment.id, Payment.created_at).where(Payment.status == status)
+        if after is not None:
+            stmt = stmt.where(tuple_(Payment.created_at, Payment.id) > tuple_(*after))
+        result = await session.execute(stmt.order_by(Payment.created_at, Payment.id).limit(limit))
+        return [tuple(row) for row in result.all()]
+
+    @staticmethod
+    async def get_many(
+        session: AsyncSession,
+        payment_ids: List[int],
+        status: str
+    ) -> List[Payment]:
+        result = await session.execute(
+            select(Payment)
+            .where(Payment.id.in_(payment_ids), Payment.status == status)
+            .options(selectinload(Payment.user))
+            .order_by(Payment.created_at, Payment.id)
+        )
+        return list(result.scalars().all())
+
     @staticmethod
     async def mark_as_paid(
         session: AsyncSession,
@@ -189,6 +479,30 @@ class PaymentDAO:
         await session.commit()
         return result.rowcount > 0
 
+    @staticmethod
+    async def confirm_many(
+        session: AsyncSession,
+        payment_ids: List[int],
+        admin_id: int,
+        comment: str = "Платеж подтвержден"
+    ) -> List[int]:
+        """Подтвердить оплаченные платежи без commit (в транзакции вызывающего)
+
+        Возвращает id, которые действительно были в статусе paid: платеж,
+        уже обработанный другим админом, в результат не попадет.
+        """
+        result = await session.execute(
+            update(Payment)
+            .where(Payment.id.in_(payment_ids), Payment.status == "paid")
+            .values(
+                status="confirmed",
+                confirmed_at=datetime.now(),
+                admin_comment=comment
+            )
+            .returning(Payment.id)
+        )
+        return list(result.scalars().all())
+
     @staticmethod
     async def reject_payment(
         session: AsyncSession,
@@ -219,3 +533,276 @@ class PaymentDAO:
         )
         await session.commit()
         return result.rowcount > 0
+
+    @staticmethod
+    async def count_by_status(session: AsyncSession, status: str) -> int:
+        """COUNT по индексу (status, created_at)"""
+        result = await session.execute(
+            select(func.count()).select_from(Payment).where(Payment.status == status)
+        )
+        return result.scalar_one()
+
+    @staticmethod
+    async def get_queue_page(
+        session: AsyncSession,
+        status: str,
+        limit: int,
+        after: Optional[Tuple[datetime, int]] = None,
+        before: Optional[Tuple[datetime, int]] = None
+    ) -> List[Payment]:
+        """Страница очереди по (created_at, id): после after или перед before"""
+        stmt = (
+            select(Payment)
+            .where(Payment.status == status)
+            .options(selectinload(Payment.user))
+            .limit(limit)
+        )
+        key = tuple_(Payment.created_at, Payment.id)
+
+        if before is not None:
+            stmt = stmt.where(key < tuple_(*before)).order_by(Payment.created_at.desc(), Payment.id.desc())
+            result = await session.execute(stmt)
+            return list(reversed(result.scalars().all()))
+
+        if after is not None:
+            stmt = stmt.where(key > tuple_(*after))
+        result = await session.execute(stmt.order_by(Payment.created_at, Payment.id))
+        return list(result.scalars().all())
+
+
+# ========== STATS DAO ==========
+class StatsDAO:
+
+    @staticmethod
+    async def get_summary(session: AsyncSession) -> Dict[str, Any]:
+        """Сводка для админ-панели (агрегаты с реплики, если она есть)"""
+        users = await session.execute(
+            select(
+                func.count(),
+                func.count().filter(User.is_banned.is_(True)),
+                func.count().filter(User.bot_blocked.is_(True))
+            ).select_from(User).execution_options(replica=True)
+        )
+        total_users, banned, blocked = users.one()
+
+        keys = await session.execute(
+            select(VPNKey.status, func.count())
+            .group_by(VPNKey.status)
+            .execution_options(replica=True)
+        )
+
+        payments = await session.execute(
+            select(Payment.status, func.count(), func.coalesce(func.sum(Payment.amount), 0))
+            .group_by(Payment.status)
+            .execution_options(replica=True)
+        )
+
+        return {
+            "users": total_users,
+            "banned": banned,
+            "blocked": blocked,
+            "keys": {status: count for status, count in keys.all()},
+            "payments": {status: (count, amount) for status, count, amount in payments.all()},
+        }
+
+
+# ========== BROADCAST DAO ==========
+class BroadcastDAO:
+
+    @staticmethod
+    async def create(session: AsyncSession, text: str, created_by: int, total: int) -> Broadcast:
+        broadcast = Broadcast(text=text, created_by=created_by, total=total, status="pending")
+        session.add(broadcast)
+        await session.commit()
+        return broadcast
+
+    @staticmethod
+    async def get_by_id(session: AsyncSession, broadcast_id: int) -> Optional[Broadcast]:
+        return await session.get(Broadcast, broadcast_id, populate_existing=True)
+
+    @staticmethod
+    async def get_by_status(session: AsyncSession, status: str) -> List[Broadcast]:
+        result = await session.execute(
+            select(Broadcast).where(Broadcast.status == status).order_by(Broadcast.id)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def get_recent(session: AsyncSession, limit: int = 5) -> List[Broadcast]:
+        result = await session.execute(
+            select(Broadcast).order_by(Broadcast.id.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
+
+    @staticmethod
+    async def set_status(session: AsyncSession, broadcast_id: int, status: str, **values) -> bool:
+        result = await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id)
+            .values(status=status, **values)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def checkpoint(
+        session: AsyncSession,
+        broadcast_id: int,
+        last_user_id: int,
+        sent: int,
+        failed: int,
+        blocked: int
+    ) -> None:
+        """Сохранить прогресс после пачки (счетчики прибавляются в БД)"""
+        await session.execute(
+            update(Broadcast)
+            .where(Broadcast.id == broadcast_id)
+            .values(
+                last_user_id=last_user_id,
+                sent=Broadcast.sent + sent,
+                failed=Broadcast.failed + failed,
+                blocked=Broadcast.blocked + blocked
+            )
+        )
+        await session.commit()
+
+
+# ========== JOB DAO ==========
+class JobDAO:
+
+    @staticmethod
+    async def enqueue(
+        session: AsyncSession,
+        kind: str,
+        items: List[Tuple[str, str]],
+        max_attempts: int,
+        created_by: Optional[int] = None,
+        batch_id: Optional[str] = None,
+        revive: bool = False
+    ) -> int:
+        """Поставить задачи (idempotency_key, payload); повтор ключа игнорируется
+
+        revive=True (действие админа) возвращает в очередь задачи с тем же
+        ключом в статусе dead; без него dead остается dead - повторная
+        постановка планировщиком не воскрешает задачу.
+        Возвращает число новых и возвращенных задач.
+        """
+        dialect = session.get_bind().dialect.name
+        insert = postgresql.insert if dialect == "postgresql" else sqlite.insert
+        now = datetime.now()
+        queued = 0
+
+        for i in range(0, len(items), 500):
+            chunk = items[i:i + 500]
+            result = await session.execute(
+                insert(Job)
+                .values([
+                    {
+                        "kind": kind, "idempotency_key": key, "payload": payload,
+                        "status": "pending", "attempts": 0, "max_attempts": max_attempts,
+                        "run_at": now, "created_by": created_by, "batch_id": batch_id,
+                        "created_at": now,
+                    }
+                    for key, payload in chunk
+                ])
+                .on_conflict_do_nothing(index_elements=[Job.idempotency_key])
+            )
+            queued += max(result.rowcount, 0)
+
+            if not revive:
+                continue
+            revived = await session.execute(
+                update(Job)
+                .where(Job.idempotency_key.in_([key for key, _ in chunk]), Job.status == "dead")
+                .values(
+                    status="pending", attempts=0, run_at=now, last_error=None,
+                    created_by=created_by, batch_id=batch_id
+                )
+            )
+            queued += revived.rowcount
+
+        await session.commit()
+        return queued
+
+    @staticmethod
+    async def claim(session: AsyncSession, limit: int, lease: float) -> List[Job]:
+        """Взять готовые задачи в работу (и задачи с истекшей арендой)"""
+        now = datetime.now()
+        ready = or_(
+            and_(Job.status == "pending", Job.run_at <= now),
+            and_(Job.status == "running", Job.locked_until < now)
+        )
+        ids = select(Job.id).where(ready).order_by(Job.run_at, Job.id).limit(limit)
+
+        # Условие повторяется во внешнем UPDATE: задачу, взятую другим
+        # обработчиком между SELECT и UPDATE, второй раз не получим
+        result = await session.execute(
+            update(Job)
+            .where(Job.id.in_(ids.scalar_subquery()), ready)
+            .values(
+                status="running",
+                attempts=Job.attempts + 1,
+                locked_until=now + timedelta(seconds=lease)
+            )
+            .returning(Job)
+            .execution_options(populate_existing=True)
+        )
+        jobs = list(result.scalars().all())
+        await session.commit()
+        return jobs
+
+    @staticmethod
+    async def finish(session: AsyncSession, job_ids: List[int]) -> None:
+        if not job_ids:
+            return
+        await session.execute(
+            update(Job)
+            .where(Job.id.in_(job_ids))
+            .values(status="done", locked_until=None, last_error=None, finished_at=datetime.now())
+        )
+        await session.commit()
+
+    @staticmethod
+    async def retry(session: AsyncSession, job_id: int, error: str, run_at: datetime) -> None:
+        await session.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status="pending", locked_until=None, last_error=error, run_at=run_at)
+        )
+        await session.commit()
+
+    @staticmethod
+    async def bury(session: AsyncSession, job_id: int, error: str) -> None:
+        """Перевести задачу в dead (попытки исчерпаны)"""
+        await session.execute(
+            update(Job)
+            .where(Job.id == job_id)
+            .values(status="dead", locked_until=None, last_error=error, finished_at=datetime.now())
+        )
+        await session.commit()
+
+    @staticmethod
+    async def requeue(session: AsyncSession, job_id: int) -> bool:
+        """Вернуть задачу из dead в очередь"""
+        result = await session.execute(
+            update(Job)
+            .where(Job.id == job_id, Job.status == "dead")
+            .values(status="pending", attempts=0, run_at=datetime.now(), finished_at=None)
+        )
+        await session.commit()
+        return result.rowcount > 0
+
+    @staticmethod
+    async def count_by_status(session: AsyncSession, batch_id: Optional[str] = None) -> Dict[str, int]:
+        stmt = select(Job.status, func.count()).group_by(Job.status)
+        if batch_id is not None:
+            stmt = stmt.where(Job.batch_id == batch_id)
+        result = await session.execute(stmt)
+        return {status: count for status, count in result.all()}
+
+    @staticmethod
+    async def get_dead(session: AsyncSession, limit: int = 10) -> List[Job]:
+        result = await session.execute(
+            select(Job).where(Job.status == "dead").order_by(Job.finished_at.desc()).limit(limit)
+        )
+        return list(result.scalars().all())
@@ -1,17 +1,354 @@
+from sqlalchemy import event
+from sqlalchemy import exc
+from sqlalchemy.orm import Session
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker, create_async_engine, AsyncEngine
-from typing import AsyncGenerator
+from contextvars import ContextVar
+from typing import Any, AsyncGenerator, Callable, Dict, Optional
+import asyncio
+import time
 
 from src.config import config
 
 # Движок базы данных
 engine: AsyncEngine | None = None
+# Реплика для чтения (DB_REPLICA_URL)
+replica_engine: AsyncEngine | None = None
 async_session_maker: async_sessionmaker[AsyncSession] | None = None
 
 
+class LazySession:
+    """Сессия апдейта, создаваемая при первом обращении
+
+    Все обращения проксируются в AsyncSession, которая создается только
+    тогда, когда хендлер действительно работает с БД. Апдейты без работы
+    с БД (троттлинг, чисто UI-колбэки) не берут соединение из пула.
+
+    Сессия принадлежит задаче апдейта: задачи, порожденные хендлером
+    (create_task копирует контекст), получают свою сессию.
+    """
+
+    def __init__(self, factory: Callable[[], AsyncSession]):
+        self._factory = factory
+        self._session: Optional[AsyncSession] = None
+        self._owner = asyncio.current_task()
+        self.released = False
+
+    def owned(self) -> bool:
+        """Вызвана ли из задачи апдейта, создавшей сессию"""
+        return not self.released and asyncio.current_task() is self._owner
+
+    @property
+    def used(self) -> bool:
+        return self._session is not None
+
+    def _get(self) -> AsyncSession:
+        if self._session is None:
+            if self.released:
+                raise RuntimeError("Сессия апдейта уже закрыта")
+            self._session = self._factory()
+        return self._session
+
+    def __getattr__(self, name):
+        return getattr(self._get(), name)
+
+    async def release(self) -> None:
+        """Закрыть сессию в конце апдейта (вызывает DatabaseMiddleware)"""
+        self.released = True
+        if self._session is not None:
+            await self._session.close()
+
+
+# Сессия текущего апдейта (устанавливается DatabaseMiddleware)
+current_session: ContextVar[Optional[LazySession]] = ContextVar("current_session", default=None)
+
+
+# ===================== ПУЛ И РЕПЛИКА =====================
+
+class MeteredQueuePool(AsyncAdaptedQueuePool):
+    """Пул, замеряющий ожидание свободного соединения"""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            connection = super()._do_get()
+        except exc.TimeoutError:
+            self.timeouts += 1
+            raise
+
+        wait = time.perf_counter() - started
+        self.checkouts += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+        return connection
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "size": self.size(),
+            "checked_out": self.checkedout(),
+            "overflow": max(self.overflow(), 0),
+            "checkouts": self.checkouts,
+            "timeouts": self.timeouts,
+            "wait_avg_ms": round(self.wait_total / (self.checkouts or 1) * 1000, 3),
+            "wait_max_ms": round(self.wait_max * 1000, 3),
+        }
+
+
+def postgres_engine_kwargs() -> Dict[str, Any]:
+    """Пул и кэш подготовленных запросов asyncpg из DatabaseConfig"""
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': config.db.pool_size,
+        'max_overflow': config.db.max_overflow,
+        'pool_timeout': config.db.pool_timeout,
+        'pool_recycle': config.db.pool_recycle,
+        'connect_args': {
+            # кэш SQLAlchemy и собственный кэш asyncpg
+            'prepared_statement_cache_size': config.db.statement_cache_size,
+            'statement_cache_size': config.db.statement_cache_size,
+        },
+    }
+
+
+# Счетчики маршрутизации чтений
+routing_stats = {"replica_reads": 0, "replica_misses": 0}
+
+
+class RoutingSession(Session):
+    """Сессия, отправляющая помеченные чтения на реплику
+
+    Запрос идет на реплику, только если помечен
+    .execution_options(replica=True) и сессия еще ничего не писала:
+    после первой записи все чтения сессии идут на основную БД, чтобы
+    видеть свои изменения.
+    """
+
+    def get_bind(self, mapper=None, clause=None, **kw):
+        if (
+            replica_engine is not None
+            and clause is not None
+            and not self._flushing
+            and not self.info.get("wrote")
+            and clause.get_execution_options().get("replica")
+        ):
+            routing_stats["replica_reads"] += 1
+            return replica_engine.sync_engine
+
+        if self._flushing or getattr(clause, "is_dml", False):
+            self.info["wrote"] = True
+        return super().get_bind(mapper, clause=clause, **kw)
+
+
+def pool_stats() -> Dict[str, Any]:
+    """Метрики пулов соединений (и очереди записи SQLite)"""
+    stats: Dict[str, Any] = {}
+    for name, eng in (("primary", engine), ("replica", replica_engine)):
+        if eng is None:
+            continue
+        pool = eng.sync_engine.pool
+        stats[name] = pool.metrics() if isinstance(pool, MeteredQueuePool) else {"pool": type(pool).__name__}
+
+    if replica_engine is not None:
+        stats["routing"] = dict(routing_stats)
+    if config.db.url.startswith('sqlite') and config.db.sqlite_single_writer:
+        stats["writer"] = sqlite_writer.stats()
+    return stats
+
+
+# ===================== SQLITE =====================
+
+def sqlite_pragmas(
+    wal: bool = True,
+    synchronous: str = "NORMAL",
+    cache_mb: int = 64,
+    mmap_mb: int = 256,
+    busy_timeout: float = 5
+) -> Dict[str, Any]:
+    """PRAGMA для каждого нового соединения SQLite
+
+    WAL - читатели не блокируются писателем; synchronous=NORMAL в WAL
+    не теряет целостность, только последние транзакции при сбое питания.
+    """
+    pragmas: Dict[str, Any] = {
+        "busy_timeout": int(busy_timeout * 1000),
+        "synchronous": synchronous,
+        "cache_size": -cache_mb * 1024,  # отрицательное значение - в КиБ
+        "mmap_size": mmap_mb * 1024 * 1024,
+        "temp_store": "MEMORY",
+    }
+    if wal:
+        pragmas = {"journal_mode": "WAL", **pragmas}
+    return pragmas
+
+
+def sqlite_engine_kwargs(pool_size: int = 8) -> Dict[str, Any]:
+    """Пул соединений SQLite
+
+    По умолчанию aiosqlite работает без пула: каждая сессия открывает
+    файл, поток и заново выставляет PRAGMA. Пул держит соединения открытыми
+    (в WAL читатели на них работают параллельно).
+    """
+    return {
+        'poolclass': MeteredQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': pool_size,
+    }
+
+
+def setup_sqlite(async_engine: AsyncEngine, pragmas: Dict[str, Any]) -> None:
+    """Выставлять PRAGMA при открытии каждого соединения пула"""
+
+    @event.listens_for(async_engine.sync_engine, "connect")
+    def _set_pragmas(dbapi_connection, connection_record) -> None:
+        cursor = dbapi_connection.cursor()
+        for name, value in pragmas.items():
+            cursor.execute(f"PRAGMA {name}={value}")
+        cursor.close()
+
+
+class WriterLock:
+    """Очередь пишущих транзакций процесса
+
+    SQLite допускает одного писателя. Без очереди конкурирующие commit'ы
+    крутятся в busy_timeout внутри потоков aiosqlite и падают с
+    "database is locked"; здесь они ждут своей очереди в event loop
+    (FIFO), а чтения идут параллельно без блокировки.
+    """
+
+    def __init__(self, timeout: float):
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._acquired_at = 0.0
+
+        # Счетчики
+        self.acquisitions = 0
+        self.contended = 0
+        self.timeouts = 0
+        self.wait_total = 0.0
+        self.wait_max = 0.0
+        self.hold_max = 0.0
+
+    async def acquire(self) -> None:
+        started = time.monotonic()
+        if self._lock.locked():
+            self.contended += 1
+
+        try:
+            await asyncio.wait_for(self._lock.acquire(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            # Как и busy_timeout в SQLite: писатель держит транзакцию слишком долго
+            self.timeouts += 1
+            raise Exception(f"database is locked: очередь записи занята дольше {self.timeout:g} с")
+
+        self._acquired_at = time.monotonic()
+        wait = self._acquired_at - started
+        self.acquisitions += 1
+        self.wait_total += wait
+        self.wait_max = max(self.wait_max, wait)
+
+    def release(self) -> None:
+        self.hold_max = max(self.hold_max, time.monotonic() - self._acquired_at)
+        self._lock.release()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "acquisitions": self.acquisitions,
+            "contended": self.contended,
+            "timeouts": self.timeouts,
+            "waiting": len(self._lock._waiters or ()),
+            "wait_avg_ms": round(self.wait_total / (self.acquisitions or 1) * 1000, 2),
+            "wait_max_ms": round(self.wait_max * 1000, 2),
+            "hold_max_ms": round(self.hold_max * 1000, 2),
+        }
+
+
+class SQLiteSession(AsyncSession):
+    """Сессия, берущая очередь записи перед первой записью транзакции
+
+    sqlite3 открывает транзакцию только перед INSERT/UPDATE/DELETE, так
+    что до первой записи сессия лишь читает и очередь не занимает.
+    Очередь освобождается на commit/rollback/close.
+    """
+
+    def __init__(self, *args, writer: Optional[WriterLock] = None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.writer = writer
+        self._holds_writer = False
+
+    def _has_changes(self) -> bool:
+        return bool(self.sync_session.new or self.sync_session.dirty or self.sync_session.deleted)
+
+    async def _acquire_writer(self) -> None:
+        if self.writer is not None and not self._holds_writer:
+            # Соединение из пула берем заранее, чтобы не ждать его, занимая очередь
+            await super().connection()
+            await self.writer.acquire()
+            self._holds_writer = True
+
+    def _release_writer(self) -> None:
+        if self._holds_writer:
+            self._holds_writer = False
+            self.writer.release()
+
+    async def _before(self, statement=None) -> None:
+        # Запись: DML-запрос или autoflush накопленных изменений
+        if getattr(statement, "is_dml", False) or self._has_changes():
+            await self._acquire_writer()
+
+    async def execute(self, statement, *args, **kwargs):
+        await self._before(statement)
+        return await super().execute(statement, *args, **kwargs)
+
+    async def scalar(self, statement, *args, **kwargs):
+        await self._before(statement)
+        return await super().scalar(statement, *args, **kwargs)
+
+    async def scalars(self, statement, *args, **kwargs):
+        await self._before(statement)
+        return await super().scalars(statement, *args, **kwargs)
+
+    async def get(self, *args, **kwargs):
+        await self._before()
+        return await super().get(*args, **kwargs)
+
+    async def flush(self, *args, **kwargs):
+        await self._before()
+        return await super().flush(*args, **kwargs)
+
+    async def commit(self):
+        await self._before()
+        try:
+            return await super().commit()
+        finally:
+            self._release_writer()
+
+    async def rollback(self):
+        try:
+            return await super().rollback()
+        finally:
+            self._release_writer()
+
+    async def close(self):
+        try:
+            return await super().close()
+        finally:
+            self._release_writer()
+
+
+# Очередь записи процесса (для SQLITE_SINGLE_WRITER=1)
+sqlite_writer = WriterLock(timeout=config.db.sqlite_busy_timeout)
+
+
 async def create_db_pool() -> None:
     """Создание пула соединений с базой данных"""
-    global engine, async_session_maker
-
+    global engine, replica_engine, async_session_maker
 
     # Создаем асинхронный движок
     engine_kwargs = {
@@ -19,19 +356,40 @@ async def create_db_pool() -> None:
         'pool_pre_ping': True
     }
     if config.db.url.startswith('postgresql'):
-        engine_kwargs['pool_size'] = 20
-        engine_kwargs['max_overflow'] = 10
+        engine_kwargs.update(postgres_engine_kwargs())
+    elif config.db.sqlite_pool_size:
+        engine_kwargs.update(sqlite_engine_kwargs(config.db.sqlite_pool_size))
 
     engine = create_async_engine(
         config.db.url,
         **engine_kwargs
     )
 
+    session_kwargs = {'class_': AsyncSession}
+    if config.db.url.startswith('sqlite'):
+        setup_sqlite(engine, sqlite_pragmas(
+            wal=config.db.sqlite_wal,
+            synchronous=config.db.sqlite_synchronous,
+            cache_mb=config.db.sqlite_cache_mb,
+            mmap_mb=config.db.sqlite_mmap_mb,
+            busy_timeout=config.db.sqlite_busy_timeout
+        ))
+        if config.db.sqlite_single_writer:
+            session_kwargs = {'class_': SQLiteSession, 'writer': sqlite_writer}
+
+    # Реплика: те же настройки пула, только чтения, помеченные в DAO
+    if config.db.replica_url:
+        replica_kwargs = {'echo': False, 'pool_pre_ping': True}
+        if config.db.replica_url.startswith('postgresql'):
+            replica_kwargs.update(postgres_engine_kwargs())
+        replica_engine = create_async_engine(config.db.replica_url, **replica_kwargs)
+        session_kwargs['sync_session_class'] = RoutingSession
+
     # Создаем фабрику сессий
     async_session_maker = async_sessionmaker(
         engine,
-        class_=AsyncSession,
-        expire_on_commit=False
+        expire_on_commit=False,
+        **session_kwargs
     )
 
     # Импортируем Base ПОСЛЕ создания движка
@@ -46,13 +404,25 @@ async def close_db_pool() -> None:
     """Закрытие пула соединений"""
     if engine:
         await engine.dispose()
+    if replica_engine:
+        await replica_engine.dispose()
 
 
 async def get_session() -> AsyncGenerator[AsyncSession, None]:
-    """Генератор сессий"""
+    """Генератор сессий
+
+    Внутри обработки апдейта отдает общую ленивую сессию апдейта (ее
+    закрывает DatabaseMiddleware), вне апдейта и в порожденных хендлером
+    задачах - новую сессию.
+    """
     if not async_session_maker:
         raise RuntimeError("База данных не инициализирована")
 
+    shared = current_session.get()
+    if shared is not None and shared.owned():
+        yield shared
+        return
+
     async with async_session_maker() as session:
         try:
             yield session
@@ -0,0 +1,86 @@
+"""
+EXPIRY.PY - Очередь сроков действия ключей
+
+Мин-куча (expires_at, key_id) в памяти. Заполняется из БД при запуске
+и обновляется при создании, продлении и отзыве ключей; планировщик
+спит ровно до ближайшего срока.
+"""
+
+import asyncio
+import heapq
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+
+
+class ExpiryQueue:
+    """Ключи, упорядоченные по сроку истечения"""
+
+    def __init__(self):
+        self._heap: List[Tuple[datetime, int]] = []
+        # Актуальный срок ключа; записи кучи с другим сроком - устаревшие
+        self._deadlines: Dict[int, datetime] = {}
+        self._changed: Optional[asyncio.Event] = None
+
+    def __len__(self) -> int:
+        return len(self._deadlines)
+
+    def _notify(self) -> None:
+        if self._changed is not None:
+            self._changed.set()
+
+    def load(self, items: Iterable[Tuple[int, datetime]]) -> None:
+        """Полностью пересобрать очередь (при запуске и сверке с БД)"""
+        self._deadlines = {key_id: expires_at for key_id, expires_at in items if expires_at}
+        self._heap = [(expires_at, key_id) for key_id, expires_at in self._deadlines.items()]
+        heapq.heapify(self._heap)
+        self._notify()
+
+    def schedule(self, key_id: int, expires_at: datetime) -> None:
+        """Добавить ключ или изменить его срок (продление)"""
+        earliest = self.next_deadline()
+        self._deadlines[key_id] = expires_at
+        heapq.heappush(self._heap, (expires_at, key_id))
+
+        # Будим планировщик, только если срок стал ближайшим
+        if earliest is None or expires_at < earliest:
+            self._notify()
+
+    def cancel(self, key_id: int) -> None:
+        """Убрать ключ из очереди (отзыв)"""
+        self._deadlines.pop(key_id, None)
+
+    def next_deadline(self) -> Optional[datetime]:
+        """Ближайший срок (устаревшие записи отбрасываются)"""
+        while self._heap:
+            expires_at, key_id = self._heap[0]
+            if self._deadlines.get(key_id) == expires_at:
+                return expires_at
+            heapq.heappop(self._heap)
+        return None
+
+    def pop_due(self, now: datetime, limit: int) -> List[int]:
+        """Извлечь до limit ключей, срок которых наступил"""
+        due: List[int] = []
+        while len(due) < limit:
+            deadline = self.next_deadline()
+            if deadline is None or deadline > now:
+                break
+            _, key_id = heapq.heappop(self._heap)
+            self._deadlines.pop(key_id, None)
+            due.append(key_id)
+        return due
+
+    async def wait(self, timeout: Optional[float]) -> None:
+        """Ждать изменения очереди не дольше timeout секунд"""
+        if self._changed is None:
+            self._changed = asyncio.Event()
+        try:
+            await asyncio.wait_for(self._changed.wait(), timeout=timeout)
+        except asyncio.TimeoutError:
+            pass
+        finally:
+            self._changed.clear()
+
+
+# Создаем глобальный экземпляр
+expiry_queue = ExpiryQueue()
@@ -0,0 +1,135 @@
+"""
+IP_ALLOCATOR.PY - Выдача IP адресов клиентам WireGuard
+
+Занятость хранится в битовой карте диапазона WG_CLIENT_IP_START..END,
+свободные адреса выдаются курсором и списком освобожденных: O(1).
+"""
+
+import asyncio
+import ipaddress
+import logging
+from collections import deque
+from typing import Deque, Iterable, Optional
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class IPAllocator:
+    """Пул клиентских адресов одной подсети"""
+
+    def __init__(self, network: str, start: str, end: str, reserved: Iterable[str] = ()):
+        self.network = ipaddress.ip_network(network, strict=False)
+        self._first = int(ipaddress.ip_address(start))
+        self._last = int(ipaddress.ip_address(end))
+
+        if ipaddress.ip_address(start) not in self.network or ipaddress.ip_address(end) not in self.network:
+            raise ValueError(f"Диапазон {start}-{end} не входит в сеть {self.network}")
+        if self._last < self._first:
+            raise ValueError(f"Некорректный диапазон адресов {start}-{end}")
+
+        self.size = self._last - self._first + 1
+        self._bitmap = bytearray()
+        self._used = 0
+        # Все свободные смещения либо >= курсора, либо лежат в _released
+        self._cursor = 0
+        self._released: Deque[int] = deque()
+
+        self._reserved = list(reserved)
+        self.loaded = False
+        self.load_lock = asyncio.Lock()
+        self.reset()
+
+    # ---------- битовая карта ----------
+
+    def _is_set(self, offset: int) -> bool:
+        return bool(self._bitmap[offset >> 3] & (1 << (offset & 7)))
+
+    def _set(self, offset: int) -> None:
+        self._bitmap[offset >> 3] |= 1 << (offset & 7)
+        self._used += 1
+
+    def _clear(self, offset: int) -> None:
+        self._bitmap[offset >> 3] &= ~(1 << (offset & 7))
+        self._used -= 1
+
+    def _offset(self, ip: str) -> Optional[int]:
+        try:
+            value = int(ipaddress.ip_address(ip.split('/')[0].strip()))
+        except ValueError:
+            return None
+        if self._first <= value <= self._last:
+            return value - self._first
+        return None
+
+    # ---------- публичный API ----------
+
+    @property
+    def free(self) -> int:
+        return self.size - self._used
+
+    def reset(self) -> None:
+        """Очистить пул (перед повторной загрузкой)"""
+        self._bitmap = bytearray((self.size + 7) // 8)
+        self._used = 0
+        self._cursor = 0
+        self._released.clear()
+        for ip in self._reserved:
+            self.mark_used(ip)
+
+    def load(self, used_ips: Iterable[str]) -> None:
+        """Заполнить пул занятыми адресами (из БД и wg show)"""
+        self.reset()
+        for ip in used_ips:
+            self.mark_used(ip)
+        self.loaded = True
+        logger.info(f"Пул IP адресов загружен: занято {self._used}, свободно {self.free}")
+
+    def mark_used(self, ip: str) -> bool:
+        """Пометить адрес занятым (без выдачи)"""
+        offset = self._offset(ip)
+        if offset is None or self._is_set(offset):
+            return False
+        self._set(offset)
+        return True
+
+    def allocate(self) -> str:
+        """Выдать свободный адрес
+
+        Метод синхронный, поэтому выдача атомарна в рамках event loop:
+        два параллельных подтверждения не получат один и тот же адрес.
+        """
+        while self._released:
+            offset = self._released.popleft()
+            if not self._is_set(offset):
+                self._set(offset)
+                return str(ipaddress.ip_address(self._first + offset))
+
+        while self._cursor < self.size:
+            offset = self._cursor
+            self._cursor += 1
+            if not self._is_set(offset):
+                self._set(offset)
+                return str(ipaddress.ip_address(self._first + offset))
+
+        raise Exception("Нет свободных IP адресов в пуле")
+
+    def release(self, ip: str) -> bool:
+        """Вернуть адрес в пул (отзыв, истечение, ошибка создания)"""
+        offset = self._offset(ip)
+        if offset is None or not self._is_set(offset):
+            return False
+        self._clear(offset)
+        if offset < self._cursor:
+            self._released.append(offset)
+        return True
+
+
+# Создаем глобальный экземпляр
+ip_allocator = IPAllocator(
+    network=config.wireguard.network,
+    start=config.wireguard.client_ip_start,
+    end=config.wireguard.client_ip_end,
+    reserved=[config.wireguard.server_ip]
+)
@@ -0,0 +1,238 @@
+"""
+JOBS.PY - Очередь фоновых задач в БД (выдача и отзыв ключей)
+
+Хендлеры только ставят задачу (строка в jobs) и сразу отвечают;
+выполняют ее обработчики в основном процессе. Задача хранится в БД,
+поэтому переживает перезапуск, а ключ идемпотентности (например
+provision:payment:<id>) не дает поставить одно действие дважды.
+
+Обработчик берет готовые задачи пачкой (до PROVISION_BATCH) и вызывает
+для каждого вида свою функцию, ограниченную JOBS_TIMEOUT. Ошибка -
+повтор с экспоненциальной паузой; после JOBS_MAX_ATTEMPTS задача
+переходит в dead, а поставивший ее админ получает уведомление.
+Задача, взятая в работу перед падением бота, вернется в очередь
+по истечении аренды (locked_until).
+"""
+
+import asyncio
+import json
+import logging
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from src.config import config
+from src.models.job import Job
+from src.services.dao import JobDAO
+from src.services.database import get_session
+from src.services.notifications import admin_notifier
+
+logger = logging.getLogger(__name__)
+
+# Обработчик вида задач: {job.id: текст ошибки или None при успехе}
+JobHandler = Callable[[List[Job]], Awaitable[Dict[int, Optional[str]]]]
+ProgressCallback = Callable[[Dict[str, int], bool], Awaitable[None]]
+
+
+class JobQueue:
+    """Обработчики задач из таблицы jobs"""
+
+    def __init__(
+        self,
+        workers: int,
+        batch_size: int,
+        poll_interval: float,
+        timeout: float,
+        max_attempts: int,
+        retry_base: float,
+        retry_max: float
+    ):
+        self.workers = max(workers, 1)
+        self.batch_size = max(batch_size, 1)
+        self.poll_interval = poll_interval
+        self.timeout = timeout
+        self.max_attempts = max_attempts
+        self.retry_base = retry_base
+        self.retry_max = retry_max
+
+        self._handlers: Dict[str, JobHandler] = {}
+        self._tasks: List[asyncio.Task] = []
+        self._watchers: Set[asyncio.Task] = set()
+        self._wakeup: Optional[asyncio.Event] = None
+
+        self.done = 0
+        self.retried = 0
+        self.dead = 0
+        self.timeouts = 0
+
+    def register(self, kind: str, handler: JobHandler) -> None:
+        self._handlers[kind] = handler
+
+    async def enqueue(
+        self,
+        kind: str,
+        items: List[Tuple[str, Dict[str, Any]]],
+        created_by: Optional[int] = None,
+        batch_id: Optional[str] = None,
+        revive: bool = False
+    ) -> int:
+        """Поставить задачи [(ключ идемпотентности, данные)]; число поставленных
+
+        revive=True - вернуть в очередь одноименные dead задачи (только по
+        явному действию админа).
+        """
+        if not items:
+            return 0
+
+        async for session in get_session():
+            queued = await JobDAO.enqueue(
+                session, kind,
+                [(key, json.dumps(payload)) for key, payload in items],
+                max_attempts=self.max_attempts,
+                created_by=created_by,
+                batch_id=batch_id,
+                revive=revive
+            )
+
+        if self._wakeup:
+            self._wakeup.set()
+        return queued
+
+    def start(self) -> None:
+        if self._tasks:
+            return
+        self._wakeup = asyncio.Event()
+        self._tasks = [asyncio.create_task(self._worker(n)) for n in range(self.workers)]
+        logger.info(f"Очередь задач запущена (обработчиков {self.workers})")
+
+    async def _worker(self, n: int) -> None:
+        while True:
+            try:
+                async for session in get_session():
+                    # Аренда с запасом: задачу не возьмут повторно, пока идет попытка
+                    jobs = await JobDAO.claim(session, self.batch_size, lease=self.timeout * 2)
+
+                if not jobs:
+                    self._wakeup.clear()
+                    try:
+                        await asyncio.wait_for(self._wakeup.wait(), self.poll_interval)
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                by_kind: Dict[str, List[Job]] = defaultdict(list)
+                for job in jobs:
+                    by_kind[job.kind].append(job)
+
+                for kind, group in by_kind.items():
+                    await self._run(kind, group)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка обработчика задач #{n}: {e}")
+                await asyncio.sleep(self.poll_interval)
+
+    async def _run(self, kind: str, jobs: List[Job]) -> None:
+        handler = self._handlers.get(kind)
+        if handler is None:
+            outcomes = {job.id: f"Нет обработчика для задач {kind}" for job in jobs}
+        else:
+            try:
+                outcomes = await asyncio.wait_for(handler(jobs), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                outcomes = {job.id: f"Таймаут {self.timeout:g} с" for job in jobs}
+            except Exception as e:
+                logger.error(f"❌ Ошибка задач {kind}: {e}")
+                outcomes = {job.id: str(e) or type(e).__name__ for job in jobs}
+
+        done = [job.id for job in jobs if outcomes.get(job.id) is None]
+        async for session in get_session():
+            await JobDAO.finish(session, done)
+            for job in jobs:
+                error = outcomes.get(job.id)
+                if error is None:
+                    continue
+                if job.attempts >= job.max_attempts:
+                    await JobDAO.bury(session, job.id, error)
+                    self._notify_dead(job, error)
+                else:
+                    await JobDAO.retry(session, job.id, error, datetime.now() + self._backoff(job.attempts))
+                    logger.warning(f"Задача {job.idempotency_key}: попытка {job.attempts} не удалась ({error})")
+
+        self.done += len(done)
+        self.retried += sum(1 for job in jobs if outcomes.get(job.id) and job.attempts < job.max_attempts)
+
+    def _backoff(self, attempts: int) -> timedelta:
+        delay = min(self.retry_base * 2 ** (attempts - 1), self.retry_max)
+        return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+    def _notify_dead(self, job: Job, error: str) -> None:
+        self.dead += 1
+        logger.error(f"☠️ Задача {job.idempotency_key} не выполнена за {job.attempts} попыток: {error}")
+
+        admin_ids = [job.created_by] if job.created_by else admin_notifier.resolve_admins()
+        admin_notifier.notify(
+            f"job-{job.id}",
+            admin_ids,
+            f"☠️ <b>Задача не выполнена</b>\n\n"
+            f"<code>{job.idempotency_key}</code>\n"
+            f"Попыток: {job.attempts}\n"
+            f"Ошибка: {error[:300]}\n\n"
+            f"Повторить: <code>/job_retry {job.id}</code>"
+        )
+
+    def watch(self, batch_id: str, progress: ProgressCallback, interval: float = 2) -> None:
+        """Сообщать прогресс пачки задач, пока в ней есть невыполненные"""
+        task = asyncio.create_task(self._watch(batch_id, progress, interval))
+        self._watchers.add(task)
+        task.add_done_callback(self._watchers.discard)
+
+    async def _watch(self, batch_id: str, progress: ProgressCallback, interval: float) -> None:
+        last = None
+        while True:
+            async for session in get_session():
+                counts = await JobDAO.count_by_status(session, batch_id)
+
+            finished = not counts.get("pending") and not counts.get("running")
+            if counts != last or finished:
+                try:
+                    await progress(counts, finished)
+                except Exception as e:
+                    logger.debug(f"Не удалось обновить прогресс: {e}")
+                last = counts
+
+            if finished:
+                return
+            await asyncio.sleep(interval)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "workers": len(self._tasks),
+            "done": self.done,
+            "retried": self.retried,
+            "dead": self.dead,
+            "timeouts": self.timeouts,
+        }
+
+    async def shutdown(self) -> None:
+        """Остановка: прерванные задачи вернутся в очередь по аренде"""
+        tasks = self._tasks + list(self._watchers)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._tasks = []
+
+
+# Создаем глобальный экземпляр
+job_queue = JobQueue(
+    workers=config.jobs.workers,
+    batch_size=config.provisioning.batch_size,
+    poll_interval=config.jobs.poll_interval,
+    timeout=config.jobs.timeout,
+    max_attempts=config.jobs.max_attempts,
+    retry_base=config.jobs.retry_base,
+    retry_max=config.jobs.retry_max
+)
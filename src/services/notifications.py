@@ -0,0 +1,113 @@
+"""
+NOTIFICATIONS.PY - Рассылка уведомлений админам
+
+Сообщение собирается один раз и ставится в очередь отправки сразу для
+всех админов - они получают его параллельно, а хендлер не ждет доставки.
+Итог по каждому админу (доставлено / ошибка) сохраняется в истории и
+пишется в лог.
+"""
+
+import asyncio
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from src.config import config
+from src.services.sender import message_sender, PRIORITY_NORMAL
+
+logger = logging.getLogger(__name__)
+
+DELIVERED = "delivered"
+
+
+class AdminNotifier:
+    """Параллельная доставка одного уведомления всем админам"""
+
+    def __init__(self, history_size: int = 1000):
+        self.history_size = history_size
+        # ключ уведомления -> {admin_id: DELIVERED или текст ошибки}
+        self.history: "OrderedDict[str, Dict[int, str]]" = OrderedDict()
+        self._tasks: Set[asyncio.Task] = set()
+
+        # Счетчики
+        self.notifications = 0
+        self.delivered = 0
+        self.failed = 0
+
+    @staticmethod
+    def resolve_admins(admins: Iterable[Any] = ()) -> List[int]:
+        """telegram_id админов из БД, а если их нет - ADMIN_IDS из конфига"""
+        admin_ids = [admin.telegram_id for admin in admins]
+        return admin_ids or list(config.bot.admin_ids)
+
+    def notify(
+            self,
+            key: str,
+            admin_ids: Iterable[int],
+            text: str,
+            photo: Optional[str] = None,
+            document: Optional[str] = None,
+            priority: int = PRIORITY_NORMAL
+    ) -> int:
+        """Поставить уведомление в очередь для всех админов
+
+        С photo/document текст уходит подписью. Возвращает число адресатов,
+        итог доставки собирается в фоне.
+        """
+        futures: Dict[int, asyncio.Future] = {}
+        for admin_id in dict.fromkeys(admin_ids):
+            if photo:
+                futures[admin_id] = message_sender.send_photo(admin_id, photo, priority, caption=text)
+            elif document:
+                futures[admin_id] = message_sender.send_document(admin_id, document, priority, caption=text)
+            else:
+                futures[admin_id] = message_sender.send_message(admin_id, text, priority)
+
+        if not futures:
+            return 0
+
+        self.notifications += 1
+        task = asyncio.create_task(self._collect(key, futures))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return len(futures)
+
+    async def _collect(self, key: str, futures: Dict[int, asyncio.Future]) -> None:
+        results = await asyncio.gather(*futures.values(), return_exceptions=True)
+
+        outcomes: Dict[int, str] = {}
+        for admin_id, result in zip(futures, results):
+            if isinstance(result, BaseException):
+                outcomes[admin_id] = str(result) or type(result).__name__
+                self.failed += 1
+            else:
+                outcomes[admin_id] = DELIVERED
+                self.delivered += 1
+
+        self.history[key] = outcomes
+        self.history.move_to_end(key)
+        while len(self.history) > self.history_size:
+            self.history.popitem(last=False)
+
+        delivered = sum(1 for outcome in outcomes.values() if outcome == DELIVERED)
+        if delivered == len(outcomes):
+            logger.info(f"✅ Уведомление {key} доставлено всем админам ({delivered})")
+        else:
+            failed = {admin_id: outcome for admin_id, outcome in outcomes.items() if outcome != DELIVERED}
+            logger.warning(f"⚠️ Уведомление {key} доставлено {delivered}/{len(outcomes)}, ошибки: {failed}")
+
+    def outcome(self, key: str) -> Optional[Dict[int, str]]:
+        """Итог доставки уведомления (None - еще доставляется или забыт)"""
+        return self.history.get(key)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "notifications": self.notifications,
+            "in_progress": len(self._tasks),
+            "delivered": self.delivered,
+            "failed": self.failed,
+        }
+
+
+# Создаем глобальный экземпляр
+admin_notifier = AdminNotifier()
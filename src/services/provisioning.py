@@ -0,0 +1,296 @@
+"""
+PROVISIONING.PY - Выдача и отзыв ключей через очередь задач
+
+Хендлеры и планировщик только ставят задачи (provision по платежу,
+revoke по ключу); выполняются они обработчиками job_queue пачками.
+
+Выдача пачки оплаченных платежей:
+    1. пары ключей - из пула, недостающие генерируются в отдельном потоке;
+    2. IP адреса - из локального пула (ip_allocator);
+    3. все пиры пачки добавляются на сервер одной командой (атомарно:
+       при сбое скрипт сам откатывает добавленных на сервере);
+    4. подтверждение платежей и все записи VPNKey - одна транзакция;
+    5. конфиги уходят пользователям через очередь отправки.
+
+Если транзакция не прошла, добавленные пиры удаляются и адреса
+возвращаются в пул. Платеж до этой транзакции остается paid, поэтому
+повтор задачи безопасен, а уже обработанный платеж просто пропускается.
+Шаги 3-5 таймаут задачи не прерывает: они доводятся до конца в фоне.
+"""
+
+import asyncio
+import json
+import logging
+from collections import defaultdict
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Set, Tuple
+
+from src.models.job import Job
+from src.models.payment import Payment
+from src.models.vpn_key import VPNKey
+from src.services.dao import PaymentDAO, UserDAO
+from src.services.database import get_session
+from src.services.expiry import expiry_queue
+from src.services.ip_allocator import ip_allocator
+from src.services.jobs import job_queue
+from src.services.sender import message_sender, PRIORITY_HIGH
+from src.services.vpn_service import VPNService, KEY_NOT_FOUND, generate_key_name
+from src.services.wg_keys import key_pool
+from src.services.wireguard import wireguard_service, BATCH_ROLLED_BACK
+from src.utils.constants import PRICE_PER_DAY, VPNKeyStatus
+
+logger = logging.getLogger(__name__)
+
+
+def render_key_message(vpn_key: VPNKey) -> str:
+    """Сообщение пользователю с конфигом выданного ключа"""
+    return (
+        "🎉 <b>Платёж подтверждён!</b>\n\n"
+        f"🔑 <code>{vpn_key.key_name}</code>\n\n"
+        f"<pre>{vpn_key.config_data}</pre>\n\n"
+        "🔗 https://www.wireguard.com/install/"
+    )
+
+
+class ProvisioningPipeline:
+    """Выдача и отзыв ключей пачками через очередь задач"""
+
+    def __init__(self):
+        # Выдача, продолжающаяся в фоне после таймаута задачи
+        self._background: Set[asyncio.Task] = set()
+
+    # ---------- постановка задач (из хендлеров) ----------
+
+    async def confirm(
+        self,
+        payment_ids: List[int],
+        admin_id: int,
+        batch_id: Optional[str] = None
+    ) -> int:
+        """Поставить выдачу ключей по платежам; число новых задач
+
+        Подтверждение - явное действие админа, поэтому невыполненная
+        ранее задача по тому же платежу возвращается в очередь.
+        """
+        return await job_queue.enqueue(
+            "provision",
+            [(f"provision:payment:{payment_id}", {"payment_id": payment_id}) for payment_id in payment_ids],
+            created_by=admin_id,
+            batch_id=batch_id,
+            revive=True
+        )
+
+    async def confirm_all(self, admin_id: int, batch_id: str) -> int:
+        """Поставить выдачу по всей очереди оплаченных (keyset, без загрузки строк)"""
+        queued, cursor = 0, None
+        while True:
+            async for session in get_session():
+                keys = await PaymentDAO.get_queue_keys(session, "paid", 500, after=cursor)
+            if not keys:
+                return queued
+            queued += await self.confirm([payment_id for payment_id, _ in keys], admin_id, batch_id)
+            cursor = keys[-1][1], keys[-1][0]
+
+    async def revoke(self, key_ids: List[int]) -> int:
+        """Поставить отзыв ключей (истечение срока)
+
+        Вызывается планировщиком каждый проход: dead задачи не
+        воскрешаются, вернуть их может только /job_retry.
+        """
+        return await job_queue.enqueue(
+            "revoke",
+            [(f"revoke:key:{key_id}", {"key_id": key_id}) for key_id in key_ids]
+        )
+
+    # ---------- обработчики задач ----------
+
+    async def provision_jobs(self, jobs: List[Job]) -> Dict[int, Optional[str]]:
+        """Задачи provision: платеж уже не paid (отклонен, выдан ранее) - задача выполнена"""
+        outcomes: Dict[int, Optional[str]] = {}
+
+        by_admin: Dict[int, Dict[int, Job]] = defaultdict(dict)
+        for job in jobs:
+            by_admin[job.created_by or 0][json.loads(job.payload)["payment_id"]] = job
+
+        for admin_id, by_payment in by_admin.items():
+            async for session in get_session():
+                payments = await PaymentDAO.get_many(session, list(by_payment), "paid")
+
+            confirmed, failed = await self.provision(payments, admin_id)
+
+            for payment_id, job in by_payment.items():
+                outcomes[job.id] = failed.get(payment_id)
+
+        return outcomes
+
+    async def revoke_jobs(self, jobs: List[Job]) -> Dict[int, Optional[str]]:
+        """Задачи revoke: одна команда на сервере и один UPDATE на пачку"""
+        by_key = {json.loads(job.payload)["key_id"]: job for job in jobs}
+
+        async for session in get_session():
+            result = await VPNService(session).revoke_vpn_keys(list(by_key))
+
+        failed = result["failed"]
+        return {
+            job.id: None if failed.get(key_id) in (None, KEY_NOT_FOUND) else failed[key_id]
+            for key_id, job in by_key.items()
+        }
+
+    # ---------- выдача пачки ----------
+
+    async def provision(self, payments: List[Payment], admin_id: int) -> Tuple[List[int], Dict[int, str]]:
+        """Выдать ключи пачке оплаченных платежей; (подтвержденные id, {id: ошибка})"""
+        failed: Dict[int, str] = {}
+        if not payments:
+            return [], failed
+
+        async for session in get_session():
+            await VPNService(session).load_ip_pool()
+
+        keys = await key_pool.get_many(len(payments))
+
+        # Адреса выдаются синхронно - пересечений с одиночными подтверждениями нет
+        peers = []
+        for payment, pair in zip(payments, keys):
+            try:
+                peers.append((payment, pair, ip_allocator.allocate()))
+            except Exception as e:
+                failed[payment.id] = str(e)
+
+        # Добавление на сервер и запись в БД не прерываются таймаутом задачи:
+        # отмена посреди SSH команды или commit оставила бы пиры без записи
+        # (или запись без уведомления). Прерванная выдача доводится в фоне,
+        # а повтор задачи увидит уже обработанный платеж.
+        task = asyncio.ensure_future(self._issue(payments, peers, admin_id, failed))
+        try:
+            return await asyncio.shield(task)
+        except asyncio.CancelledError:
+            self._background.add(task)
+            task.add_done_callback(self._finished_in_background)
+            raise
+
+    async def _issue(
+        self,
+        payments: List[Payment],
+        peers: list,
+        admin_id: int,
+        failed: Dict[int, str]
+    ) -> Tuple[List[int], Dict[int, str]]:
+        """Добавить пиры, записать ключи и отправить конфиги"""
+        failures = await wireguard_service.add_clients_to_server(
+            [(pair["public_key"], ip) for _, pair, ip in peers]
+        )
+
+        added = []
+        for payment, pair, ip in peers:
+            if pair["public_key"] in failures:
+                error = failures[pair["public_key"]]
+                failed[payment.id] = error or "Ошибка добавления пира"
+                # Адрес, на котором добавление не прошло (занят или ошибка
+                # wg set), остается помеченным: повтор получит другой.
+                # Адреса пиров, откаченных вместе с пачкой, возвращаются.
+                if error.startswith(BATCH_ROLLED_BACK):
+                    ip_allocator.release(ip)
+            else:
+                added.append((payment, pair, ip))
+
+        try:
+            # После добавления: отпечаток из ответа уже проверил кэш сервера
+            server_info = await wireguard_service.get_server_info()
+        except Exception:
+            # Без данных сервера конфиги не собрать - пиры снимаем
+            await self._remove_peers([(pair["public_key"], ip) for _, pair, ip in added])
+            raise
+
+        vpn_keys: Dict[int, VPNKey] = {}
+        for payment, pair, ip in added:
+            days = int(payment.amount / PRICE_PER_DAY)
+            vpn_keys[payment.id] = VPNKey(
+                key_name=generate_key_name(payment.user.telegram_id),
+                user_id=payment.user_id,
+                private_key=pair["private_key"],
+                public_key=pair["public_key"],
+                server_public_key=server_info["public_key"],
+                ip_address=ip,
+                server_ip=server_info["endpoint"],
+                server_port=server_info["port"],
+                server_endpoint=server_info["endpoint"],
+                days=days,
+                expires_at=datetime.now() + timedelta(days=days),
+                status=VPNKeyStatus.ACTIVE.value,
+                config_data=await wireguard_service.generate_client_config(
+                    client_private_key=pair["private_key"],
+                    client_ip=ip,
+                    server_public_key=server_info["public_key"],
+                    server_endpoint=server_info["endpoint"],
+                    server_port=server_info["port"]
+                ),
+                payment_id=payment.id
+            )
+
+        confirmed: List[int] = []
+        error: Optional[Exception] = None
+        try:
+            async for session in get_session():
+                if vpn_keys:
+                    confirmed = await PaymentDAO.confirm_many(session, list(vpn_keys), admin_id)
+                    session.add_all(vpn_keys[payment_id] for payment_id in confirmed)
+                    await UserDAO.add_spent(session, [p for p in payments if p.id in confirmed])
+                await session.commit()
+        except Exception as e:
+            error, confirmed = e, []
+            for payment_id in vpn_keys:
+                failed[payment_id] = str(e)
+
+        # Пиры без записи в БД (ошибка или платеж уже обработан) удаляем
+        orphans = [
+            (vpn_key.public_key, vpn_key.ip_address)
+            for payment_id, vpn_key in vpn_keys.items() if payment_id not in confirmed
+        ]
+        if orphans:
+            await self._remove_peers(orphans)
+
+        if error is not None:
+            logger.error(f"❌ Ошибка сохранения пачки ключей: {error}")
+            return [], failed
+
+        users = {payment.id: payment.user for payment in payments}
+        for payment_id in confirmed:
+            vpn_key = vpn_keys[payment_id]
+            expiry_queue.schedule(vpn_key.id, vpn_key.expires_at)
+            message_sender.send_message(
+                users[payment_id].telegram_id,
+                render_key_message(vpn_key),
+                priority=PRIORITY_HIGH
+            )
+
+        return confirmed, failed
+
+    async def _remove_peers(self, peers: List[Tuple[str, str]]) -> None:
+        """Удалить пиры (public_key, ip) без записи в БД и вернуть адреса в пул"""
+        try:
+            await wireguard_service.remove_clients_from_server([public_key for public_key, _ in peers])
+        finally:
+            for _, ip in peers:
+                ip_allocator.release(ip)
+
+    def _finished_in_background(self, task: asyncio.Task) -> None:
+        self._background.discard(task)
+        if task.cancelled():
+            return
+        if task.exception() is not None:
+            logger.error(f"❌ Ошибка выдачи ключей после таймаута задачи: {task.exception()}")
+        else:
+            confirmed, _ = task.result()
+            logger.info(f"Выдача после таймаута задачи завершена: подтверждено {len(confirmed)}")
+
+    async def shutdown(self) -> None:
+        """Дождаться выдачи, продолжающейся после таймаута задач"""
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+
+
+# Создаем глобальный экземпляр
+provisioning_pipeline = ProvisioningPipeline()
+job_queue.register("provision", provisioning_pipeline.provision_jobs)
+job_queue.register("revoke", provisioning_pipeline.revoke_jobs)
@@ -0,0 +1,206 @@
+"""
+RATE_LIMIT.PY - Ограничение частоты запросов (token bucket)
+
+У каждого пользователя своя корзина: токены пополняются со скоростью
+THROTTLE_RATE до THROTTLE_BURST, апдейт списывает стоимость своего
+маршрута (дешевые callback-кнопки, дорогие /vpnkey и загрузка чека).
+Нет токенов - апдейт отбрасывается.
+
+Общего лимита на входящие апдейты нет: он отбрасывал бы апдейты честных
+пользователей при всплеске. Лимиты Telegram на отправку соблюдает
+очередь исходящих сообщений (services/sender.py).
+
+THROTTLE_BACKEND=memory - корзины в процессе (LRU на THROTTLE_MAX_USERS),
+THROTTLE_BACKEND=redis  - общие для всех процессов (нужен пакет redis).
+"""
+
+import logging
+import time
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Tuple
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryBuckets:
+    """Корзины в памяти процесса
+
+    OrderedDict работает как LRU: обновление и вытеснение за O(1), память
+    ограничена maxsize. Вытесняется давно не писавший пользователь - его
+    корзина к этому времени, как правило, уже полная.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._buckets: "OrderedDict[Any, List[float]]" = OrderedDict()
+        self.evicted = 0
+
+    async def acquire(
+            self, key: Any, cost: float, rate: float, burst: float, max_wait: float = 0
+    ) -> Tuple[bool, float]:
+        """Списать cost токенов
+
+        Возвращает (разрешено, сколько ждать). Если токенов не хватает, но
+        ожидание не больше max_wait, токены занимаются наперед (баланс
+        уходит в минус) и вызывающий должен подождать.
+        """
+        now = time.monotonic()
+        bucket = self._buckets.get(key)
+
+        if bucket is None:
+            bucket = [burst, now]
+            self._buckets[key] = bucket
+            if len(self._buckets) > self.maxsize:
+                self._buckets.popitem(last=False)
+                self.evicted += 1
+        else:
+            self._buckets.move_to_end(key)
+            bucket[0] = min(burst, bucket[0] + (now - bucket[1]) * rate)
+            bucket[1] = now
+
+        wait = max(0.0, (cost - bucket[0]) / rate)
+        if wait > max_wait:
+            return False, wait
+
+        bucket[0] -= cost
+        return True, wait
+
+    def size(self) -> int:
+        return len(self._buckets)
+
+    async def close(self) -> None:
+        self._buckets.clear()
+
+
+# Та же логика, что в MemoryBuckets.acquire, но атомарно на стороне Redis
+_ACQUIRE_SCRIPT = """
+local rate = tonumber(ARGV[1])
+local burst = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+local now = tonumber(ARGV[4])
+local max_wait = tonumber(ARGV[5])
+
+local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(bucket[1]) or burst
+local ts = tonumber(bucket[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+
+local wait = math.max(0, (cost - tokens) / rate)
+local allowed = 0
+if wait <= max_wait then
+    tokens = tokens - cost
+    allowed = 1
+end
+
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', tostring(now))
+redis.call('EXPIRE', KEYS[1], math.ceil((burst - tokens) / rate) + 60)
+return {allowed, tostring(wait)}
+"""
+
+
+class RedisBuckets:
+    """Корзины в Redis, общие для всех процессов бота
+
+    Проверка и списание - один Lua-скрипт (атомарно, один запрос). Ключ
+    живет, пока корзина не наполнится, так что память не растет.
+    """
+
+    def __init__(self, url: str, prefix: str = "throttle"):
+        try:
+            from redis.asyncio import Redis
+        except ImportError:
+            raise Exception("Для THROTTLE_BACKEND=redis установите пакет redis (pip install redis)")
+
+        self.prefix = prefix
+        self.redis = Redis.from_url(url)
+        self._script = self.redis.register_script(_ACQUIRE_SCRIPT)
+        self.evicted = 0
+
+    async def acquire(
+            self, key: Any, cost: float, rate: float, burst: float, max_wait: float = 0
+    ) -> Tuple[bool, float]:
+        allowed, wait = await self._script(
+            keys=[f"{self.prefix}:{key}"],
+            args=[rate, burst, cost, time.time(), max_wait]
+        )
+        return bool(int(allowed)), float(wait)
+
+    def size(self) -> Optional[int]:
+        return None
+
+    async def close(self) -> None:
+        await self.redis.aclose()
+
+
+class Throttler:
+    """Корзины пользователей со счетчиками"""
+
+    def __init__(self, buckets, settings=None):
+        self.buckets = buckets
+        self.settings = settings or config.throttling
+
+        # Счетчики
+        self.allowed = 0
+        self.dropped = 0
+        self.errors = 0
+
+    def cost(self, route: str) -> float:
+        costs = self.settings.costs
+        return costs.get(route, costs.get("message", 1.0))
+
+    async def acquire(self, user_id: Optional[int], route: str) -> bool:
+        """Пропустить апдейт
+
+        user_id=None - без корзины пользователя (админы, служебные апдейты).
+        """
+        s = self.settings
+
+        if user_id is not None:
+            try:
+                allowed, _ = await self.buckets.acquire(user_id, self.cost(route), s.rate, s.burst)
+            except Exception as e:
+                # Недоступный Redis не должен останавливать бота
+                self.errors += 1
+                logger.error(f"Ошибка ограничителя запросов: {e}")
+                allowed = True
+
+            if not allowed:
+                self.dropped += 1
+                return False
+
+        self.allowed += 1
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "backend": self.settings.backend,
+            "buckets": self.buckets.size(),
+            "max_buckets": self.settings.max_users,
+            "evicted": self.buckets.evicted,
+            "allowed": self.allowed,
+            "dropped": self.dropped,
+            "errors": self.errors,
+        }
+
+    async def close(self) -> None:
+        await self.buckets.close()
+
+
+def create_throttler() -> Throttler:
+    """Ограничитель по настройке THROTTLE_BACKEND"""
+    backend = config.throttling.backend.lower()
+
+    if backend == "memory":
+        buckets = MemoryBuckets(maxsize=config.throttling.max_users)
+    elif backend == "redis":
+        buckets = RedisBuckets(config.fsm.redis_url)
+    else:
+        raise Exception(f"Неизвестное хранилище ограничителя: {config.throttling.backend}")
+
+    return Throttler(buckets)
+
+
+# Создаем глобальный экземпляр
+throttler = create_throttler()
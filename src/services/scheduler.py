@@ -1,13 +1,20 @@
 """
 SCHEDULER.PY - Планировщик для автоматического удаления просроченных ключей
+
+Ключи ставятся на отзыв точно в срок по очереди expiry_queue; раз в
+SCHEDULER_RECONCILE_INTERVAL выполняется полная сверка с БД. Сам отзыв
+выполняет очередь задач (provisioning, задачи revoke).
 """
 
 import asyncio
 import logging
 from datetime import datetime
-from typing import Optional
+from typing import List, Optional
 
+from src.config import config
 from src.services.database import get_session
+from src.services.expiry import expiry_queue
+from src.services.provisioning import provisioning_pipeline
 from src.services.vpn_service import VPNService
 from src.utils.constants import VPNKeyStatus
 
@@ -19,10 +26,11 @@ class SchedulerService:
 
     def __init__(self):
         self._task: Optional[asyncio.Task] = None
+        self._expiry_task: Optional[asyncio.Task] = None
         self._running = False
 
     async def _cleanup_expired_keys(self):
-        """Очистка просроченных ключей"""
+        """Очистка просроченных ключей (полная сверка с БД)"""
         try:
             async for session in get_session():
                 vpn_service = VPNService(session)
@@ -30,32 +38,63 @@ class SchedulerService:
 
                 if not expired_keys:
                     logger.debug("Нет просроченных ключей для удаления")
-                    return
+                else:
+                    logger.info(f"Найдено {len(expired_keys)} просроченных ключей")
 
-                logger.info(f"Найдено {len(expired_keys)} просроченных ключей")
+                    # Отзыв выполнит очередь задач (пачками, с повторами);
+                    # уже поставленные ключи повторно не ставятся
+                    queued = await provisioning_pipeline.revoke([key.id for key in expired_keys])
+                    logger.info(f"Поставлено на отзыв просроченных ключей: {queued}")
 
-                for key in expired_keys:
-                    try:
-                        # Удаляем ключ с сервера
-                        removed = await vpn_service.revoke_vpn_key(key.id)
-                        if removed:
-                            logger.info(f"Ключ {key.key_name} успешно удален")
-                        else:
-                            logger.warning(f"Не удалось удалить ключ {key.key_name}")
-                    except Exception as e:
-                        logger.error(f"Ошибка при удалении ключа {key.key_name}: {e}")
+                # Пересобираем очередь сроков по актуальным данным
+                count = await vpn_service.load_expiry_queue()
+                logger.debug(f"Очередь сроков загружена: {count} активных ключей")
 
         except Exception as e:
             logger.error(f"Ошибка в планировщике очистки: {e}")
 
+    async def _revoke_due_keys(self, key_ids: List[int]):
+        """Отзыв ключей, срок которых наступил (через очередь задач)"""
+        try:
+            queued = await provisioning_pipeline.revoke(key_ids)
+            logger.info(f"Поставлено на отзыв ключей по сроку: {queued}")
+
+        except Exception as e:
+            logger.error(f"Ошибка отзыва просроченных ключей: {e}")
+
+    async def _expiry_loop(self):
+        """Цикл отзыва ключей точно в срок"""
+        interval = config.scheduler.reconcile_interval
+        batch_size = config.scheduler.expiry_batch_size
+
+        while self._running:
+            try:
+                deadline = expiry_queue.next_deadline()
+                now = datetime.now()
+
+                if deadline is None or deadline > now:
+                    # Спим до ближайшего срока; новый более ранний срок разбудит раньше
+                    timeout = interval if deadline is None else (deadline - now).total_seconds()
+                    await expiry_queue.wait(min(timeout, interval))
+                    continue
+
+                due = expiry_queue.pop_due(now, batch_size)
+                logger.info(f"Истек срок {len(due)} ключей")
+                await self._revoke_due_keys(due)
+
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка в цикле истечения ключей: {e}")
+                await asyncio.sleep(60)
+
     async def _scheduler_loop(self):
-        """Основной цикл планировщика"""
+        """Основной цикл планировщика (сверка с БД)"""
         logger.info("Планировщик запущен")
         while self._running:
             try:
                 await self._cleanup_expired_keys()
-                # Ждем 1 час перед следующей проверкой
-                await asyncio.sleep(3600)
+                await asyncio.sleep(config.scheduler.reconcile_interval)
             except asyncio.CancelledError:
                 logger.info("Планировщик остановлен")
                 break
@@ -71,6 +110,7 @@ class SchedulerService:
 
         self._running = True
         self._task = asyncio.create_task(self._scheduler_loop())
+        self._expiry_task = asyncio.create_task(self._expiry_loop())
         logger.info("Планировщик запущен")
 
     def stop(self):
@@ -79,10 +119,11 @@ class SchedulerService:
             return
 
         self._running = False
-        if self._task:
-            self._task.cancel()
+        for task in (self._task, self._expiry_task):
+            if task:
+                task.cancel()
         logger.info("Планировщик остановлен")
 
 
 # Создаем глобальный экземпляр
-scheduler_service = SchedulerService()
\ No newline at end of file
+scheduler_service = SchedulerService()
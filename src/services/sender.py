@@ -0,0 +1,295 @@
+"""
+SENDER.PY - Очередь исходящих сообщений Telegram
+
+Хендлеры ставят отправку в очередь и сразу возвращаются; отправляют
+SENDER_WORKERS задач с учетом лимитов Telegram:
+- на чат - SENDER_CHAT_RATE сообщений в секунду (очередь чата ждет
+  отдельно, не задерживая остальные чаты);
+- на бота - SENDER_GLOBAL_RATE сообщений в секунду;
+- 429 (TelegramRetryAfter) - пауза всей отправки на retry_after и повтор;
+- сетевые ошибки и 5xx - повтор с нарастающей задержкой.
+
+Приоритеты: HIGH - ответы пользователю (выдача ключа), NORMAL -
+уведомления админам, LOW - рассылки. Более важное уходит первым.
+Последние SENDER_HIGH_RESERVE мест очереди - только для HIGH; при полной
+очереди HIGH вытесняет последнее LOW/NORMAL задание, а не отбрасывается.
+"""
+
+import asyncio
+import heapq
+import itertools
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+from aiogram import Bot
+from aiogram.exceptions import (
+    TelegramBadRequest,
+    TelegramForbiddenError,
+    TelegramNetworkError,
+    TelegramRetryAfter,
+    TelegramServerError,
+)
+from aiogram.methods import SendDocument, SendMessage, SendPhoto, TelegramMethod
+
+from src.config import config
+from src.services.rate_limit import MemoryBuckets
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+_PRIORITY_NAMES = {PRIORITY_HIGH: "high", PRIORITY_NORMAL: "normal", PRIORITY_LOW: "low"}
+
+
+class _Job:
+    __slots__ = ("method", "priority", "future", "attempts", "reserved", "enqueued_at")
+
+    def __init__(self, method: TelegramMethod, priority: int, future: asyncio.Future):
+        self.method = method
+        self.priority = priority
+        self.future = future
+        self.attempts = 0
+        # Место в лимите чата уже занято (задание вернулось после ожидания)
+        self.reserved = False
+        self.enqueued_at = time.monotonic()
+
+
+class MessageSender:
+    """Планировщик исходящих сообщений с лимитами и приоритетами"""
+
+    def __init__(self, settings=None):
+        self.settings = settings or config.sender
+        self.bot: Optional[Bot] = None
+        self._queue: Optional[asyncio.PriorityQueue] = None
+        self._seq = itertools.count()
+        self._tasks: List[asyncio.Task] = []
+        self._chats = MemoryBuckets(maxsize=self.settings.max_chats)
+        self._global = MemoryBuckets(maxsize=1)
+        self._global_rate = self.settings.global_rate
+        self._paused_until = 0.0
+        # Ждут в очереди или лимита чата
+        self.pending = 0
+
+        # Счетчики
+        self.sent = 0
+        self.failed = 0
+        self.rejected = 0
+        self.retried = 0
+        self.flood_waits = 0
+        self.latency_total = 0.0
+        self.latency_max = 0.0
+
+    # ---------- Постановка в очередь ----------
+
+    def enqueue(self, method: TelegramMethod, priority: int = PRIORITY_NORMAL) -> asyncio.Future:
+        """Поставить метод в очередь; Future завершится результатом отправки
+
+        Ждать Future не обязательно - ошибки отправки логируются.
+        """
+        future = asyncio.get_running_loop().create_future()
+        # Не ждущий результата вызывающий не должен получать "exception never retrieved"
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+
+        if self._queue is None:
+            future.set_exception(Exception("Очередь отправки не запущена"))
+            return future
+
+        if priority == PRIORITY_HIGH:
+            # Ответам пользователю отдан резерв очереди; сверх queue_size
+            # вытесняем самое неважное, а если вытеснять нечего - все равно берем
+            if self.pending >= self.settings.queue_size:
+                self._evict()
+        elif self.pending >= self.settings.queue_size - self.settings.high_reserve:
+            self.rejected += 1
+            logger.warning(f"Очередь отправки переполнена, сообщение в {method.chat_id} отброшено")
+            future.set_exception(Exception("Очередь отправки переполнена"))
+            return future
+
+        self.pending += 1
+        self._put(_Job(method, priority, future))
+        return future
+
+    def send_message(self, chat_id: int, text: str, priority: int = PRIORITY_NORMAL, **kwargs) -> asyncio.Future:
+        return self.enqueue(SendMessage(chat_id=chat_id, text=text, **kwargs), priority)
+
+    def send_photo(self, chat_id: int, photo: Any, priority: int = PRIORITY_NORMAL, **kwargs) -> asyncio.Future:
+        return self.enqueue(SendPhoto(chat_id=chat_id, photo=photo, **kwargs), priority)
+
+    def send_document(self, chat_id: int, document: Any, priority: int = PRIORITY_NORMAL, **kwargs) -> asyncio.Future:
+        return self.enqueue(SendDocument(chat_id=chat_id, document=document, **kwargs), priority)
+
+    def _put(self, job: _Job) -> None:
+        if self._queue is None:
+            # Остановились, пока задание ждало повтора
+            self._finish(job, error=Exception("Очередь отправки остановлена"))
+            return
+        self._queue.put_nowait((job.priority, next(self._seq), job))
+
+    def _put_later(self, delay: float, job: _Job) -> None:
+        asyncio.get_running_loop().call_later(delay, self._put, job)
+
+    def _evict(self) -> None:
+        """Выбросить из очереди последнее задание самого низкого приоритета (не HIGH)"""
+        heap = self._queue._queue
+        victim = max(
+            (entry for entry in heap if entry[0] != PRIORITY_HIGH),
+            key=lambda entry: (entry[0], entry[1]),
+            default=None
+        )
+        if victim is None:
+            return
+
+        heap.remove(victim)
+        heapq.heapify(heap)
+        job = victim[2]
+        self.pending -= 1
+        self.rejected += 1
+        logger.warning(f"Очередь отправки переполнена, сообщение в {job.method.chat_id} вытеснено")
+        job.future.set_exception(Exception("Очередь отправки переполнена"))
+
+    # ---------- Отправка ----------
+
+    async def _worker(self) -> None:
+        while True:
+            _, _, job = await self._queue.get()
+
+            # Лимит чата: занимаем место и возвращаем задание в очередь к своему времени
+            if not job.reserved:
+                _, wait = await self._chats.acquire(
+                    job.method.chat_id, 1,
+                    self.settings.chat_rate, self.settings.chat_burst,
+                    max_wait=float("inf")
+                )
+                if wait > 0:
+                    job.reserved = True
+                    self._put_later(wait, job)
+                    continue
+
+            # 429 от Telegram - ждут все
+            pause = self._paused_until - time.monotonic()
+            if pause > 0:
+                await asyncio.sleep(pause)
+
+            # Общий лимит бота - ждем здесь, очередь при этом не перескакиваем
+            _, wait = await self._global.acquire(
+                "global", 1, self._global_rate, self._global_rate, max_wait=float("inf")
+            )
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+            await self._send(job)
+
+    async def _send(self, job: _Job) -> None:
+        job.attempts += 1
+        try:
+            result = await self.bot(job.method)
+        except TelegramRetryAfter as e:
+            self.flood_waits += 1
+            self._paused_until = max(self._paused_until, time.monotonic() + e.retry_after)
+            logger.warning(f"Flood wait {e.retry_after} с (чат {job.method.chat_id})")
+            self._retry(job, e.retry_after, e)
+            return
+        except (TelegramNetworkError, TelegramServerError) as e:
+            self._retry(job, min(2 ** job.attempts, 60), e)
+            return
+        except (TelegramForbiddenError, TelegramBadRequest) as e:
+            # Бот заблокирован / чат не найден - повтор не поможет
+            self._finish(job, error=e)
+            return
+        except Exception as e:
+            self._finish(job, error=e)
+            return
+
+        self._finish(job, result=result)
+
+    def _retry(self, job: _Job, delay: float, error: Exception) -> None:
+        if job.attempts >= self.settings.max_attempts:
+            self._finish(job, error=error)
+            return
+
+        self.retried += 1
+        job.reserved = True
+        self._put_later(delay, job)
+
+    def _finish(self, job: _Job, result: Any = None, error: Optional[Exception] = None) -> None:
+        self.pending -= 1
+        latency = time.monotonic() - job.enqueued_at
+
+        if error is not None:
+            self.failed += 1
+            if isinstance(error, TelegramForbiddenError):
+                # Бот заблокирован - обычное дело для рассылок, не засоряем лог
+                logger.debug(f"Бот заблокирован в чате {job.method.chat_id}")
+            else:
+                logger.error(f"Не удалось отправить сообщение в {job.method.chat_id}: {error}")
+            if not job.future.done():
+                job.future.set_exception(error)
+            return
+
+        self.sent += 1
+        self.latency_total += latency
+        self.latency_max = max(self.latency_max, latency)
+        if not job.future.done():
+            job.future.set_result(result)
+
+    # ---------- Жизненный цикл ----------
+
+    def start(self, bot: Bot, share: float = 1.0) -> None:
+        """Запустить отправку
+
+        share - доля общего лимита бота для этого процесса (режим шардов).
+        """
+        if self._tasks:
+            return
+
+        self.bot = bot
+        self._global_rate = self.settings.global_rate * share
+        self._queue = asyncio.PriorityQueue()
+        self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.settings.workers)]
+        logger.info(
+            f"Очередь отправки запущена: {self.settings.workers} задач, "
+            f"{self._global_rate:g} сообщ./с на бота, {self.settings.chat_rate:g} сообщ./с на чат"
+        )
+
+    async def shutdown(self, timeout: float = 10) -> None:
+        """Дождаться отправки очереди (не дольше timeout) и остановиться"""
+        if not self._tasks:
+            return
+
+        deadline = time.monotonic() + timeout
+        while self.pending and time.monotonic() < deadline:
+            await asyncio.sleep(0.1)
+        if self.pending:
+            logger.warning(f"Не отправлено сообщений при остановке: {self.pending}")
+
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+        self._queue = None
+
+    def stats(self) -> Dict[str, Any]:
+        queued = {name: 0 for name in _PRIORITY_NAMES.values()}
+        if self._queue is not None:
+            for priority, _, _ in list(self._queue._queue):
+                queued[_PRIORITY_NAMES[priority]] += 1
+
+        return {
+            "pending": self.pending,
+            "queued": queued,
+            "sent": self.sent,
+            "failed": self.failed,
+            "rejected": self.rejected,
+            "retried": self.retried,
+            "flood_waits": self.flood_waits,
+            "paused_for": round(max(0.0, self._paused_until - time.monotonic()), 1),
+            "latency_avg_ms": round(self.latency_total / (self.sent or 1) * 1000, 1),
+            "latency_max_ms": round(self.latency_max * 1000, 1),
+        }
+
+
+# Создаем глобальный экземпляр
+message_sender = MessageSender()
@@ -0,0 +1,279 @@
+"""
+SSH_POOL.PY - Пул постоянных SSH соединений
+
+Один transport на хост, поверх него открываются каналы под каждую команду.
+Все блокирующие вызовы paramiko выполняются в пуле потоков хоста.
+"""
+
+import asyncio
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any
+
+import paramiko
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+class HostConnection:
+    """Постоянное SSH соединение с одним хостом"""
+
+    def __init__(self, host: str, port: int, username: str, password: str = "", key_path: str = ""):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.key_path = key_path
+
+        self.max_channels = config.ssh.max_concurrency
+        self._client: Optional[paramiko.SSHClient] = None
+        self._pkey: Optional[paramiko.PKey] = None
+
+        self._executor = ThreadPoolExecutor(
+            max_workers=self.max_channels + 1,
+            thread_name_prefix=f"ssh-{host}"
+        )
+        self._channels: Optional[asyncio.Semaphore] = None
+        self._connect_lock: Optional[asyncio.Lock] = None
+        self._monitor_task: Optional[asyncio.Task] = None
+        self._in_use = False
+        self._closed = False
+
+        # Статистика
+        self.handshakes = 0
+        self.channels_in_use = 0
+        self.commands = 0
+        self.failures = 0
+        self.last_connected_at: Optional[float] = None
+
+    # ---------- блокирующая часть (в потоках) ----------
+
+    def _load_pkey(self) -> Optional[paramiko.PKey]:
+        """Приватный ключ читается с диска один раз"""
+        if self.key_path and self._pkey is None:
+            self._pkey = paramiko.RSAKey.from_private_key_file(self.key_path)
+        return self._pkey
+
+    def _connect_sync(self) -> paramiko.SSHClient:
+        client = paramiko.SSHClient()
+        client.set_missing_host_key_policy(paramiko.AutoAddPolicy())
+
+        pkey = self._load_pkey()
+        client.connect(
+            hostname=self.host,
+            port=self.port,
+            username=self.username,
+            pkey=pkey,
+            password=None if pkey else self.password,
+            timeout=config.ssh.connect_timeout
+        )
+
+        transport = client.get_transport()
+        if transport is not None and config.ssh.keepalive_interval > 0:
+            transport.set_keepalive(config.ssh.keepalive_interval)
+
+        return client
+
+    @staticmethod
+    def _exec_sync(transport: paramiko.Transport, command: str, timeout: float,
+                   holder: Dict[str, Any]) -> Dict[str, Any]:
+        channel = transport.open_session(timeout=timeout)
+        # Сохраняем канал, чтобы его можно было закрыть при отмене
+        holder["channel"] = channel
+        try:
+            channel.settimeout(timeout)
+            channel.exec_command(command)
+
+            stdout = channel.makefile("rb")
+            stderr = channel.makefile_stderr("rb")
+            output = stdout.read().decode('utf-8').strip()
+            error = stderr.read().decode('utf-8').strip()
+            exit_code = channel.recv_exit_status()
+        finally:
+            channel.close()
+
+        return {
+            "success": exit_code == 0,
+            "exit_code": exit_code,
+            "output": output,
+            "error": error
+        }
+
+    # ---------- асинхронная часть ----------
+
+    def _ensure_primitives(self) -> None:
+        # Примитивы создаются лениво, внутри работающего event loop
+        if self._channels is None:
+            self._channels = asyncio.Semaphore(self.max_channels)
+            self._connect_lock = asyncio.Lock()
+        if self._monitor_task is None or self._monitor_task.done():
+            self._monitor_task = asyncio.create_task(self._monitor())
+
+    async def _run_blocking(self, func, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, func, *args)
+
+    @property
+    def is_connected(self) -> bool:
+        if not self._client:
+            return False
+        transport = self._client.get_transport()
+        return transport is not None and transport.is_active()
+
+    async def connect(self) -> bool:
+        """Установить соединение, если его нет"""
+        self._ensure_primitives()
+
+        async with self._connect_lock:
+            if self.is_connected:
+                return True
+
+            old_client, self._client = self._client, None
+            if old_client is not None:
+                await self._run_blocking(old_client.close)
+
+            try:
+                self._client = await asyncio.wait_for(
+                    self._run_blocking(self._connect_sync),
+                    timeout=config.ssh.connect_timeout + 5
+                )
+                self.handshakes += 1
+                self.last_connected_at = time.time()
+                logger.info(f"SSH подключение установлено к {self.host}")
+                return True
+
+            except Exception as e:
+                logger.error(f"Ошибка SSH подключения к {self.host}: {e}")
+                return False
+
+    async def _monitor(self) -> None:
+        """Фоновое переподключение при обрыве транспорта"""
+        delay = config.ssh.reconnect_delay
+        while not self._closed:
+            try:
+                await asyncio.sleep(max(config.ssh.keepalive_interval, 1))
+                if self._in_use and not self.is_connected:
+                    logger.warning(f"SSH транспорт к {self.host} потерян, переподключение...")
+                    if not await self.connect():
+                        await asyncio.sleep(delay)
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка мониторинга SSH {self.host}: {e}")
+
+    async def execute(self, command: str, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Выполнить команду в отдельном канале общего транспорта"""
+        timeout = timeout or config.ssh.command_timeout
+        holder: Dict[str, Any] = {}
+        self._in_use = True
+        self._ensure_primitives()
+
+        try:
+            async with self._channels:
+                if not self.is_connected and not await self.connect():
+                    self.failures += 1
+                    return {"success": False, "error": "SSH соединение не установлено"}
+
+                self.channels_in_use += 1
+                self.commands += 1
+                try:
+                    return await asyncio.wait_for(
+                        self._run_blocking(self._exec_sync, self._client.get_transport(), command, timeout, holder),
+                        timeout=timeout
+                    )
+                finally:
+                    self.channels_in_use -= 1
+
+        except asyncio.TimeoutError:
+            self.failures += 1
+            self._abort_channel(holder)
+            logger.error(f"Таймаут выполнения команды ({timeout}с): {command[:50]}...")
+            return {"success": False, "error": f"Таймаут выполнения команды ({timeout}с)"}
+
+        except asyncio.CancelledError:
+            # Закрываем канал, чтобы освободить поток пула
+            self._abort_channel(holder)
+            raise
+
+        except Exception as e:
+            self.failures += 1
+            logger.error(f"Ошибка выполнения команды: {command[:50]}... - {e}")
+            return {"success": False, "error": str(e)}
+
+    @staticmethod
+    def _abort_channel(holder: Dict[str, Any]) -> None:
+        channel = holder.get("channel")
+        if channel is not None:
+            try:
+                channel.close()
+            except Exception:
+                pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "connected": self.is_connected,
+            "channels_in_use": self.channels_in_use,
+            "max_channels": self.max_channels,
+            "handshakes": self.handshakes,
+            "commands": self.commands,
+            "failures": self.failures,
+            "last_connected_at": self.last_connected_at,
+        }
+
+    async def close(self) -> None:
+        self._closed = True
+        if self._monitor_task:
+            self._monitor_task.cancel()
+        if self._client:
+            client, self._client = self._client, None
+            await self._run_blocking(client.close)
+            logger.info(f"SSH соединение с {self.host} закрыто")
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class SSHConnectionPool:
+    """Пул SSH соединений на процесс, ключ - хост"""
+
+    def __init__(self):
+        self._hosts: Dict[str, HostConnection] = {}
+
+    def get(self, host: Optional[str] = None) -> HostConnection:
+        """Соединение с хостом (по умолчанию - из конфига)"""
+        host = host or config.ssh.host
+        connection = self._hosts.get(host)
+        if connection is None:
+            connection = HostConnection(
+                host=host,
+                port=config.ssh.port,
+                username=config.ssh.username,
+                password=config.ssh.password,
+                key_path=config.ssh.key_path
+            )
+            self._hosts[host] = connection
+        return connection
+
+    async def execute(self, command: str, host: Optional[str] = None,
+                      timeout: Optional[float] = None) -> Dict[str, Any]:
+        return await self.get(host).execute(command, timeout=timeout)
+
+    def stats(self) -> Dict[str, Any]:
+        """Статистика пула: транспорты, каналы, рукопожатия"""
+        hosts = {host: conn.stats() for host, conn in self._hosts.items()}
+        return {
+            "open_transports": sum(1 for h in hosts.values() if h["connected"]),
+            "channels_in_use": sum(h["channels_in_use"] for h in hosts.values()),
+            "handshakes": sum(h["handshakes"] for h in hosts.values()),
+            "hosts": hosts,
+        }
+
+    async def close(self) -> None:
+        for connection in self._hosts.values():
+            await connection.close()
+        self._hosts.clear()
+
+
+# Создаем глобальный экземпляр
+ssh_pool = SSHConnectionPool()
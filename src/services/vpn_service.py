@@ -1,20 +1,23 @@
-from typing import Dict, Any, Optional
+from typing import Dict, Any, List, Optional
 import secrets
 import string
-from datetime import datetime, timedelta
+from datetime import datetime
 import logging
 
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy import select, update, and_
 
-from src.models.user import User
 from src.models.vpn_key import VPNKey
-from src.models.payment import Payment
 from src.utils.constants import VPNKeyStatus, PaymentStatus
 from src.services.wireguard import WireGuardService
+from src.services.ip_allocator import ip_allocator
+from src.services.expiry import expiry_queue
 
 logger = logging.getLogger(__name__)
 
+# Ошибка revoke_vpn_keys для ключа, которого нет или он уже отозван
+KEY_NOT_FOUND = "Ключ не найден или уже отозван"
+
 
 class VPNService:
     """Сервис для управления VPN ключами"""
@@ -23,97 +26,102 @@ class VPNService:
         self.session = session
         self.wg_manager = WireGuardService()
 
-    async def create_vpn_key(
+    async def revoke_vpn_keys(
             self,
-            user: User,
-            days: int,
-            payment: Optional[Payment] = None
-    ) -> VPNKey:
-        """Создание нового VPN ключа"""
-        try:
-            # Генерируем уникальное имя для ключа
-            key_name = self._generate_key_name(user.telegram_id)
-
-            # Генерируем ключи WireGuard
-            keys = await self.wg_manager.generate_keys()
+            key_ids: List[int],
+            admin_id: Optional[int] = None
+    ) -> Dict[str, Any]:
+        """Массовый отзыв ключей: одна команда на сервере и один UPDATE
 
-            # Получаем информацию о сервере
-            server_info = await self.wg_manager.get_server_info()
+        Возвращает {"revoked": [id, ...], "failed": {id: ошибка}}.
+        """
+        revoked: List[int] = []
+        failed: Dict[int, str] = {}
 
-            # Получаем свободный IP адрес
-            ip_address = await self.wg_manager.get_next_client_ip()
-
-            # Рассчитываем дату истечения
-            expires_at = datetime.now() + timedelta(days=days)
-
-            # Генерируем конфиг для клиента
-            config_data = await self.wg_manager.generate_client_config(
-                client_private_key=keys["private_key"],
-                client_ip=ip_address,
-                server_public_key=server_info["public_key"],
-                server_endpoint=server_info["endpoint"],
-                server_port=server_info["port"]
-            )
+        if not key_ids:
+            return {"revoked": revoked, "failed": failed}
 
-            # Добавляем клиента на сервер
-            added = await self.wg_manager.add_client_to_server(keys["public_key"], ip_address)
-            if not added:
-                raise Exception("Не удалось добавить клиента на сервер WireGuard")
-
-            # Создаем запись в базе данных
-            vpn_key = VPNKey(
-                key_name=key_name,
-                user_id=user.id,
-                private_key=keys["private_key"],
-                public_key=keys["public_key"],
-                server_public_key=server_info["public_key"],
-                ip_address=ip_address,
-                server_ip=server_info["endpoint"],
-                server_port=server_info["port"],
-                server_endpoint=server_info["endpoint"],
-                days=days,
-                expires_at=expires_at,
-                status=VPNKeyStatus.ACTIVE.value if payment and payment.is_confirmed else VPNKeyStatus.PENDING.value,
-                config_data=config_data,
-                payment_id=payment.id if payment else None
+        try:
+            result = await self.session.execute(
+                select(VPNKey.id, VPNKey.public_key, VPNKey.ip_address).where(
+                    VPNKey.id.in_(key_ids),
+                    VPNKey.status != VPNKeyStatus.REVOKED.value
+                )
             )
-
-            self.session.add(vpn_key)
+            rows = result.all()
+
+            found_ids = {row.id for row in rows}
+            for key_id in key_ids:
+                if key_id not in found_ids:
+                    failed[key_id] = KEY_NOT_FOUND
+
+            # Удаляем всех пиров одной командой
+            failures = await self.wg_manager.remove_clients_from_server([row.public_key for row in rows])
+
+            for row in rows:
+                if row.public_key in failures:
+                    failed[row.id] = failures[row.public_key]
+                else:
+                    revoked.append(row.id)
+
+            # Обновляем статус одним запросом
+            if revoked:
+                await self.session.execute(
+                    update(VPNKey)
+                    .where(VPNKey.id.in_(revoked))
+                    .values(status=VPNKeyStatus.REVOKED.value)
+                )
             await self.session.commit()
 
-            logger.info(f"Создан VPN ключ {key_name} для пользователя {user.telegram_id}")
-            return vpn_key
-
-        except Exception as e:
-            await self.session.rollback()
-            logger.error(f"Ошибка создания VPN ключа: {e}")
-            raise
-
-    async def revoke_vpn_key(self, key_id: int, admin_id: Optional[int] = None) -> bool:
-        """Отзыв VPN ключа"""
-        try:
-            # Находим ключ
-            stmt = select(VPNKey).where(VPNKey.id == key_id)
-            result = await self.session.execute(stmt)
-            vpn_key = result.scalar_one_or_none()
-
-            if not vpn_key:
-                return False
-
-            # Удаляем ключ с сервера
-            await self.wg_manager.remove_client_from_server(vpn_key.public_key)
+            # Адреса возвращаются в пул
+            for row in rows:
+                if row.id in revoked:
+                    ip_allocator.release(row.ip_address)
+                    expiry_queue.cancel(row.id)
 
-            # Обновляем статус в базе
-            vpn_key.status = VPNKeyStatus.REVOKED.value
-            await self.session.commit()
-
-            logger.info(f"VPN ключ {vpn_key.key_name} отозван администратором {admin_id}")
-            return True
+            logger.info(
+                f"Массовый отзыв ключей (администратор {admin_id}): "
+                f"отозвано {len(revoked)}, ошибок {len(failed)}"
+            )
 
         except Exception as e:
             await self.session.rollback()
-            logger.error(f"Ошибка отзыва VPN ключа: {e}")
-            return False
+            logger.error(f"Ошибка массового отзыва VPN ключей: {e}")
+            for key_id in revoked:
+                failed[key_id] = str(e)
+            revoked = []
+
+        return {"revoked": revoked, "failed": failed}
+
+    async def load_expiry_queue(self) -> int:
+        """Заполнить очередь сроков активными ключами из БД"""
+        result = await self.session.execute(
+            select(VPNKey.id, VPNKey.expires_at).where(
+                VPNKey.status == VPNKeyStatus.ACTIVE.value
+            )
+        )
+        rows = result.all()
+        expiry_queue.load((row.id, row.expires_at) for row in rows)
+        return len(rows)
+
+    async def load_ip_pool(self, force: bool = False) -> None:
+        """Заполнить пул IP адресов из БД и живого wg show (один раз)"""
+        if ip_allocator.loaded and not force:
+            return
+
+        async with ip_allocator.load_lock:
+            if ip_allocator.loaded and not force:
+                return
+
+            result = await self.session.execute(
+                select(VPNKey.ip_address).where(
+                    VPNKey.status.in_([VPNKeyStatus.ACTIVE.value, VPNKeyStatus.PENDING.value])
+                )
+            )
+            used_ips = list(result.scalars().all())
+            used_ips += await self.wg_manager.get_used_ips()
+
+            ip_allocator.load(used_ips)
 
     async def get_user_keys(self, user_id: int) -> list[VPNKey]:
         """Получение всех ключей пользователя"""
@@ -122,7 +130,7 @@ class VPNService:
             VPNKey.status == VPNKeyStatus.ACTIVE.value
         ).order_by(VPNKey.created_at.desc())
 
-        result = await self.session.execute(stmt)
+        result = await self.session.execute(stmt.execution_options(replica=True))
         return list(result.scalars().all())
 
     async def get_expired_keys(self) -> list[VPNKey]:
@@ -137,8 +145,9 @@ class VPNService:
         result = await self.session.execute(stmt)
         return list(result.scalars().all())
 
-    def _generate_key_name(self, user_id: int) -> str:
-        """Генерация уникального имени ключа"""
-        timestamp = int(datetime.now().timestamp())
-        random_suffix = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(6))
-        return f"user{user_id}_{timestamp}_{random_suffix}"
\ No newline at end of file
+
+def generate_key_name(user_id: int) -> str:
+    """Уникальное имя ключа: user<telegram_id>_<время>_<суффикс>"""
+    timestamp = int(datetime.now().timestamp())
+    random_suffix = ''.join(secrets.choice(string.ascii_lowercase + string.digits) for _ in range(6))
+    return f"user{user_id}_{timestamp}_{random_suffix}"
\ No newline at end of file
@@ -0,0 +1,128 @@
+"""
+WG_KEYS.PY - Локальная генерация ключей WireGuard (Curve25519)
+
+Ключи создаются в процессе бота через cryptography, без SSH.
+Пул держит запас готовых пар и пополняется в фоне.
+"""
+
+import asyncio
+import base64
+import logging
+import os
+from collections import deque
+from typing import Deque, Dict, List, Optional
+
+from cryptography.hazmat.primitives import serialization
+from cryptography.hazmat.primitives.asymmetric.x25519 import X25519PrivateKey
+
+from src.config import config
+
+logger = logging.getLogger(__name__)
+
+
+def _encode_public(private_key: X25519PrivateKey) -> str:
+    public_bytes = private_key.public_key().public_bytes(
+        encoding=serialization.Encoding.Raw,
+        format=serialization.PublicFormat.Raw
+    )
+    return base64.b64encode(public_bytes).decode()
+
+
+def generate_keypair() -> Dict[str, str]:
+    """Сгенерировать пару ключей (аналог wg genkey | wg pubkey)"""
+    # Ключ "зажимается" так же, как это делает wg genkey
+    private_bytes = bytearray(os.urandom(32))
+    private_bytes[0] &= 248
+    private_bytes[31] = (private_bytes[31] & 127) | 64
+    private_bytes = bytes(private_bytes)
+
+    private_key = X25519PrivateKey.from_private_bytes(private_bytes)
+    return {
+        'private_key': base64.b64encode(private_bytes).decode(),
+        'public_key': _encode_public(private_key)
+    }
+
+
+def derive_public_key(private_key_b64: str) -> str:
+    """Получить публичный ключ из приватного (аналог wg pubkey)"""
+    private_key = X25519PrivateKey.from_private_bytes(base64.b64decode(private_key_b64.strip()))
+    return _encode_public(private_key)
+
+
+def _generate_batch(count: int) -> List[Dict[str, str]]:
+    return [generate_keypair() for _ in range(count)]
+
+
+class KeyPool:
+    """Пул заранее сгенерированных пар ключей"""
+
+    def __init__(self, size: int):
+        self.size = max(size, 1)
+        self.low_watermark = max(self.size // 4, 1)
+        self._keys: Deque[Dict[str, str]] = deque()
+        self._refill_needed: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self._keys)
+
+    async def get(self) -> Dict[str, str]:
+        """Взять готовую пару ключей (или сгенерировать, если пул пуст)"""
+        if self._keys:
+            keys = self._keys.popleft()
+        else:
+            keys = generate_keypair()
+
+        if len(self._keys) < self.low_watermark and self._refill_needed:
+            self._refill_needed.set()
+
+        return keys
+
+    async def get_many(self, count: int) -> List[Dict[str, str]]:
+        """Взять count пар: из пула, недостающие - генерацией в отдельном потоке"""
+        taken = min(count, len(self._keys))
+        keys = [self._keys.popleft() for _ in range(taken)]
+        if count > taken:
+            keys.extend(await asyncio.to_thread(_generate_batch, count - taken))
+
+        if len(self._keys) < self.low_watermark and self._refill_needed:
+            self._refill_needed.set()
+
+        return keys
+
+    async def fill(self) -> None:
+        """Дополнить пул до полного размера"""
+        missing = self.size - len(self._keys)
+        if missing > 0:
+            # Генерация в отдельном потоке, чтобы не занимать event loop
+            self._keys.extend(await asyncio.to_thread(_generate_batch, missing))
+
+    async def _refill_loop(self) -> None:
+        while True:
+            try:
+                await self.fill()
+                self._refill_needed.clear()
+                await self._refill_needed.wait()
+            except asyncio.CancelledError:
+                break
+            except Exception as e:
+                logger.error(f"Ошибка пополнения пула ключей: {e}")
+                await asyncio.sleep(5)
+
+    def start(self) -> None:
+        """Запуск фонового пополнения"""
+        if self._task and not self._task.done():
+            return
+        self._refill_needed = asyncio.Event()
+        self._task = asyncio.create_task(self._refill_loop())
+        logger.info(f"Пул ключей WireGuard запущен (размер {self.size})")
+
+    def stop(self) -> None:
+        """Остановка фонового пополнения"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+
+# Создаем глобальный экземпляр
+key_pool = KeyPool(config.wireguard.key_pool_size)
@@ -1,12 +1,57 @@
 import asyncio
+import ipaddress
 import tempfile
 import os
-from typing import Dict, Optional
-from datetime import datetime
+import shlex
+import time
+from typing import Dict, List, Optional, Set, Tuple
+import logging
 
 from src.config import config
 from src.utils.constants import WG_DNS_SERVERS, WG_KEEPALIVE
 from src.services.ssh_service import SSHService
+from src.services.wg_keys import key_pool, derive_public_key
+
+logger = logging.getLogger(__name__)
+
+
+class ServerInfoCache:
+    """Кэш данных сервера (публичный ключ, порт) с TTL
+
+    По истечении TTL данные не перечитываются целиком: сначала сверяется
+    отпечаток строк PrivateKey/ListenPort конфига. mtime для этого не
+    подходит - wg-quick save переписывает файл при каждом изменении пиров.
+    """
+
+    def __init__(self, ttl: int):
+        self.ttl = ttl
+        self.info: Optional[Dict[str, str]] = None
+        self.fingerprint: Optional[str] = None
+        self.loaded_at: float = 0.0
+        self.lock = asyncio.Lock()
+
+    @property
+    def is_fresh(self) -> bool:
+        return self.info is not None and time.monotonic() - self.loaded_at < self.ttl
+
+    def matches(self, fingerprint: Optional[str]) -> bool:
+        return bool(fingerprint) and fingerprint == self.fingerprint
+
+    def store(self, info: Dict[str, str], fingerprint: str) -> None:
+        self.info = info
+        self.fingerprint = fingerprint
+        self.touch()
+
+    def touch(self) -> None:
+        self.loaded_at = time.monotonic()
+
+    def invalidate(self) -> None:
+        self.info = None
+        self.fingerprint = None
+        self.loaded_at = 0.0
+
+
+server_info_cache = ServerInfoCache(config.wireguard.server_info_ttl)
 
 
 class WireGuardService:
@@ -15,6 +60,11 @@ class WireGuardService:
     def __init__(self):
         self.ssh_service = SSHService()
 
+    @property
+    def interface(self) -> str:
+        """Имя интерфейса WireGuard (wg0 для /etc/wireguard/wg0.conf)"""
+        return os.path.basename(config.wireguard.server_config_path).replace('.conf', '')
+
     async def _run_ssh_command(self, command: str) -> Dict[str, any]:
         """Выполнить команду на удаленном сервере через SSH"""
         try:
@@ -31,143 +81,170 @@ class WireGuardService:
             }
 
     async def generate_keys(self) -> Dict[str, str]:
-        """Сгенерировать пару ключей WireGuard"""
-        # Генерируем приватный ключ
-        priv_key_result = await self._run_ssh_command('wg genkey')
-        if not priv_key_result['success']:
-            raise Exception(f"Ошибка генерации приватного ключа: {priv_key_result['error']}")
-
-        private_key = priv_key_result['output']
-
-        # Генерируем публичный ключ из приватного
-        # Создаем временный файл на сервере с приватным ключом
-        temp_file = f"/tmp/wg_priv_{int(datetime.now().timestamp())}.tmp"
-        create_file_cmd = f"echo '{private_key}' > {temp_file}"
-        await self._run_ssh_command(create_file_cmd)
-
-        # Генерируем публичный ключ
-        pub_key_result = await self._run_ssh_command(f"wg pubkey < {temp_file}")
-
-        # Удаляем временный файл
-        await self._run_ssh_command(f"rm -f {temp_file}")
-
-        if not pub_key_result['success']:
-            raise Exception(f"Ошибка генерации публичного ключа: {pub_key_result['error']}")
-
-        public_key = pub_key_result['output']
-
-        return {
-            'private_key': private_key,
-            'public_key': public_key
-        }
-
-    async def get_server_info(self) -> Dict[str, str]:
-        """Получить информацию о WireGuard сервере"""
-        # Получаем публичный ключ сервера
-        # Сначала читаем приватный ключ сервера
-        priv_key_result = await self._run_ssh_command(
-            f"sudo grep -oP 'PrivateKey = \\K[^\\n]+' {config.wireguard.server_config_path}"
+        """Сгенерировать пару ключей WireGuard (локально, без SSH)"""
+        return await key_pool.get()
+
+    async def get_server_info(self, force: bool = False) -> Dict[str, str]:
+        """Получить информацию о WireGuard сервере (из кэша, если он актуален)"""
+        async with server_info_cache.lock:
+            if not force and server_info_cache.info:
+                if server_info_cache.is_fresh:
+                    return server_info_cache.info
+
+                # TTL истек: дешевая проверка отпечатка без чтения ключа
+                fingerprint = await self._read_config_fingerprint()
+                if fingerprint and server_info_cache.matches(fingerprint):
+                    server_info_cache.touch()
+                    return server_info_cache.info
+
+            info, fingerprint = await self._load_server_info()
+            server_info_cache.store(info, fingerprint)
+            return info
+
+    async def _read_config_fingerprint(self) -> Optional[str]:
+        """Отпечаток идентичности сервера (строки PrivateKey и ListenPort)"""
+        result = await self._run_ssh_command(FINGERPRINT_COMMAND.format(
+            conf=shlex.quote(config.wireguard.server_config_path)
+        ))
+        if not result['success']:
+            return None
+        return result['output'].strip()
+
+    async def _load_server_info(self) -> Tuple[Dict[str, str], str]:
+        """Прочитать ключ, порт и отпечаток сервера одной командой"""
+        conf = shlex.quote(config.wireguard.server_config_path)
+        result = await self._run_ssh_command(
+            f"sudo grep -oP 'PrivateKey = \\K[^\\n]+' {conf} && "
+            f"sudo grep -oP 'ListenPort = \\K[0-9]+' {conf} && "
+            + FINGERPRINT_COMMAND.format(conf=conf)
         )
 
-        if not priv_key_result['success']:
-            raise Exception(f"Ошибка чтения приватного ключа сервера: {priv_key_result['error']}")
-
-        server_private_key = priv_key_result['output']
+        if not result['success']:
+            raise Exception(f"Ошибка чтения конфигурации сервера: {result['error']}")
 
-        # Создаем временный файл с приватным ключом сервера
-        temp_file = f"/tmp/wg_server_priv_{int(datetime.now().timestamp())}.tmp"
-        create_file_cmd = f"echo '{server_private_key}' > {temp_file}"
-        await self._run_ssh_command(create_file_cmd)
-
-        # Генерируем публичный ключ сервера
-        pub_key_result = await self._run_ssh_command(f"wg pubkey < {temp_file}")
-        await self._run_ssh_command(f"rm -f {temp_file}")
-
-        if not pub_key_result['success']:
-            raise Exception(f"Ошибка генерации публичного ключа сервера: {pub_key_result['error']}")
-
-        server_public_key = pub_key_result['output']
-
-        # Получаем порт сервера
-        port_result = await self._run_ssh_command(
-            f"sudo grep -oP 'ListenPort = \\K[0-9]+' {config.wireguard.server_config_path}"
-        )
-
-        if not port_result['success']:
-            raise Exception(f"Ошибка чтения порта сервера: {port_result['error']}")
+        try:
+            server_private_key, server_port, fingerprint = result['output'].split('\n')[:3]
+        except ValueError:
+            raise Exception("Некорректная конфигурация сервера: нет PrivateKey или ListenPort")
 
-        server_port = port_result['output']
+        # Публичный ключ вычисляется локально, без временных файлов на сервере
+        server_public_key = derive_public_key(server_private_key)
 
         # Получаем публичный IP сервера (или используем указанный хост)
         server_ip = config.ssh.host
 
-        return {
+        info = {
             'public_key': server_public_key,
-            'port': server_port,
+            'port': server_port.strip(),
             'ip': server_ip,
             'endpoint': server_ip  # Для Endpoint используем IP
         }
-
-    async def get_next_client_ip(self) -> str:
-        """Получить следующий свободный IP адрес для клиента"""
-        # Получаем список используемых IP адресов
-        used_ips_result = await self._run_ssh_command(
-            f"sudo grep -oP 'AllowedIPs = \\K[0-9.]+' {config.wireguard.server_config_path} || true"
-        )
-
-        used_ips = set()
-        if used_ips_result['success'] and used_ips_result['output']:
-            used_ips = set(used_ips_result['output'].split('\n'))
-
-        # Парсим начальный IP и подсеть
-        base_ip_parts = config.wireguard.client_ip_start.split('.')
-        base_ip = '.'.join(base_ip_parts[:3])  # Первые три октета
-        start_num = int(base_ip_parts[3])
-        end_num = int(config.wireguard.client_ip_end.split('.')[3])
-
-        # Ищем свободный IP
-        for i in range(start_num, end_num + 1):
-            test_ip = f"{base_ip}.{i}"
-            if test_ip not in used_ips:
-                return test_ip
-
-        raise Exception("Нет свободных IP адресов в пуле")
-
-    async def add_client_to_server(self, client_public_key: str, client_ip: str) -> bool:
-        """Добавить клиента на сервер WireGuard"""
-        # Команда для добавления клиента в конфиг
-        add_peer_cmd = (
-            f"sudo wg set {os.path.basename(config.wireguard.server_config_path).replace('.conf', '')} "
-            f"peer {client_public_key} "
-            f"allowed-ips {client_ip}/32"
-        )
-
-        result = await self._run_ssh_command(add_peer_cmd)
-
-        if result['success']:
-            # Сохраняем конфигурацию
-            save_cmd = f"sudo wg-quick save {os.path.basename(config.wireguard.server_config_path).replace('.conf', '')}"
-            await self._run_ssh_command(save_cmd)
-            return True
-        else:
-            print(f"Ошибка добавления клиента: {result['error']}")
-            return False
-
-    async def remove_client_from_server(self, client_public_key: str) -> bool:
-        """Удалить клиента с сервера WireGuard"""
-        remove_cmd = (
-            f"sudo wg set {os.path.basename(config.wireguard.server_config_path).replace('.conf', '')} "
-            f"peer {client_public_key} remove"
-        )
-
-        result = await self._run_ssh_command(remove_cmd)
-
-        if result['success']:
-            save_cmd = f"sudo wg-quick save {os.path.basename(config.wireguard.server_config_path).replace('.conf', '')}"
-            await self._run_ssh_command(save_cmd)
-            return True
-
-        return False
+        return info, fingerprint.strip()
+
+    async def get_used_ips(self) -> List[str]:
+        """IP адреса пиров, активных на сервере прямо сейчас (wg show)"""
+        result = await self._run_ssh_command(f"sudo wg show {shlex.quote(self.interface)} allowed-ips")
+        if not result['success']:
+            raise Exception(f"Ошибка получения списка пиров: {result['error']}")
+
+        used_ips = []
+        for line in result['output'].splitlines():
+            for allowed_ip in line.split()[1:]:
+                if allowed_ip.endswith('/32'):
+                    used_ips.append(allowed_ip[:-3])
+        return used_ips
+
+    async def add_clients_to_server(self, peers: List[Tuple[str, str]]) -> Dict[str, str]:
+        """Добавить несколько пиров (public_key, ip) одной командой на чанк
+
+        Чанк добавляется атомарно: при ошибке wg set или обрыве команды
+        скрипт сам удаляет на сервере уже добавленные им пиры. Пир, чей
+        адрес уже занят на сервере, не добавляется (ошибка IP_BUSY) и
+        откат не вызывает. Возвращает ошибки по ключам: {public_key: текст}.
+        Конфиг сохраняется один раз через config_flusher, а отпечаток из
+        ответа проверяет кэш данных сервера без отдельного запроса.
+        """
+        failures: Dict[str, str] = {}
+        fingerprint: Optional[str] = None
+
+        for i in range(0, len(peers), BULK_CHUNK_SIZE):
+            chunk = peers[i:i + BULK_CHUNK_SIZE]
+            script = BULK_ADD_SCRIPT.format(
+                conf=shlex.quote(config.wireguard.server_config_path),
+                iface=shlex.quote(self.interface),
+                busy=shlex.quote(IP_BUSY),
+                fingerprint=FINGERPRINT_COMMAND.format(conf='"$CONF"'),
+            )
+            command = f"bash -c {shlex.quote(script)} _ " + " ".join(
+                f"{shlex.quote(key)} {shlex.quote(ip)}" for key, ip in chunk
+            )
+
+            result = await self._run_ssh_command(command)
+
+            committed = False
+            for line in (result.get('output') or '').splitlines():
+                parts = line.split('\t', 2)
+                if len(parts) >= 2 and parts[0] == 'FAIL':
+                    failures[parts[1]] = parts[2] if len(parts) > 2 else ''
+                elif len(parts) == 2 and parts[0] == 'OK':
+                    committed, fingerprint = True, parts[1].strip()
+
+            if not (result['success'] and committed):
+                # Чанк откачен на сервере - не добавлен ни один пир
+                error = result['error'] or "Ошибка выполнения команды"
+                for key, _ in chunk:
+                    failures.setdefault(key, f"{BATCH_ROLLED_BACK}: {error}")
+
+        added = len(peers) - len(failures)
+        if added:
+            config_flusher.mark_dirty(added)
+
+        if fingerprint and server_info_cache.matches(fingerprint):
+            # Отпечаток совпал - кэш подтвержден без отдельного запроса
+            server_info_cache.touch()
+        elif fingerprint and server_info_cache.info:
+            # Ключ или порт сервера изменились - кэш устарел
+            server_info_cache.invalidate()
+
+        return failures
+
+    async def remove_clients_from_server(self, client_public_keys: List[str]) -> Dict[str, str]:
+        """Удалить несколько клиентов одной командой на чанк ключей
+
+        Возвращает ошибки по ключам: {public_key: текст ошибки}.
+        Конфиг сохраняется один раз через config_flusher.
+        """
+        failures: Dict[str, str] = {}
+
+        for i in range(0, len(client_public_keys), BULK_CHUNK_SIZE):
+            chunk = client_public_keys[i:i + BULK_CHUNK_SIZE]
+            script = BULK_REMOVE_SCRIPT.format(iface=shlex.quote(self.interface))
+            command = f"bash -c {shlex.quote(script)} _ " + " ".join(shlex.quote(k) for k in chunk)
+
+            result = await self._run_ssh_command(command)
+            if not result['success']:
+                # Команда не выполнилась целиком - считаем ошибкой весь чанк
+                for key in chunk:
+                    failures[key] = result['error'] or "Ошибка выполнения команды"
+                continue
+
+            for line in result['output'].splitlines():
+                parts = line.split('\t', 2)
+                if len(parts) >= 2 and parts[0] == 'FAIL':
+                    failures[parts[1]] = parts[2] if len(parts) > 2 else ''
+
+        removed = len(client_public_keys) - len(failures)
+        if removed:
+            config_flusher.mark_dirty(removed)
+
+        return failures
+
+    async def save_config(self) -> bool:
+        """Сохранить текущее состояние интерфейса в конфиг (wg-quick save)"""
+        result = await self._run_ssh_command(f"sudo wg-quick save {shlex.quote(self.interface)}")
+        if not result['success']:
+            logger.error(f"Ошибка сохранения конфигурации WireGuard: {result['error']}")
+        return result['success']
 
     async def generate_client_config(
             self,
@@ -180,7 +257,7 @@ class WireGuardService:
         """Сгенерировать конфигурационный файл для клиента"""
         config_template = f"""[Interface]
 PrivateKey = {client_private_key}
-Address = {client_ip}/24
+Address = {client_ip}/{ipaddress.ip_network(config.wireguard.network, strict=False).prefixlen}
 DNS = {', '.join(WG_DNS_SERVERS)}
 
 [Peer]
@@ -192,5 +269,151 @@ PersistentKeepalive = {WG_KEEPALIVE}
         return config_template
 
 
+# Отпечаток идентичности сервера: меняется только при смене ключа или порта
+FINGERPRINT_COMMAND = "sudo grep -E '^(PrivateKey|ListenPort)' {conf} | sort | sha256sum | cut -d' ' -f1"
+
+# Массовое удаление пиров: ключи передаются аргументами, по строке на ошибку
+BULK_REMOVE_SCRIPT = """
+IFACE={iface}
+for KEY in "$@"; do
+    if ! ERR="$(sudo wg set "$IFACE" peer "$KEY" remove 2>&1)"; then
+        printf 'FAIL\\t%s\\t%s\\n' "$KEY" "$(printf '%s' "$ERR" | tr '\\n\\t' '  ')"
+    fi
+done
+exit 0
+"""
+
+# Ошибка add_clients_to_server: адрес уже занят на сервере (пир не добавлен)
+IP_BUSY = "IP уже занят"
+# Начало ошибки пиров, откаченных из-за сбоя другого пира или команды
+BATCH_ROLLED_BACK = "Пачка отменена"
+
+# Массовое добавление пиров: аргументы парами "ключ IP".
+# wg set не проверяет адрес: занятый он молча отнимет у другого пира,
+# поэтому адреса сверяются с wg show и конфигом сервера (FAIL с IP_BUSY).
+# Остальные пиры добавляются как одна транзакция: ошибка wg set, обрыв
+# SSH или невозможность вывести итог откатывают уже добавленных (trap
+# EXIT). Итог - строка OK с отпечатком сервера; без нее чанк не добавлен.
+# Параметры подставляются через shlex.quote, фигурные скобки bash экранированы.
+BULK_ADD_SCRIPT = """
+set -u
+CONF={conf}
+IFACE={iface}
+ADDED=""
+COMMITTED=0
+
+rollback() {{
+    for KEY in $ADDED; do
+        sudo wg set "$IFACE" peer "$KEY" remove || true
+    done
+}}
+trap 'if [ "$COMMITTED" != 1 ]; then rollback; fi' EXIT
+trap 'exit 129' HUP INT TERM PIPE
+
+FP="$({fingerprint})"
+USED="$( {{ sudo grep -oP 'AllowedIPs = \\K[0-9.]+' "$CONF"; sudo wg show "$IFACE" allowed-ips | grep -oE '[0-9.]+/32' | cut -d/ -f1; }} || true )"
+
+while [ "$#" -ge 2 ]; do
+    if printf '%s\\n' "$USED" | grep -qxF "$2"; then
+        printf 'FAIL\\t%s\\t%s\\n' "$1" {busy}
+    else
+        # Ключ запоминается до wg set: сигнал во время команды не оставит пира
+        ADDED="$ADDED $1"
+        if ! ERR="$(sudo wg set "$IFACE" peer "$1" allowed-ips "$2/32" 2>&1)"; then
+            printf 'FAIL\\t%s\\t%s\\n' "$1" "$(printf '%s' "$ERR" | tr '\\n\\t' '  ')"
+            echo "Ошибка добавления пира, пачка откачена" >&2
+            exit 1
+        fi
+        USED="$USED
+$2"
+    fi
+    shift 2
+done
+
+printf 'OK\\t%s\\n' "$FP" || exit 1
+COMMITTED=1
+"""
+
+# Ключей на одну команду (ограничение длины командной строки)
+BULK_CHUNK_SIZE = 500
+
+
+class ConfigFlusher:
+    """Отложенное сохранение конфига WireGuard (wg-quick save)
+
+    Изменения пиров копятся и сохраняются одним вызовом: не чаще раза
+    в interval секунд или сразу при накоплении batch_size изменений.
+    """
+
+    def __init__(self, service: WireGuardService, interval: float, batch_size: int):
+        self.service = service
+        self.interval = interval
+        self.batch_size = max(batch_size, 1)
+        self.pending = 0
+        self.flushes = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def mark_dirty(self, count: int = 1) -> None:
+        """Зарегистрировать изменение пиров"""
+        self.pending += count
+
+        if self.pending >= self.batch_size:
+            # Пакет набран - сохраняем сразу, не дожидаясь таймера
+            self._spawn(0)
+        elif self._timer is None or self._timer.done():
+            self._timer = self._spawn(self.interval)
+
+    def _spawn(self, delay: float) -> asyncio.Task:
+        task = asyncio.create_task(self._flush_later(delay))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    async def _flush_later(self, delay: float) -> None:
+        if delay:
+            await asyncio.sleep(delay)
+        await self.flush()
+
+    async def flush(self) -> bool:
+        """Сохранить конфиг, если есть несохраненные изменения"""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+
+        async with self._lock:
+            if not self.pending:
+                return True
+
+            pending, self.pending = self.pending, 0
+            try:
+                saved = await self.service.save_config()
+            except BaseException:
+                self.pending += pending
+                raise
+
+            if saved:
+                self.flushes += 1
+                logger.info(f"Конфигурация WireGuard сохранена ({pending} изменений)")
+            else:
+                # Повторим при следующем изменении или по таймеру
+                self.pending += pending
+                if self._timer is None or self._timer.done():
+                    self._timer = self._spawn(self.interval)
+
+            return saved
+
+    async def shutdown(self) -> None:
+        """Принудительное сохранение при остановке бота"""
+        for task in list(self._tasks):
+            task.cancel()
+        await self.flush()
+
+
 # Создаем глобальный экземпляр сервиса
-wireguard_service = WireGuardService()
\ No newline at end of file
+wireguard_service = WireGuardService()
+config_flusher = ConfigFlusher(
+    wireguard_service,
+    interval=config.wireguard.save_interval,
+    batch_size=config.wireguard.save_batch_size
+)
\ No newline at end of file
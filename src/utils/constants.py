@@ -30,6 +30,8 @@ PRICE_PER_DAY = 10
 # Лимиты
 MAX_KEY_DURATION_DAYS = 365
 MIN_KEY_DURATION_DAYS = 1
+# Платежей на странице очереди подтверждений (плюс столько же заранее)
+CONFIRMATION_PAGE_SIZE = 10
 
 # Сообщения
 START_MESSAGE = """
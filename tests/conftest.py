@@ -0,0 +1,4 @@
+import os
+
+# Конфиг проверяет токен при импорте; тестам настоящий бот не нужен
+os.environ.setdefault("BOT_TOKEN", "123456:test")
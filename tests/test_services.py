@@ -0,0 +1,389 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import select, update
+from sqlalchemy.ext.asyncio import async_sessionmaker, create_async_engine
+
+from src.services.expiry import ExpiryQueue
+from src.models import Job, Payment, User
+from src.models.base import Base
+from src.services import rate_limit
+from src.services.dao import JobDAO, PaymentDAO
+from src.services.ip_allocator import IPAllocator
+from src.services.rate_limit import MemoryBuckets
+
+
+# ========== IP ALLOCATOR ==========
+
+def make_allocator(**kwargs) -> IPAllocator:
+    return IPAllocator("10.0.0.0/24", "10.0.0.2", "10.0.0.5", **kwargs)
+
+
+def test_allocator_skips_reserved_and_loaded():
+    allocator = make_allocator(reserved=["10.0.0.2"])
+    allocator.load(["10.0.0.3/32", "192.168.1.1", "мусор"])
+
+    assert allocator.free == 2
+    assert allocator.allocate() == "10.0.0.4"
+    assert allocator.allocate() == "10.0.0.5"
+
+
+def test_allocator_exhausted():
+    allocator = make_allocator()
+    for _ in range(allocator.size):
+        allocator.allocate()
+
+    assert allocator.free == 0
+    with pytest.raises(Exception):
+        allocator.allocate()
+
+
+def test_allocator_reuses_released():
+    allocator = make_allocator()
+    first = allocator.allocate()
+    allocator.allocate()
+
+    assert allocator.release(first)
+    assert not allocator.release(first)
+    assert allocator.allocate() == first
+    assert allocator.allocate() == "10.0.0.4"
+
+
+def test_allocator_mark_used_after_release():
+    allocator = make_allocator()
+    ip = allocator.allocate()
+    allocator.release(ip)
+
+    # Адрес занят в обход пула (например, найден в wg show) - не выдаем его второй раз
+    assert allocator.mark_used(ip)
+    assert allocator.allocate() == "10.0.0.3"
+
+
+def test_allocator_reset_keeps_reserved():
+    allocator = make_allocator(reserved=["10.0.0.2"])
+    allocator.allocate()
+    allocator.reset()
+
+    assert allocator.free == allocator.size - 1
+    assert allocator.allocate() == "10.0.0.3"
+
+
+def test_allocator_rejects_bad_range():
+    with pytest.raises(ValueError):
+        IPAllocator("10.0.0.0/24", "10.0.1.2", "10.0.1.5")
+    with pytest.raises(ValueError):
+        IPAllocator("10.0.0.0/24", "10.0.0.9", "10.0.0.5")
+
+
+# ========== EXPIRY QUEUE ==========
+
+NOW = datetime(2026, 1, 1, 12, 0)
+
+
+def test_expiry_pops_due_in_order():
+    queue = ExpiryQueue()
+    queue.load([(1, NOW + timedelta(hours=1)), (2, NOW - timedelta(hours=1)), (3, NOW), (4, None)])
+
+    assert len(queue) == 3
+    assert queue.pop_due(NOW, limit=10) == [2, 3]
+    assert queue.next_deadline() == NOW + timedelta(hours=1)
+    assert len(queue) == 1
+
+
+def test_expiry_pop_due_respects_limit():
+    queue = ExpiryQueue()
+    queue.load([(i, NOW - timedelta(minutes=i)) for i in range(1, 6)])
+
+    assert queue.pop_due(NOW, limit=2) == [5, 4]
+    assert queue.pop_due(NOW, limit=10) == [3, 2, 1]
+    assert queue.next_deadline() is None
+
+
+def test_expiry_reschedule_drops_old_deadline():
+    queue = ExpiryQueue()
+    queue.schedule(1, NOW - timedelta(hours=1))
+    # Продление: старая запись в куче остается, но считается устаревшей
+    queue.schedule(1, NOW + timedelta(days=30))
+
+    assert len(queue) == 1
+    assert queue.pop_due(NOW, limit=10) == []
+    assert queue.next_deadline() == NOW + timedelta(days=30)
+
+
+def test_expiry_cancel():
+    queue = ExpiryQueue()
+    queue.schedule(1, NOW - timedelta(hours=1))
+    queue.schedule(2, NOW - timedelta(minutes=1))
+    queue.cancel(1)
+    queue.cancel(42)
+
+    assert queue.pop_due(NOW, limit=10) == [2]
+    assert len(queue) == 0
+
+
+def test_expiry_wait_wakes_on_earlier_deadline():
+    async def scenario():
+        queue = ExpiryQueue()
+        queue.schedule(1, NOW + timedelta(hours=1))
+
+        waiter = asyncio.create_task(queue.wait(timeout=5))
+        await asyncio.sleep(0)
+        # Более поздний срок планировщик не будит
+        queue.schedule(2, NOW + timedelta(hours=2))
+        await asyncio.sleep(0.05)
+        assert not waiter.done()
+
+        queue.schedule(3, NOW)
+        await asyncio.wait_for(waiter, timeout=1)
+
+    asyncio.run(scenario())
+
+
+def test_expiry_wait_timeout():
+    async def scenario():
+        queue = ExpiryQueue()
+        await asyncio.wait_for(queue.wait(timeout=0.01), timeout=1)
+
+    asyncio.run(scenario())
+
+
+# ========== MEMORY BUCKETS ==========
+
+@pytest.fixture
+def clock(monkeypatch):
+    """Управляемое время для корзин"""
+    now = [1000.0]
+    monkeypatch.setattr(rate_limit.time, "monotonic", lambda: now[0])
+    return now
+
+
+def test_buckets_burst_then_refill(clock):
+    async def scenario():
+        buckets = MemoryBuckets(maxsize=10)
+        for _ in range(3):
+            assert await buckets.acquire("u", 1, rate=2, burst=3) == (True, 0.0)
+
+        allowed, wait = await buckets.acquire("u", 1, rate=2, burst=3)
+        assert not allowed and wait == pytest.approx(0.5)
+
+        clock[0] += 0.5
+        assert (await buckets.acquire("u", 1, rate=2, burst=3))[0]
+
+        # Долгий простой не копит токены сверх burst
+        clock[0] += 100
+        for _ in range(3):
+            assert (await buckets.acquire("u", 1, rate=2, burst=3))[0]
+        assert not (await buckets.acquire("u", 1, rate=2, burst=3))[0]
+
+    asyncio.run(scenario())
+
+
+def test_buckets_cost_and_max_wait(clock):
+    async def scenario():
+        buckets = MemoryBuckets(maxsize=10)
+        assert await buckets.acquire("u", 2, rate=1, burst=2) == (True, 0.0)
+
+        # Токены занимаются наперед: ждать 1 с, следующему - уже 2 с
+        assert await buckets.acquire("u", 1, rate=1, burst=2, max_wait=1) == (True, 1.0)
+        allowed, wait = await buckets.acquire("u", 1, rate=1, burst=2, max_wait=1)
+        assert not allowed and wait == pytest.approx(2.0)
+
+    asyncio.run(scenario())
+
+
+def test_buckets_keys_are_independent(clock):
+    async def scenario():
+        buckets = MemoryBuckets(maxsize=10)
+        assert (await buckets.acquire("a", 1, rate=1, burst=1))[0]
+        assert not (await buckets.acquire("a", 1, rate=1, burst=1))[0]
+        assert (await buckets.acquire("b", 1, rate=1, burst=1))[0]
+
+    asyncio.run(scenario())
+
+
+def test_buckets_lru_eviction(clock):
+    async def scenario():
+        buckets = MemoryBuckets(maxsize=2)
+        await buckets.acquire("a", 1, rate=1, burst=1)
+        await buckets.acquire("b", 1, rate=1, burst=1)
+        # "a" обращался последним - вытесняется "b"
+        await buckets.acquire("a", 1, rate=1, burst=1)
+        await buckets.acquire("c", 1, rate=1, burst=1)
+
+        assert buckets.size() == 2
+        assert buckets.evicted == 1
+        assert "b" not in buckets._buckets
+        # Вытесненная корзина начинается заново - полной
+        assert (await buckets.acquire("b", 1, rate=1, burst=1))[0]
+
+        await buckets.close()
+        assert buckets.size() == 0
+
+    asyncio.run(scenario())
+
+
+# ========== DAO (SQLite во временном файле) ==========
+
+def run_db(tmp_path, scenario):
+    """Выполнить scenario(session) на чистой базе"""
+    async def main():
+        engine = create_async_engine(f"sqlite+aiosqlite:///{tmp_path / 'test.db'}")
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.create_all)
+        try:
+            async with async_sessionmaker(engine, expire_on_commit=False)() as session:
+                await scenario(session)
+        finally:
+            await engine.dispose()
+
+    asyncio.run(main())
+
+
+async def add_payments(session, count: int) -> None:
+    session.add(User(id=1, telegram_id=1001, first_name="test"))
+    for i in range(1, count + 1):
+        session.add(Payment(
+            id=i, payment_id=f"p{i}", user_id=1, amount=300, method="card", payment_details="",
+            # По два платежа на одну секунду - порядок внутри решает id
+            status="paid" if i % 5 else "confirmed", created_at=NOW + timedelta(seconds=i // 2),
+            expires_at=NOW + timedelta(days=1)
+        ))
+    await session.commit()
+
+
+def page_key(payment: Payment):
+    return payment.created_at, payment.id
+
+
+def test_queue_page_forward_and_back(tmp_path):
+    async def scenario(session):
+        await add_payments(session, 23)
+        expected = [i for i in range(1, 24) if i % 5]
+
+        pages, after = [], None
+        while True:
+            page = await PaymentDAO.get_queue_page(session, "paid", limit=5, after=after)
+            if not page:
+                break
+            pages.append([p.id for p in page])
+            after = page_key(page[-1])
+
+        assert [i for page in pages for i in page] == expected
+        assert all(len(page) == 5 for page in pages[:-1])
+
+        # Назад от третьей страницы - вторая, в прямом порядке и с пользователем
+        first = await PaymentDAO.get_queue_page(session, "paid", limit=5)
+        second = await PaymentDAO.get_queue_page(session, "paid", limit=5, after=page_key(first[-1]))
+        third = await PaymentDAO.get_queue_page(session, "paid", limit=5, after=page_key(second[-1]))
+        previous = await PaymentDAO.get_queue_page(session, "paid", limit=5, before=page_key(third[0]))
+        assert [p.id for p in previous] == pages[1]
+        assert previous[0].user.telegram_id == 1001
+
+        # Перед первой страницей ничего нет
+        assert await PaymentDAO.get_queue_page(session, "paid", limit=5, before=page_key(first[0])) == []
+
+    run_db(tmp_path, scenario)
+
+
+def test_queue_page_survives_processed_rows(tmp_path):
+    async def scenario(session):
+        await add_payments(session, 12)
+        first = await PaymentDAO.get_queue_page(session, "paid", limit=4)
+
+        # Пока админ смотрел первую страницу, часть ее подтвердили -
+        # следующая страница не сдвигается и ничего не пропускает
+        for payment in first[:2]:
+            payment.status = "confirmed"
+        await session.commit()
+
+        second = await PaymentDAO.get_queue_page(session, "paid", limit=4, after=page_key(first[-1]))
+        assert [p.id for p in first] == [1, 2, 3, 4]
+        assert [p.id for p in second] == [6, 7, 8, 9]
+
+    run_db(tmp_path, scenario)
+
+
+async def job_statuses(session):
+    result = await session.execute(select(Job.idempotency_key, Job.status, Job.attempts).order_by(Job.id))
+    return {key: (status, attempts) for key, status, attempts in result.all()}
+
+
+def test_job_enqueue_is_idempotent(tmp_path):
+    async def scenario(session):
+        items = [(f"provision:payment:{i}", "{}") for i in range(3)]
+        assert await JobDAO.enqueue(session, "provision", items, max_attempts=3) == 3
+        assert await JobDAO.enqueue(session, "provision", items, max_attempts=3) == 0
+        assert await JobDAO.enqueue(session, "provision", items + [("provision:payment:9", "{}")], max_attempts=3) == 1
+        assert len(await job_statuses(session)) == 4
+
+    run_db(tmp_path, scenario)
+
+
+def test_job_enqueue_revives_dead_only_on_request(tmp_path):
+    async def scenario(session):
+        items = [("revoke:key:1", "{}"), ("revoke:key:2", "{}")]
+        await JobDAO.enqueue(session, "revoke", items, max_attempts=1)
+        jobs = await JobDAO.claim(session, limit=10, lease=60)
+        await JobDAO.bury(session, jobs[0].id, "ошибка")
+        await JobDAO.finish(session, [jobs[1].id])
+
+        # Планировщик поставил снова - dead остается dead
+        assert await JobDAO.enqueue(session, "revoke", items, max_attempts=1) == 0
+        assert (await job_statuses(session))["revoke:key:1"] == ("dead", 1)
+
+        # Админ поставил снова - dead возвращается, выполненная не трогается
+        assert await JobDAO.enqueue(session, "revoke", items, max_attempts=1, revive=True) == 1
+        assert await job_statuses(session) == {"revoke:key:1": ("pending", 0), "revoke:key:2": ("done", 1)}
+
+    run_db(tmp_path, scenario)
+
+
+def test_job_claim_takes_each_job_once(tmp_path):
+    async def scenario(session):
+        await JobDAO.enqueue(session, "provision", [(f"k{i}", "{}") for i in range(5)], max_attempts=3)
+        await session.execute(update(Job).where(Job.idempotency_key == "k4").values(run_at=datetime.now() + timedelta(hours=1)))
+        await session.commit()
+
+        first = await JobDAO.claim(session, limit=3, lease=60)
+        second = await JobDAO.claim(session, limit=3, lease=60)
+
+        assert [job.idempotency_key for job in first] == ["k0", "k1", "k2"]
+        # Отложенная задача не берется раньше срока
+        assert [job.idempotency_key for job in second] == ["k3"]
+        assert all(job.status == "running" and job.attempts == 1 for job in first + second)
+        assert await JobDAO.claim(session, limit=3, lease=60) == []
+
+    run_db(tmp_path, scenario)
+
+
+def test_job_claim_concurrent_workers(tmp_path):
+    async def scenario(session):
+        await JobDAO.enqueue(session, "provision", [(f"k{i}", "{}") for i in range(20)], max_attempts=3)
+        maker = async_sessionmaker(session.bind, expire_on_commit=False)
+
+        async def worker():
+            async with maker() as own:
+                return [job.id for job in await JobDAO.claim(own, limit=8, lease=60)]
+
+        claimed = await asyncio.gather(*(worker() for _ in range(4)))
+        ids = [job_id for batch in claimed for job_id in batch]
+        assert len(ids) == len(set(ids)) == 20
+
+    run_db(tmp_path, scenario)
+
+
+def test_job_claim_reclaims_expired_lease(tmp_path):
+    async def scenario(session):
+        await JobDAO.enqueue(session, "revoke", [("revoke:key:1", "{}")], max_attempts=3)
+        job = (await JobDAO.claim(session, limit=1, lease=60))[0]
+        assert await JobDAO.claim(session, limit=1, lease=60) == []
+
+        # Обработчик упал, аренда истекла - задачу берет другой
+        await session.execute(update(Job).where(Job.id == job.id).values(locked_until=datetime.now() - timedelta(seconds=1)))
+        await session.commit()
+
+        again = await JobDAO.claim(session, limit=1, lease=60)
+        assert [(j.id, j.attempts) for j in again] == [(job.id, 2)]
+
+    run_db(tmp_path, scenario)